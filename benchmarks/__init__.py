@@ -0,0 +1,6 @@
+"""Benchmarks for python-paperbak.
+
+Run single benchmark as module from the root of repository, e.g. `python -m benchmarks.crc16`.
+All hot paths are measured by `python -m benchmarks.suite`, which can save results as JSON and
+compare them with results of previous run.
+"""
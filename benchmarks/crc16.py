@@ -0,0 +1,34 @@
+"""Compare throughput of crc16 with the original byte-at-a-time loop."""
+import os
+import timeit
+
+import numpy as np
+
+from paperbak.crc16 import crc16, crc16_batch, crc16_bytewise
+
+SIZES = [94, 1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024]
+BYTEWISE_MAX_SIZE = 64 * 1024  # The old loop is too slow for larger inputs
+NBLOCKS = 10000
+
+
+def mb_per_second(func, data, size):
+    """Return throughput of func(data) in MB/s."""
+    timer = timeit.Timer(lambda: func(data))
+    number, elapsed = timer.autorange()
+    return size * number / elapsed / 1024 / 1024
+
+
+def main():
+    print("{:>12} {:>14} {:>14}".format("size", "bytewise MB/s", "crc16 MB/s"))
+    for size in SIZES:
+        data = os.urandom(size)
+        old = mb_per_second(crc16_bytewise, data, size) if size <= BYTEWISE_MAX_SIZE else None
+        new = mb_per_second(crc16, data, size)
+        print("{:>12} {:>14} {:>14.2f}".format(size, "-" if old is None else "%.2f" % old, new))
+    blocks = np.frombuffer(os.urandom(NBLOCKS * 94), dtype=np.uint8).reshape(NBLOCKS, 94)
+    print("crc16_batch of {} blocks: {:.2f} MB/s".format(
+        NBLOCKS, mb_per_second(crc16_batch, blocks, blocks.size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Benchmarks of the encode and decode hot paths with machine-readable results.
+
+Every benchmark is timed by timeit with automatically selected number of calls and the best
+of several repeats is reported. Results are printed as table and optionally saved as JSON,
+which can be compared with results of previous run:
+
+    python -m benchmarks.suite --output new.json --compare old.json
+
+Benchmarks slower by more than --threshold are reported as regressions and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+from paperbak.constants import PACKLEN
+from paperbak.crc16 import crc16, crc16_batch
+from paperbak.crypto import CbcDecryptor, CbcEncryptor
+from paperbak.decoder import BitmapDecoder
+from paperbak.ecc import encode8, encode8_batch
+from paperbak.printer import FilePrinter
+from paperbak.structures import BlockTable, Data
+
+CRC_SIZES = [1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024, 100 * 1024 * 1024]
+QUICK_MAX_SIZE = 1024 * 1024  # Largest input of crc16 with --quick
+PAGE_BLOCKS = 28 * 45  # Number of blocks on A4 page at 200 dots per inch
+PRINT_SIZE = 200000  # Size of file printed by print_file benchmark
+RANDOM_SIZE = 4 * 1024 * 1024  # Size of incompressible file read with compression
+ENCRYPT_SIZE = 1024 * 1024  # Size of data encrypted at once, skipped with --quick
+REPEAT = 3  # Number of repeats, the best one is reported
+
+
+def measure(func, repeat=REPEAT):
+    """Return the best time of single call of func, seconds, and number of calls per repeat."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number))
+    return best / number, number
+
+
+def make_printer(path):
+    """Return printer of file at path prepared for drawing pages."""
+    printer = FilePrinter(path)
+    printer.get_file_info()
+    printer.read_and_compress()
+    printer.make_superdata()
+    printer.calc_layout()
+    printer.calc_data_page_size()
+    return printer
+
+
+def bench_crc16(quick):
+    for size in CRC_SIZES:
+        if quick and size > QUICK_MAX_SIZE:
+            continue
+        data = np.frombuffer(os.urandom(size), dtype=np.uint8)
+        yield "crc16", {"size": size}, lambda: crc16(data), size
+    blocks = np.frombuffer(os.urandom(PAGE_BLOCKS * 94), dtype=np.uint8).reshape(-1, 94)
+    yield "crc16_batch", {"blocks": PAGE_BLOCKS}, lambda: crc16_batch(blocks), blocks.size
+
+
+def bench_ecc(quick):
+    block = os.urandom(96)
+    yield "encode8", {"blocks": 1}, lambda: encode8(block), 96
+    page = np.frombuffer(os.urandom(PAGE_BLOCKS * 96), dtype=np.uint8).reshape(-1, 96)
+    yield "encode8_batch", {"blocks": PAGE_BLOCKS}, lambda: encode8_batch(page), page.size
+
+
+def bench_crypto(quick):
+    key, iv = os.urandom(24), os.urandom(16)
+    data = os.urandom(PACKLEN)
+    yield ("CbcEncryptor.update", {"size": PACKLEN},
+           lambda: CbcEncryptor(key, iv).update(data), PACKLEN)
+    yield ("CbcDecryptor.update", {"size": PACKLEN},
+           lambda: CbcDecryptor(key, iv).update(data), PACKLEN)
+    if not quick:
+        # Encryption is sequential, its speed limits printing of large encrypted files.
+        large = os.urandom(ENCRYPT_SIZE)
+        yield ("CbcEncryptor.update", {"size": ENCRYPT_SIZE},
+               lambda: CbcEncryptor(key, iv).update(large), ENCRYPT_SIZE)
+
+
+def bench_structures(quick):
+    data = Data()
+    data.address = 90
+    data.data = os.urandom(90)
+    data.calc_crc()
+    data.calc_ecc()
+    raw = data.tobytes()
+    yield "Data.tobytes", {}, data.tobytes, 128
+    yield "Data.frombytes", {}, lambda: Data.frombytes(raw), 128
+
+    def set_get():
+        data.address = 180
+        return data.address
+    yield "auto_attr_check set/get", {}, set_get, None
+    table = BlockTable.frombytes(raw * PAGE_BLOCKS)
+    yield "BlockTable.calc_crc", {"blocks": PAGE_BLOCKS}, table.calc_crc, PAGE_BLOCKS * 128
+    yield "BlockTable.calc_ecc", {"blocks": PAGE_BLOCKS}, table.calc_ecc, PAGE_BLOCKS * 128
+
+
+def bench_printer(quick, tmpdir):
+    path = os.path.join(tmpdir, "file.bin")
+    with open(path, "wb") as file:
+        file.write(os.urandom(PRINT_SIZE))
+    out_path = os.path.join(tmpdir, "page.bmp")
+
+    random_path = os.path.join(tmpdir, "random.bin")
+    with open(random_path, "wb") as file:
+        file.write(os.urandom(RANDOM_SIZE))
+
+    def compress():
+        printer = FilePrinter(random_path)
+        printer.compressed = True
+        printer.get_file_info()
+        printer.read_and_compress()
+        printer.close()
+    yield "read_and_compress random", {"size": RANDOM_SIZE}, compress, RANDOM_SIZE
+    yield ("FilePrinter.print_file", {"size": PRINT_SIZE},
+           lambda: FilePrinter(path).print_file(out_path), PRINT_SIZE)
+    printer = make_printer(path)
+    yield "FilePrinter.render_page", {"page": 0}, lambda: printer.render_page(0), None
+    image = printer.render_page(0)
+    yield ("BitmapDecoder.decode", {"shape": list(image.shape)},
+           lambda: BitmapDecoder(image).decode(), None)
+
+
+def run(quick=False):
+    """Run all benchmarks.
+
+    :return: Results, one dict per benchmark
+    :rtype: list
+    """
+    results = []
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for group in (bench_crc16(quick), bench_ecc(quick), bench_crypto(quick),
+                      bench_structures(quick), bench_printer(quick, tmpdir)):
+            for name, params, func, size in group:
+                seconds, number = measure(func, 1 if quick else REPEAT)
+                result = {"name": name, "params": params, "seconds": seconds, "number": number}
+                if size:
+                    result["mb_per_second"] = size / seconds / 1024 / 1024
+                results.append(result)
+                print("{:<28} {:<24} {:>12.3f} ms {:>10}".format(
+                    name, json.dumps(params), seconds * 1000,
+                    "%.2f MB/s" % result["mb_per_second"] if size else ""))
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def key(result):
+    """Return key identifying benchmark in results."""
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    """Return benchmarks which are slower than in baseline by more than threshold.
+
+    :rtype: list of tuple(result, baseline result)
+    """
+    old = {key(result): result for result in baseline}
+    return [(result, old[key(result)]) for result in results
+            if key(result) in old and result["seconds"] > old[key(result)]["seconds"] * (
+                1 + threshold)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--compare", help="compare with results saved as JSON")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as regression (default: 0.2)")
+    parser.add_argument("--quick", action="store_true",
+                        help="skip large inputs and run every benchmark once")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+                "cpus": os.cpu_count(),
+                "results": results,
+            }, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for result, old in regressions:
+            print("Regression: {} {} {:.3f} ms -> {:.3f} ms".format(
+                result["name"], json.dumps(result["params"]), old["seconds"] * 1000,
+                result["seconds"] * 1000))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""Command line interface of python-paperbak.
+
+    python -m paperbak backup <files...> --out <directory> [-f bmp|pbm|png|pdf] [-j <workers>]
+                              [--compress [--multistream]] [--encrypt]
+    python -m paperbak restore <directory> [-o <directory>] [-j <workers>] [--password]
+    python -m paperbak plan <files...> [--dpi <dpi>...] [--dotpercent <percent>...]
+                            [--redundancy <blocks>...] [--compress yes|no|both]
+"""
+import argparse
+import getpass
+import os
+import sys
+import time
+
+from paperbak import plan as planner
+from paperbak.constants import NGROUP
+from paperbak.printer import print_files
+from paperbak.restore import Restorer
+
+
+def ask_password(confirm=False):
+    """Ask for password of encrypted files, empty password means no encryption."""
+    password = getpass.getpass("Password: ")
+    if confirm and password and getpass.getpass("Confirm password: ") != password:
+        raise SystemExit("Passwords don't match.")
+    return password
+
+
+def backup(args):
+    """Print files into page images."""
+    password = ask_password(confirm=True) if args.encrypt else None
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    npages = nerrors = 0
+    for path, pages, error in print_files(
+            args.files, args.out, "." + args.format, args.workers, args.max_pages,
+            compressed=args.compress, redundancy=args.redundancy, dpi=args.dpi,
+            dpipercent=args.dotpercent, resx=args.resolution, resy=args.resolution,
+            encrypted=bool(password), password=password, compatible=not args.multistream,
+            compression_workers=args.workers if args.multistream else None):
+        if error is not None:
+            print("%s: %s" % (path, error), file=sys.stderr)
+            nerrors += 1
+        else:
+            print("Printed %s to %d page(s)" % (path, len(pages)))
+            npages += len(pages)
+    elapsed = time.perf_counter() - start
+    print("%d files, %d pages, total %.2f s, %.2f pages/s" % (
+        len(args.files), npages, elapsed, npages / max(elapsed, 1e-9)))
+    return 1 if nerrors else 0
+
+
+def restore(args):
+    """Restore files from all images in directory."""
+    paths = sorted(os.path.join(args.directory, name) for name in os.listdir(args.directory))
+    restorer = Restorer(args.output, args.workers, ask_password() if args.password else None)
+    restorer.width, restorer.height = args.width, args.height
+    start = time.perf_counter()
+    for path in restorer.restore(path for path in paths if os.path.isfile(path)):
+        print("Restored %s" % path)
+    elapsed = time.perf_counter() - start
+    for path, error in restorer.errors:
+        print("%s: %s" % (path, error), file=sys.stderr)
+    incomplete = restorer.close()
+    for name, pages in incomplete:
+        print("%s: incomplete, pages to scan: %s" % (name, ", ".join(str(p) for p in pages)),
+              file=sys.stderr)
+    times = restorer.times
+    print("load %.2f s, decode %.2f s, assemble %.2f s, total %.2f s" % (
+        times["load"], times["decode"], times["assemble"], elapsed))
+    print("%d pages, %.2f pages/s" % (restorer.npages, restorer.npages / max(elapsed, 1e-9)))
+    return 1 if incomplete or restorer.errors else 0
+
+
+def plan(args):
+    """Print number of pages needed for files with every combination of settings."""
+    compressed = {"yes": (True,), "no": (False,), "both": (False, True)}[args.compress]
+    start = time.perf_counter()
+    try:
+        plans = planner.plan(args.files, args.dpi, args.dotpercent, args.redundancy, compressed,
+                             resx=args.resolution, resy=args.resolution)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    if not plans:
+        print("None of the settings fits onto the page.", file=sys.stderr)
+        return 1
+    print("{:>5} {:>5} {:>10} {:>10} {:>6} {:>12}".format(
+        "dpi", "dot%", "redundancy", "compressed", "pages", "bytes"))
+    for result in plans:
+        settings = result.settings
+        print("{:>5} {:>5} {:>10} {:>10} {:>6} {:>12}".format(
+            settings["dpi"], settings["dpipercent"], settings["redundancy"],
+            "yes" if settings["compressed"] else "no", result.npages, result.datasize))
+    best = plans[0].settings
+    print("Cheapest: --dpi %d --dotpercent %d --redundancy %d%s, %d page(s)" % (
+        best["dpi"], best["dpipercent"], best["redundancy"],
+        " --compress" if best["compressed"] else "", plans[0].npages))
+    print("%d files, %d settings, total %.2f s" % (len(args.files), len(plans), elapsed))
+    return 0
+
+
+def make_parser():
+    """Create parser of command line arguments."""
+    parser = argparse.ArgumentParser(prog="python -m paperbak",
+                                     description="High density backups on the plain paper.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    parser_backup = commands.add_parser("backup", help="print files into page images")
+    parser_backup.add_argument("files", nargs="+", help="files to back up")
+    parser_backup.add_argument("--out", required=True, help="directory of page images")
+    parser_backup.add_argument("-f", "--format", choices=("bmp", "pbm", "png", "pdf"),
+                               default="bmp", help="format of page images (default: bmp)")
+    parser_backup.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                               help="number of printing processes (default: number of CPUs)")
+    parser_backup.add_argument("--max-pages", type=int,
+                               help="maximal number of page bitmaps in memory at once, "
+                                    "limits the number of printing processes")
+    parser_backup.add_argument("--compress", action="store_true", help="compress files by bzip2")
+    parser_backup.add_argument(
+        "--multistream", action="store_true",
+        help="compress large files in chunks by all workers, the pages can't be restored by "
+             "the original PaperBack")
+    parser_backup.add_argument("--redundancy", type=int, default=NGROUP,
+                               help="data blocks per recovery block (default: %d)" % NGROUP)
+    parser_backup.add_argument("--dpi", type=int, default=200,
+                               help="dot raster, dots per inch (default: 200)")
+    parser_backup.add_argument("--dotpercent", type=int, default=70,
+                               help="dot size, percent of raster (default: 70)")
+    parser_backup.add_argument("--resolution", type=int, default=300,
+                               help="resolution of page images, dpi (default: 300)")
+    parser_backup.add_argument("--encrypt", action="store_true",
+                               help="encrypt files by AES, password is asked for")
+    parser_backup.set_defaults(func=backup)
+
+    parser_restore = commands.add_parser(
+        "restore", help="restore files from directory of scanned pages")
+    parser_restore.add_argument(
+        "directory", help="directory with scanned pages (BMP, PGM, PBM, TIFF, PNG or PDF)")
+    parser_restore.add_argument("-o", "--output", default=".",
+                                help="directory of restored files (default: current)")
+    parser_restore.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                                help="number of decoding processes (default: number of CPUs)")
+    parser_restore.add_argument("--width", type=int, help="width of raw images, pixels")
+    parser_restore.add_argument("--height", type=int, help="height of raw images, pixels")
+    parser_restore.add_argument("--password", action="store_true",
+                                help="ask for password of encrypted files")
+    parser_restore.set_defaults(func=restore)
+
+    parser_plan = commands.add_parser(
+        "plan", help="estimate number of pages for combinations of settings without printing")
+    parser_plan.add_argument("files", nargs="+", help="files to back up")
+    parser_plan.add_argument("--dpi", type=int, nargs="+", default=[200],
+                             help="dot rasters to try, dots per inch (default: 200)")
+    parser_plan.add_argument("--dotpercent", type=int, nargs="+", default=[70],
+                             help="dot sizes to try, percent of raster (default: 70)")
+    parser_plan.add_argument("--redundancy", type=int, nargs="+", default=[NGROUP],
+                             help="data blocks per recovery block to try (default: %d)" % NGROUP)
+    parser_plan.add_argument("--compress", choices=("yes", "no", "both"), default="both",
+                             help="try files compressed by bzip2 (default: both)")
+    parser_plan.add_argument("--resolution", type=int, default=300,
+                             help="resolution of page images, dpi (default: 300)")
+    parser_plan.set_defaults(func=plan)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,8 @@ NGROUP = 5 # For NGROUP blocks (1..15), 1 recovery
 NGROUPMIN = 2
 NGROUPMAX = 10
 
+PACKLEN = 65536  # Length of data read buffer 64 K
+
 # Special address
 MAXSIZE = 0x0FFFFF80  # Maximal (theoretical) length of file
 SUPERBLOCK = 0xFFFFFFFF  # Address of superblock
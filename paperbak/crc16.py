@@ -1,4 +1,11 @@
-"""This module provides fast 16-bit CRC (CCITT version)."""
+"""This module provides fast 16-bit CRC (CCITT version).
+
+The CRC is linear and starts from zero, so the checksum of a message is the XOR of the checksums
+of its individual bytes, each one advanced by the number of bytes which follow it. This allows
+slicing-by-N: a precomputed table holds the contribution of every byte value at every position of
+an N byte slice, and the CRC of a whole slice is a single table gather followed by XOR reduction.
+Checksums of consecutive slices are then combined by shifting them over the following data.
+"""
 
 import numpy as np
 
@@ -38,9 +45,210 @@ CRCTAB = np.array([
 ], dtype=np.uint32)
 
 
-def crc16(data):
+SLICE = 1024  # Length of slice processed by single table gather, bytes
+SLAB = 1024  # Number of slices gathered at once, bounds temporary memory
+NPOWERS = 33  # Number of shift tables, data is shifted by up to 2**NPOWERS - 1 bytes
+
+
+def _make_slice_table(length):
+    """Return table of CRC contributions of bytes in slice of given length.
+
+    Item [i, b] is the CRC of a message of length bytes which has byte b at the position i and
+    zeros elsewhere. Leading zeros don't change CRC, so the last n rows are the table of slice of
+    n bytes.
+
+    :rtype: numpy.ndarray of shape (length, 256) and dtype numpy.uint16
+    """
+    table = np.empty((length, 256), dtype=np.uint16)
+    crc = CRCTAB.copy()
+    table[length - 1] = crc
+    for i in range(length - 2, -1, -1):
+        crc = ((crc << 8) ^ CRCTAB[crc >> 8]) & 0xFFFF
+        table[i] = crc
+    table.flags.writeable = False
+    return table
+
+
+def _matrix_multiply(a, b):
+    """Multiply two 16x16 GF(2) matrices stored as lists of column bit masks."""
+    out = []
+    for column in b:
+        value = 0
+        row = 0
+        while column:
+            if column & 1:
+                value ^= a[row]
+            column >>= 1
+            row += 1
+        out.append(value)
+    return out
+
+
+def _make_shift_tables():
+    """Return tables which advance CRC over 2**k zero bytes, for k < NPOWERS.
+
+    CRC shifted by table k is table[k, 0, crc & 0xFF] ^ table[k, 1, crc >> 8].
+
+    :rtype: numpy.ndarray of shape (NPOWERS, 2, 256) and dtype numpy.uint16
+    """
+    # Matrix of a single zero byte, column i is the image of bit i.
+    matrix = [((1 << i << 8) ^ int(CRCTAB[1 << i >> 8])) & 0xFFFF for i in range(16)]
+    tables = np.zeros((NPOWERS, 2, 256), dtype=np.uint16)
+    for power in range(NPOWERS):
+        for bit in range(16):
+            values = (np.arange(256) >> (bit % 8)) & 1
+            tables[power, bit // 8] ^= (values * matrix[bit]).astype(np.uint16)
+        matrix = _matrix_multiply(matrix, matrix)
+    tables.flags.writeable = False
+    return tables
+
+
+SLICE_TABLE = _make_slice_table(SLICE)
+SHIFT_TABLES = _make_shift_tables()
+
+
+def _shift(crc, length):
+    """Advance CRC (scalar or array) over length zero bytes.
+
+    Shifts by powers of two commute, so the shift is composed of shifts by set bits of length.
+    """
+    if length >> NPOWERS:
+        raise ValueError("Data is too long.")
+    power = 0
+    while length:
+        if length & 1:
+            table = SHIFT_TABLES[power]
+            crc = table[0][crc & 0xFF] ^ table[1][crc >> 8]
+        length >>= 1
+        power += 1
+    return crc
+
+
+def crc16_batch(blocks):
+    """Calculate CRC of every row of 2D array at once.
+
+    Typical use is (N, 94) array with address and data of N blocks.
+
+    :param blocks: 2D array of bytes, one message per row.
+    :type  blocks: numpy.ndarray
+    :rtype: numpy.ndarray of numpy.uint16
+    """
+    blocks = np.asarray(blocks, dtype=np.uint8)
+    if blocks.ndim != 2:
+        raise ValueError("Expected 2D array of blocks.")
+    crcs = np.zeros(blocks.shape[0], dtype=np.uint16)
+    # Rows longer than SLICE are processed in slices of columns.
+    for start in range(0, blocks.shape[1], SLICE):
+        columns = blocks[:, start:start + SLICE]
+        length = columns.shape[1]
+        flat = SLICE_TABLE[SLICE - length:].ravel()
+        positions = np.arange(0, length * 256, 256, dtype=np.intp)
+        crcs = _shift(crcs, length) ^ np.bitwise_xor.reduce(flat[columns + positions], axis=1)
+    return crcs
+
+
+def crc16(data, crc=0):
     """Calculate CRC.
 
+    :param data: The data over which to calculate CRC.
+    :type  data: bytes, bytearray, memoryview or numpy.ndarray
+    :param crc: CRC of preceding data, to continue calculation over data split into pieces.
+    :type  crc: int
+    :rtype: numpy.uint16
+    """
+    if isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data).reshape(-1).view(np.uint8)
+    else:
+        data = np.frombuffer(data, dtype=np.uint8)
+    if crc:
+        return combine(crc, crc16(data), len(data))
+    if len(data) <= SLICE:
+        return np.uint16(crc16_batch(data[np.newaxis])[0]) if len(data) else np.uint16(0)
+    # Leading zeros don't change CRC, so pad the data to the whole number of slices.
+    nslices = -(-len(data) // SLICE)
+    padded = np.zeros(nslices * SLICE, dtype=np.uint8)
+    padded[-len(data):] = data
+    slices = padded.reshape(nslices, SLICE)
+    crcs = np.concatenate([crc16_batch(slices[i:i + SLAB]) for i in range(0, nslices, SLAB)])
+    # Combine CRCs of neighbouring slices pairwise, the number of slices is padded to power of 2
+    # by zero slices at the start.
+    ncrcs = 1 << (nslices - 1).bit_length()
+    crcs = np.concatenate([np.zeros(ncrcs - nslices, dtype=np.uint16), crcs])
+    length = SLICE
+    while len(crcs) > 1:
+        crcs = _shift(crcs[0::2], length) ^ crcs[1::2]
+        length *= 2
+    return np.uint16(crcs[0])
+
+
+def combine(crc_a, crc_b, len_b):
+    """Combine CRCs of two consecutive pieces of data.
+
+    :param crc_a: CRC of the first piece.
+    :param crc_b: CRC of the second piece.
+    :param len_b: Length of the second piece in bytes.
+    :return: CRC of both pieces together.
+    :rtype: numpy.uint16
+    """
+    return np.uint16(_shift(int(crc_a), len_b) ^ int(crc_b))
+
+
+class CRC16(object):
+    """Incremental CRC calculation with interface modeled on hashlib.
+
+    Pieces of data may be checksummed separately (e.g. in worker processes) and merged later
+    without reading the data again:
+
+    >>> first, second = CRC16(piece_a), CRC16(piece_b)
+    >>> first.combine(second)
+    >>> first.value == crc16(piece_a + piece_b)
+    """
+    name = "crc16"
+    digest_size = 2
+
+    def __init__(self, data=None):
+        self.value = np.uint16(0)  # CRC of data so far
+        self.length = 0  # Length of data so far, bytes
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        """Continue CRC calculation over next piece of data."""
+        if not isinstance(data, np.ndarray):
+            data = np.frombuffer(data, dtype=np.uint8)
+        self.value = crc16(data, self.value)
+        self.length += data.nbytes
+
+    def combine(self, other):
+        """Append CRC of data which follows, computed by other CRC16 object."""
+        self.value = combine(self.value, other.value, other.length)
+        self.length += other.length
+
+    def copy(self):
+        """Return copy of CRC object."""
+        out = type(self)()
+        out.value = self.value
+        out.length = self.length
+        return out
+
+    def digest(self):
+        """Return CRC as big endian bytes.
+
+        :rtype: bytes
+        """
+        return int(self.value).to_bytes(self.digest_size, "big")
+
+    def hexdigest(self):
+        """Return CRC as string of hexadecimal digits."""
+        return self.digest().hex()
+
+
+def crc16_bytewise(data):
+    """Calculate CRC one byte at a time.
+
+    Direct port of Crc16() from old_cpp/Crc16.cpp. It is kept as a reference for tests and
+    benchmarks, use crc16 instead.
+
     :param data: The data over which to calculate CRC.
     :type  data: bytes
     :rtype: numpy.uint16
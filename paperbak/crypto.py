@@ -0,0 +1,93 @@
+"""Encryption of data compatible with old_cpp/CRYPTO (AES by Dr Brian Gladman).
+
+Data is encrypted by AES-192 in CBC mode. The key is derived from the password by PBKDF2 with
+HMAC-SHA1, 524288 iterations and the first 16 bytes of salt; the second 16 bytes of salt are the
+IV. The salt is stored at the end of the name field of the superblock.
+
+Both directions work on streams of pieces with length multiple of 16 bytes. AES is provided by
+the optional package cryptography (OpenSSL), which is constant-time and encrypts hundreds of
+MB/s. Key derivation is done by hashlib. Without cryptography only files without encryption
+can be printed and restored.
+"""
+import hashlib
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+AESKEYLEN = 24  # AES key length in bytes
+PASSLEN = 32  # Maximal length of password, bytes
+SALTLEN = 32  # Length of salt with IV, bytes
+KDF_ITERATIONS = 524288  # Number of iterations of key derivation
+
+
+def derive_key(password, salt):
+    """Derive AES key from password.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L469-L477  #NOQA
+
+    :param password: Password, str is encoded by UTF-8
+    :type password: str or bytes
+    :param salt: Salt with IV, only the first 16 bytes are used
+    :type salt: bytes
+    :rtype: bytes
+    """
+    if isinstance(password, str):
+        password = password.encode("utf8")
+    if not password:
+        raise ValueError("Password is empty.")
+    if len(password) > PASSLEN:
+        raise ValueError("Password can be only %d bytes long." % PASSLEN)
+    return hashlib.pbkdf2_hmac("sha1", password, bytes(salt[:16]), KDF_ITERATIONS, AESKEYLEN)
+
+
+def _cipher(key, iv):
+    """Return AES cipher in CBC mode.
+
+    :rtype: cryptography.hazmat.primitives.ciphers.Cipher
+    """
+    if Cipher is None:
+        raise ValueError("Encryption requires package cryptography, install it by "
+                         "pip install cryptography.")
+    if len(key) != AESKEYLEN:
+        raise ValueError("Key must be %d bytes long." % AESKEYLEN)
+    return Cipher(algorithms.AES(bytes(key)), modes.CBC(bytes(iv)))
+
+
+class CbcEncryptor(object):
+    """Streaming AES-CBC encryption.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L487-L493  #NOQA
+    """
+
+    def __init__(self, key, iv):
+        self.context = _cipher(key, iv).encryptor()
+
+    def update(self, data):
+        """Encrypt piece of data, its length must be multiple of 16 bytes.
+
+        :rtype: bytes
+        """
+        if len(data) % 16:
+            raise ValueError("Encrypted data is not aligned.")
+        return self.context.update(data)
+
+
+class CbcDecryptor(object):
+    """Streaming AES-CBC decryption.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L303-L317  #NOQA
+    """
+
+    def __init__(self, key, iv):
+        self.context = _cipher(key, iv).decryptor()
+
+    def update(self, data):
+        """Decrypt piece of data, its length must be multiple of 16 bytes.
+
+        :rtype: bytes
+        """
+        if len(data) % 16:
+            raise ValueError("Encrypted data is not aligned.")
+        return self.context.update(data)
@@ -0,0 +1,668 @@
+"""Decoding of data blocks from bitmap of scanned page.
+
+Port of the data processing steps of old_cpp/Decoder.cpp. Histograms and projections of the
+bitmap are gathered by numpy for whole rows and columns at once, only the short lists of peaks
+are processed in Python.
+
+Bitmap is 2D numpy array of np.uint8 with the top row first. The original code works with
+bitmap stored upside down, so orientations found by recognize_bits are numbered differently.
+
+Once the grid and the orientation of blocks are found, blocks are independent. With more
+workers, rows of blocks are decoded by a pool of processes, which read the bitmap from shared
+memory, so a single page is decoded by all cores.
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from paperbak.constants import NDATA, NDOT, SUPERBLOCK
+from paperbak.crc16 import crc16_batch
+from paperbak.ecc import decode8, decode8_batch
+from paperbak.render import SCRAMBLE
+from paperbak.structures import BlockTable, Data, SuperData
+
+NHYST = 1024  # Number of points in histogramm
+NPEAK = 32  # Maximal number of peaks
+SUBDX = 8  # X size of subblock, pixels
+SUBDY = 8  # Y size of subblock, pixels
+
+BADBLOCK = 17  # Answer for block which is not readable
+NOBLOCK = -1  # Answer for block which cannot be located
+
+# Dot sizes tried by decode_block, offsets of pixels averaged into single dot
+DOTS = {
+    1: [(0, 0)],
+    2: [(y, x) for y in range(2) for x in range(2)],
+    3: [(y, x) for y in range(3) for x in range(3)],
+    # Rounded 4x4 dot (rarely works)
+    4: [(y, x) for y in range(4) for x in range(4) if (y in (0, 3)) <= (x in (1, 2))],
+}
+DOT_INDEX = np.arange(NDOT)  # Indices of dots in row or column of block
+# +/- 1 pixel shifts of grid in all directions, shift 4 is not shifted
+SHIFTS = np.array([(y, x) for y in (-1, 0, 1) for x in (-1, 0, 1)])
+
+# Orientations of block in grid, including mirroring. Item r returns grids c with
+# c[..., j, i] equal to the grid1 element used by the original code for orientation r.
+ORIENTATIONS = (
+    lambda g: g,
+    lambda g: np.swapaxes(g, -1, -2)[..., ::-1, :],
+    lambda g: g[..., ::-1, ::-1],
+    lambda g: np.swapaxes(g[..., ::-1, :], -1, -2),
+    lambda g: np.swapaxes(g, -1, -2),
+    lambda g: g[..., :, ::-1],
+    lambda g: np.swapaxes(g[..., ::-1, ::-1], -1, -2),
+    lambda g: g[..., ::-1, :],
+)
+
+
+_worker_decoder = None  # BitmapDecoder of worker process, see _init_worker
+_worker_memory = None  # Shared memory with bitmap of worker process
+
+
+def _init_worker(decoder, name, shape):
+    """Attach worker process to shared memory with bitmap of the page."""
+    global _worker_decoder, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    image = np.ndarray(shape, dtype=np.uint8, buffer=_worker_memory.buf)
+    image.flags.writeable = False
+    decoder.image = image
+    _worker_decoder = decoder
+
+
+def _decode_worker_row(posy):
+    """Decode row of blocks in worker process."""
+    return [_worker_decoder.decode_block(posx, posy) for posx in range(_worker_decoder.nposx)]
+
+
+def _cdiv(a, b):
+    """Integer division rounding towards zero as in C."""
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def _trunc(x):
+    """Convert floats to integers rounding towards zero as in C."""
+    return np.trunc(x).astype(np.int64)
+
+
+def _first(mask, default):
+    """Return index of first True item of mask or default if there is none."""
+    indices = np.flatnonzero(mask)
+    return int(indices[0]) if len(indices) else default
+
+
+def find_peaks(h):
+    """Locate black peaks of histogram and determine phase and step of the grid.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L47-L155  #NOQA
+
+    :param h: Histogram, at most NHYST points are used
+    :type h: np.ndarray
+    :return: Weight of the grid (0.0 if there is no grid), position of first peak and step
+    :rtype: tuple(float, float, float)
+    """
+    h = np.asarray(h, dtype=np.int64)[:NHYST]
+    n = len(h)
+    if n < 16:
+        return 0.0, 0.0, 0.0
+    # Remove gradients by shadowing over 32 pixels. May create small artefacts in the vicinity
+    # of the main peak. Shadow falls by d per pixel, so running maximum of h[k] - d * (i - k)
+    # is running maximum of h[k] + d * k shifted back.
+    d = (int(h.max()) - int(h.min()) + 16) // 32
+    ramp = d * np.arange(n)
+    shadow = np.maximum.accumulate(h + ramp) - ramp
+    shadow = np.maximum.accumulate((shadow - ramp)[::-1])[::-1] + ramp
+    l = shadow - h
+    # I set peak limit to 3/4 of the amplitude of the highest peak.
+    limit = max(int(l.max()) * 3 // 4, 1)
+    above = np.concatenate(([False], l > limit, [False])).astype(np.int8)
+    starts = np.flatnonzero(np.diff(above) == 1)
+    ends = np.flatnonzero(np.diff(above) == -1)
+    # Skip incomplete first and last peak.
+    if len(starts) and starts[0] == 0:
+        starts, ends = starts[1:], ends[1:]
+    if len(ends) and ends[-1] == n:
+        starts, ends = starts[:-1], ends[:-1]
+    if not len(starts):
+        return 0.0, 0.0, 0.0
+    ampl = np.where(l > limit, l - limit, 0).astype(np.float64)
+    areas = np.add.reduceat(ampl, starts)
+    moments = np.add.reduceat(ampl * np.arange(n), starts)
+    heights = np.maximum.reduceat(l, starts)
+    peak, height = [], []
+    for area, moment, amax in zip(areas.tolist(), moments.tolist(), heights.tolist()):
+        if len(peak) >= NPEAK:
+            break
+        # Add peak to the list, removing weak artefacts.
+        if peak:
+            if amax * 8 < height[-1]:
+                continue
+            if amax > height[-1] * 8:
+                peak.pop()
+                height.pop()
+        peak.append(moment / area)
+        height.append(amax)
+    # At least two peaks are necessary to detect the step.
+    if len(peak) < 2:
+        return 0.0, 0.0, 0.0
+    # Calculate all possible distances between the found peaks.
+    i, j = np.triu_indices(len(peak), 1)
+    peaks = np.array(peak)
+    distances = np.bincount(_trunc(peaks[j] - peaks[i]), minlength=n)[:n]
+    # Find group with the maximal number of peaks. I allow for approximately 3% dispersion.
+    # Distances under 16 pixels are too short to be real.
+    candidates = np.arange(16, n)
+    cumsum = np.concatenate(([0], np.cumsum(distances)))
+    sums = cumsum[np.minimum(candidates + candidates // 33 + 2, n)] - cumsum[candidates]
+    sums[distances[16:] == 0] = 0
+    if not len(sums) or sums.max() == 0:
+        return 0.0, 0.0, 0.0
+    bestdist = int(candidates[np.argmax(sums)])
+    # Now determine the parameters of the sequence by linear regression.
+    sn = sx = sy = sxx = sxy = moment = 0.0
+    x0 = step = 0.0
+    for i, j in zip(i.tolist(), j.tolist()):
+        dist = int(peak[j] - peak[i])
+        if dist < bestdist or dist >= bestdist + bestdist // 33 + 1:
+            continue
+        if sn == 0.0:  # First link
+            k = 0
+        else:
+            x0 = (sx * sxy - sxx * sy) / (sx * sx - sn * sxx)
+            step = (sx * sy - sn * sxy) / (sx * sx - sn * sxx)
+            k = int((peak[i] - x0 + step / 2.0) / step)
+        sn += 2.0
+        sx += k * 2 + 1
+        sy += peak[i] + peak[j]
+        sxx += k * k + (k + 1) * (k + 1)
+        sxy += peak[i] * k + peak[j] * (k + 1)
+        moment += height[i] + height[j]
+    x0 = (sx * sxy - sxx * sy) / (sx * sx - sn * sxx)
+    step = (sx * sy - sn * sxy) / (sx * sx - sn * sxx)
+    return moment / sn, x0, step
+
+
+class BitmapDecoder(object):
+    """Decoder of blocks from bitmap of scanned page.
+
+    Steps of decoding are called in order by decode, which returns table of all recognized
+    data and recovery blocks. Superblock of the page is kept in superblock.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L909-L949  #NOQA
+    """
+
+    blockborder = 0.0  # Relative width of border around block, 0.0 is autoselect
+    workers = None  # Number of processes decoding rows of blocks, serial if 1 or None
+
+    # grid position and intensity
+    gridxmin = gridxmax = None  # Rough X grid limits, pixels
+    gridymin = gridymax = None  # Rough Y grid limits, pixels
+    searchx0 = searchx1 = None  # X grid search limits, pixels
+    searchy0 = searchy1 = None  # Y grid search limits, pixels
+    cmean = None  # Mean grid intensity (0..255)
+    cmin = cmax = None  # Minimal and maximal grid intensity
+    sharpfactor = None  # Estimated sharpness correction factor
+
+    # grid
+    xpeak = xstep = xangle = None  # Base X grid line, X grid step and X tilt
+    ypeak = ystep = yangle = None  # Base Y grid line, Y grid step and Y tilt
+    bufdx = bufdy = None  # Dimensions of block buffers, pixels
+    bufx = bufy = None  # Pixel columns and rows of block buffers at every position
+    bufcolumns = bufrows = None  # Indices of columns and rows of block buffer
+    nposx = nposy = None  # Number of blocks to scan in X and Y
+    maxdotsize = None  # Maximal size of the data dot, pixels
+
+    # decoding
+    orientation = -1  # Data orientation (-1: unknown)
+    lastgood = 0  # Last good combination of dot factor and threshold
+    superblock = None  # Page header, SuperDataView
+    blocks = None  # Recognized data and recovery blocks
+    quality = None  # Answer of decode_block for every position
+    ngood = 0  # Page statistics: good blocks
+    nbad = 0  # Page statistics: bad blocks
+    nsuper = 0  # Page statistics: good superblocks
+    nrestored = 0  # Page statistics: restored bytes
+
+    def __init__(self, image, workers=None):
+        image = np.asarray(image, dtype=np.uint8)
+        if image.ndim != 2:
+            raise ValueError("Bitmap must be 2D array.")
+        self.image = image
+        self.sizey, self.sizex = image.shape
+        self.workers = workers
+
+    def decode(self):
+        """Find the grid and decode all blocks of the page.
+
+        Rows are decoded serially until the orientation of blocks is known, the remaining rows
+        are decoded by the pool of workers, if there are more of them. Blocks are added in
+        grid order in both cases.
+
+        :rtype: BlockTable
+        """
+        self.get_grid_position()
+        self.get_grid_intensity()
+        self.get_x_angle()
+        self.get_y_angle()
+        self.prepare_for_decoding()
+        blocks = []
+        posy = 0
+        while posy < self.nposy and (self.orientation < 0 or not self.workers or
+                                     self.workers == 1):
+            self.add_row(posy, [self.decode_block(posx, posy) for posx in range(self.nposx)],
+                         blocks)
+            posy += 1
+        if posy < self.nposy:
+            for row, results in enumerate(self.decode_rows(range(posy, self.nposy)), posy):
+                self.add_row(row, results, blocks)
+        self.finish_decoding(blocks)
+        return self.blocks
+
+    def decode_rows(self, rows):
+        """Decode rows of blocks by pool of processes sharing the bitmap.
+
+        Workers get copy of the decoder with the grid and the orientation of blocks.
+
+        :return: Results of decode_block for every block of every row, in order of rows
+        :rtype: iterator of list
+        """
+        memory = shared_memory.SharedMemory(create=True, size=self.image.nbytes)
+        try:
+            np.ndarray(self.image.shape, dtype=np.uint8, buffer=memory.buf)[:] = self.image
+            state = copy.copy(self)
+            state.image = state.blocks = state.quality = None
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(state, memory.name, self.image.shape)) as executor:
+                yield from executor.map(_decode_worker_row, rows)
+        finally:
+            memory.close()
+            memory.unlink()
+
+    def add_row(self, posy, results, blocks):
+        """Add results of decode_block for all blocks of row."""
+        for posx, (answer, block) in enumerate(results):
+            self.add_block(posx, posy, answer, block, blocks)
+
+    def get_grid_position(self):
+        """Determine rough grid position.
+
+        To distinguish between borders with more or less constant intensity and quickly
+        changing raster, only the fast intensity changes over the short distance (2 pixels)
+        are taken into account.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L259-L319  #NOQA
+        """
+        if self.sizex <= 3 * NDOT or self.sizey <= 3 * NDOT:
+            raise ValueError("Bitmap is too small to process.")
+        # Select horizontal and vertical lines (at most 256 in each direction).
+        stepx = self.sizex // 256 + 1
+        nx = min((self.sizex - 2) // stepx, 256)
+        stepy = self.sizey // 256 + 1
+        ny = min((self.sizey - 2) // stepy, 256)
+        y = np.arange(ny)[:, None] * stepy
+        x = np.arange(nx) * stepx
+        samples = np.stack([self.image[y + dy, x + dx]
+                            for dy, dx in ((0, 0), (0, 2), (1, 1), (2, 0), (2, 2))])
+        contrast = samples.max(axis=0).astype(np.int64) - samples.min(axis=0)
+        distrx = contrast.sum(axis=0)
+        distry = contrast.sum(axis=1)
+        # Get rough bitmap limits at the level 50% of maximum.
+        limit = distrx.max() // 2
+        self.gridxmin = _first(distrx[:nx - 1] >= limit, nx - 1) * stepx
+        self.gridxmax = (nx - 1 - _first(distrx[:0:-1] >= limit, nx - 1)) * stepx
+        limit = distry.max() // 2
+        self.gridymin = _first(distry[:ny - 1] >= limit, ny - 1) * stepy
+        self.gridymax = (ny - 1 - _first(distry[:0:-1] >= limit, ny - 1)) * stepy
+
+    def get_grid_intensity(self):
+        """Select search range, determine grid intensity and estimate sharpness.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L322-L386  #NOQA
+        """
+        centerx = (self.gridxmin + self.gridxmax) // 2
+        centery = (self.gridymin + self.gridymax) // 2
+        self.searchx0 = max(centerx - NHYST // 2, 0)
+        self.searchx1 = min(self.searchx0 + NHYST, self.sizex)
+        self.searchy0 = max(centery - NHYST // 2, 0)
+        self.searchy1 = min(self.searchy0 + NHYST, self.sizey)
+        area = self.image[self.searchy0:self.searchy1, self.searchx0:self.searchx1].astype(np.int64)
+        pixels = area[:-1, :-1]
+        # As a minimum I take the level not reached by 3% of all pixels, as a maximum - level
+        # exceeded by 3% of pixels.
+        n = pixels.size
+        distrc = np.bincount(pixels.ravel(), minlength=256)
+        distrd = (np.bincount(np.abs(area[:-1, 1:] - pixels).ravel(), minlength=256) +
+                  np.bincount(np.abs(area[1:, :-1] - pixels).ravel(), minlength=256))
+        self.cmean = int(pixels.sum()) // n
+        limit = n // 33
+        self.cmin = _first(np.cumsum(distrc)[:255] >= limit, 255)
+        self.cmax = 255 - _first(np.cumsum(distrc[::-1])[:255] >= limit, 255)
+        if self.cmax - self.cmin < 1:
+            raise ValueError("No image.")
+        # Estimate image sharpness. The factor is rather empirical. Later, when dot size is
+        # known, this value will be corrected.
+        limit = n // 10  # 5% (each point is counted twice)
+        contrast = 255 - _first(np.cumsum(distrd[::-1])[:254] >= limit, 254)
+        self.sharpfactor = (self.cmax - self.cmin) / (2.0 * contrast) - 1.0
+
+    def _find_angle(self, project):
+        """Find angle with the strongest grid in projections of the search area.
+
+        Maximal allowed angle is approx. +/-5 degrees (1/10 radian). Small correction prefers
+        zero angle, as on small synthetic bitmaps weights of close angles are the same.
+
+        :param project: Function returning histogram of the search area sheared by angle a
+        :return: Peak, step and angle of the grid
+        """
+        maxweight, best = 0.0, (0.0, 0.0, 0.0)
+        for a in range(-(NHYST // 20) * 2, (NHYST // 20) * 2 + 1, 2):
+            weight, peak, step = find_peaks(project(a))
+            weight += 1.0 / (abs(a) + 10.0)
+            if weight > maxweight:
+                maxweight, best = weight, (peak, step, a / NHYST)
+        return best
+
+    def _project(self, along, across, shift, axis):
+        """Average pixels of lines sheared by shift, for every position across the lines.
+
+        :param along: Coordinates of sampled lines
+        :param across: Coordinates of pixels across the lines
+        :param shift: Shift of every line
+        :param axis: 0 for rows, 1 for columns
+        """
+        size = self.image.shape[1 - axis]
+        positions = shift[:, None] + across
+        valid = (positions >= 0) & (positions < size)
+        positions = np.clip(positions, 0, size - 1)
+        if axis == 0:
+            values = self.image[along[:, None], positions]
+        else:
+            values = self.image[positions, along[:, None]]
+        h = np.where(valid, values, 0).sum(axis=0)
+        nh = valid.sum(axis=0)
+        return np.where(nh > 0, h // np.maximum(nh, 1), h)
+
+    def get_x_angle(self):
+        """Find angle and step of vertical grid lines.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L389-L450  #NOQA
+        """
+        x0, y0 = self.searchx0, self.searchy0
+        dx, dy = self.searchx1 - x0, self.searchy1 - y0
+        # 256 lines are sufficient. Warning: danger of moire, especially on synthetic bitmaps!
+        rows = y0 + np.arange(0, dy, max(dy // 256, 1))
+        peak, step, angle = self._find_angle(
+            lambda a: self._project(rows, np.arange(dx), x0 + _trunc(rows * a / NHYST), 0))
+        if step < NDOT:
+            raise ValueError("No grid.")
+        self.xpeak, self.xstep, self.xangle = peak + x0, step, angle
+
+    def get_y_angle(self):
+        """Find angle and step of horizontal grid lines. Very similar to get_x_angle.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L453-L513  #NOQA
+        """
+        x0, y0 = self.searchx0, self.searchy0
+        dx, dy = self.searchx1 - x0, self.searchy1 - y0
+        columns = x0 + np.arange(0, dx, max(dx // 256, 1))
+        peak, step, angle = self._find_angle(
+            lambda a: self._project(columns, np.arange(dy), y0 + _trunc(columns * a / NHYST), 1))
+        if step < NDOT or step < self.xstep * 0.40 or step > self.xstep * 2.50:
+            raise ValueError("No grid.")
+        self.ypeak, self.ystep, self.yangle = peak + y0, step, angle
+
+    def prepare_for_decoding(self):
+        """Calculate position of the first block, number of blocks and size of block buffers.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L516-L604  #NOQA
+        """
+        # Empirical formula: the larger the angle, the more imprecise is the expected position
+        # of the block.
+        if self.blockborder <= 0.0:
+            self.blockborder = max(abs(self.xangle), abs(self.yangle)) * 5.0 + 0.4
+        border = self.blockborder
+        # Correct sharpness for known dot size. This correction is empirical.
+        dotsize = max(self.xstep, self.ystep) / (NDOT + 3.0)
+        self.sharpfactor = min(max(self.sharpfactor + 1.3 / dotsize - 0.1, 0.0), 2.0)
+        # Calculate start coordinates and number of blocks that fit onto the page.
+        maxxshift = abs(self.xangle * self.sizey)
+        shift = 0.0 if self.xangle < 0.0 else maxxshift
+        while self.xpeak - self.xstep > -shift - self.xstep * border:
+            self.xpeak -= self.xstep
+        self.nposx = int((self.sizex + maxxshift) / self.xstep)
+        maxyshift = abs(self.yangle * self.sizex)
+        shift = 0.0 if self.yangle < 0.0 else maxyshift
+        while self.ypeak - self.ystep > -shift - self.ystep * border:
+            self.ypeak -= self.ystep
+        self.nposy = int((self.sizey + maxyshift) / self.ystep)
+        self.bufdx = int(self.xstep * (2.0 * border + 1.0) + 1.0)
+        self.bufdy = int(self.ystep * (2.0 * border + 1.0) + 1.0)
+        # Positions of block buffers and their pixels are shared by all blocks.
+        self.bufx = (self.xpeak + self.xstep * (np.arange(self.nposx) - border)).astype(np.int64)
+        self.bufy = (self.ypeak + self.ystep * (np.arange(self.nposy) - border)).astype(np.int64)
+        self.bufcolumns = np.arange(self.bufdx)
+        self.bufrows = np.arange(self.bufdy)[:, None]
+        # Determine maximal size of the dot on the bitmap.
+        step = min(self.xstep, self.ystep)
+        self.maxdotsize = 1 if step < 2 * (NDOT + 3) else 2 if step < 3 * (NDOT + 3) else \
+            3 if step < 4 * (NDOT + 3) else 4
+        self.orientation = -1
+        self.superblock = None
+        self.quality = np.full((self.nposy, self.nposx), NOBLOCK, dtype=np.int8)
+        self.ngood = self.nbad = self.nsuper = self.nrestored = 0
+
+    def get_block_image(self, posx, posy):
+        """Rotate block at position to buffer using bilinear interpolation and sharpen it.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L630-L676  #NOQA
+
+        :rtype: np.ndarray of np.uint8, shape (bufdy, bufdx)
+        """
+        x0 = int(self.bufx[posx])
+        y0 = int(self.bufy[posy])
+        j = self.bufrows
+        i = self.bufcolumns
+        xbmp = x0 + (y0 + j) * self.xangle
+        x = np.where(xbmp >= 0.0, np.trunc(xbmp), np.trunc(xbmp - 1.0))
+        xres = xbmp - x
+        x = x.astype(np.int64) + i
+        ybmp = y0 + j + (x0 + i) * self.yangle
+        y = np.where(ybmp > 0.0, np.trunc(ybmp), np.trunc(ybmp - 1.0))
+        yres = ybmp - y
+        y = y.astype(np.int64)
+        # Fill areas outside the page white.
+        inside = (x >= 0) & (x < self.sizex - 1) & (y >= 0) & (y < self.sizey - 1)
+        x = np.clip(x, 0, self.sizex - 2)
+        y = np.clip(y, 0, self.sizey - 2)
+        p00, p01 = self.image[y, x].astype(np.float64), self.image[y, x + 1]
+        p10, p11 = self.image[y + 1, x].astype(np.float64), self.image[y + 1, x + 1]
+        pixels = (p00 + (p01 - p00) * xres) * (1.0 - yres) + (p10 + (p11 - p10) * xres) * yres
+        block = np.where(inside, pixels, self.cmax).astype(np.uint8)
+        if self.sharpfactor > 0.0:
+            s = block.astype(np.float64)
+            sharp = s[1:-1, 1:-1] * (1.0 + 4.0 * self.sharpfactor) - (
+                s[:-2, 1:-1] + s[1:-1, :-2] + s[1:-1, 2:] + s[2:, 1:-1]) * self.sharpfactor
+            block[1:-1, 1:-1] = np.clip(np.trunc(sharp), self.cmin, self.cmax)
+        return block
+
+    def get_dot_grids(self, block, xpeak, xstep, ypeak, ystep, dotsize):
+        """Sample dots of block with +/- 1 pixel shifts in all directions.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L712-L751  #NOQA
+
+        :return: Grids of dots for each of SHIFTS
+        :rtype: np.ndarray of np.uint8, shape (9, NDOT, NDOT)
+        """
+        halfdot = dotsize / 2.0 - 1.0
+        y = _trunc(ypeak + ystep * DOT_INDEX - halfdot)
+        x = _trunc(xpeak + xstep * DOT_INDEX - halfdot)
+        y = y[None, :, None] + SHIFTS[:, 0, None, None]
+        x = x[None, None, :] + SHIFTS[:, 1, None, None]
+        total = np.zeros((len(SHIFTS), NDOT, NDOT), dtype=np.int64)
+        for dy, dx in DOTS[dotsize]:
+            total += block[np.clip(y + dy, 0, block.shape[0] - 1),
+                           np.clip(x + dx, 0, block.shape[1] - 1)]
+        return (total // len(DOTS[dotsize])).astype(np.uint8)
+
+    def decode_block(self, posx, posy):
+        """Convert scanned block at position into data.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L607-L814  #NOQA
+
+        :return: NOBLOCK if block cannot be located, 0 to 16 (number of corrected bytes) if
+                 block is correctly decoded and BADBLOCK if block is unrecoverable; and
+                 128 bytes of block
+        :rtype: tuple(int, np.ndarray)
+        """
+        block = self.get_block_image(posx, posy)
+        # Find grid lines for the whole block.
+        weight, xpeak, xstep = find_peaks(block.sum(axis=0, dtype=np.int64))
+        if weight <= 0.0 or abs(xstep - self.xstep) > self.xstep / 16.0:
+            return NOBLOCK, None  # No X grid or invalid grid step
+        weight, ypeak, ystep = find_peaks(block.sum(axis=1, dtype=np.int64))
+        if weight <= 0.0 or abs(ystep - self.ystep) > self.ystep / 16.0:
+            return NOBLOCK, None  # No Y grid or invalid grid step
+        # Calculate dot step and correct peaks so that they point to first dot.
+        xstep /= NDOT + 3.0
+        xpeak += 2.0 * xstep
+        ystep /= NDOT + 3.0
+        ypeak += 2.0 * ystep
+        # Try different dot sizes, starting from 1x1 pixel.
+        for dotsize in range(1, self.maxdotsize + 1):
+            grids = self.get_dot_grids(block, xpeak, xstep, ypeak, ystep, dotsize)
+            # Non-shifted grid is the most probable good candidate, it goes first.
+            answer, result = self.recognize_bits(
+                np.stack([grids[4], self.combine_subblocks(grids)]))
+            if answer < BADBLOCK:
+                break
+        return answer, result
+
+    @staticmethod
+    def combine_subblocks(grids):
+        """Combine grid from subblocks SUBDX*SUBDY dots with maximal dispersion.
+
+        This compensates for small distortions, even nonlinear, and partially for
+        bidirectional print.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L765-L800  #NOQA
+
+        :type grids: np.ndarray, shape (9, NDOT, NDOT)
+        :rtype: np.ndarray, shape (NDOT, NDOT)
+        """
+        sub = grids.astype(np.int64).reshape(
+            len(grids), NDOT // SUBDY, SUBDY, NDOT // SUBDX, SUBDX).transpose(0, 1, 3, 2, 4)
+        sy = sub.sum(axis=(3, 4))
+        syy = (sub * sub).sum(axis=(3, 4))
+        # We are interested only in the shift corresponding to the maximum of dispersion.
+        disp = syy * SUBDX * SUBDY - sy * sy
+        dispmax = disp.max(axis=0)
+        shiftmax = disp.argmax(axis=0)
+        # If difference between minimal and maximal dispersion is low (the case of mostly
+        # black/mostly white dots), I set shift to zero.
+        shiftmax[dispmax - disp.min(axis=0) < dispmax / 5.0] = 4
+        best = np.take_along_axis(sub, shiftmax[None, :, :, None, None], axis=0)[0]
+        return best.transpose(0, 2, 1, 3).reshape(NDOT, NDOT).astype(np.uint8)
+
+    def recognize_bits(self, grids):
+        """Extract data from grids of recognized dots.
+
+        If orientation is not yet known, all possible orientations and mirrorings are tried.
+        Each is tried with 3 point overlapping factors combined with 3 thresholds. Usually all
+        cells are alike, so the last good combination is tried first.
+
+        All candidates of all grids are thresholded, packed and checked by CRC at once. Only if
+        none of them is valid, the candidates are passed to (slow) ECC one by one.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L159-L256  #NOQA
+
+        :param grids: Brightness of dots, single grid or alternative grids of the same block
+                      in order of preference
+        :type grids: np.ndarray, shape (NDOT, NDOT) or (n, NDOT, NDOT)
+        :return: Number of corrected bytes (0..16) or BADBLOCK and 128 bytes of block
+        :rtype: tuple(int, np.ndarray)
+        """
+        cmin, cmax = self.cmin, self.cmax
+        grids = np.asarray(grids, dtype=np.int64).reshape(-1, NDOT, NDOT)
+        # Correct grids for overlapping dots, only adjacent dots are taken into account.
+        padded = np.pad(grids, ((0, 0), (1, 1), (1, 1)), mode="constant", constant_values=cmax)
+        neighbours = (padded[:, :-2, 1:-1] + padded[:, 2:, 1:-1] + padded[:, 1:-1, :-2] +
+                      padded[:, 1:-1, 2:])
+        combinations = (np.arange(9) + self.lastgood) % 9
+        factor = np.array([1000, 32, 16])[combinations % 3]
+        lcorr = np.array([0, _cdiv(cmin - cmax, 16), _cdiv(cmax - cmin, 16)])[combinations // 3]
+        corrected = grids[:, None] * factor[:, None, None] - neighbours[:, None]
+        limit = _trunc(corrected.sum(axis=(2, 3)) / 1024.0) + lcorr * factor
+        bits = corrected < limit[:, :, None, None]
+        orientations = list(range(8)) if self.orientation < 0 else [self.orientation]
+        bits = np.stack([ORIENTATIONS[r](bits) for r in orientations], axis=1)
+        rows = np.packbits(bits, axis=-1, bitorder="little") ^ SCRAMBLE
+        # Candidates in order of grids, orientations and combinations.
+        candidates = rows.reshape(-1, NDOT * NDOT // 8)
+        valid = self.check_crc(candidates)
+        # ECC may still correct few bytes of ECC itself in blocks with valid CRC.
+        clean = candidates[valid]
+        answers = decode8_batch(clean)
+        good = (answers >= 0) & self.check_crc(clean)
+        if good.any():
+            first = np.argmax(good)
+            return self._recognized(np.flatnonzero(valid)[first], orientations, combinations,
+                                    int(answers[first]), clean[first])
+        # Apply ECC to restore invalid data and verify it by CRC.
+        tried = set()
+        for index in np.flatnonzero(~valid):
+            key = candidates[index].tobytes()
+            if key in tried:
+                continue  # Different thresholds often give the same bits
+            tried.add(key)
+            result = candidates[index].copy()
+            answer = decode8(result)
+            if 0 <= answer <= 16 and self.check_crc(result):
+                return self._recognized(index, orientations, combinations, answer, result)
+        return BADBLOCK, candidates[-1]
+
+    def _recognized(self, index, orientations, combinations, answer, result):
+        """Remember orientation and combination of candidate at index which was recognized."""
+        self.orientation = orientations[index // 9 % len(orientations)]
+        self.lastgood = int(combinations[index % 9])
+        return answer, result
+
+    @staticmethod
+    def check_crc(blocks):
+        """Check CRC of blocks.
+
+        :type blocks: np.ndarray of np.uint8, shape (128,) or (N, 128)
+        :rtype: bool or np.ndarray of bool, shape (N,)
+        """
+        blocks = np.asarray(blocks, dtype=np.uint8)
+        table = blocks.reshape(-1, blocks.shape[-1])
+        crc = crc16_batch(table[:, :NDATA + 4]) ^ 0x55AA
+        valid = crc == table[:, NDATA + 4] | table[:, NDATA + 5].astype(np.uint16) << 8
+        return valid if blocks.ndim == 2 else bool(valid[0])
+
+    def add_block(self, posx, posy, answer, block, blocks):
+        """Sort decoded block into superblock, data blocks or bad blocks.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Decoder.cpp#L817-L885  #NOQA
+        """
+        self.quality[posy, posx] = answer
+        if answer == NOBLOCK:
+            return  # Probably outside the raster
+        if answer >= BADBLOCK:
+            self.nbad += 1
+            return
+        self.nrestored += answer
+        if Data.frombuffer(block).address == SUPERBLOCK:
+            self.superblock = SuperData.frombuffer(block)
+            self.nsuper += 1
+        else:
+            blocks.append(block)
+            self.ngood += 1
+
+    def finish_decoding(self, blocks):
+        """Collect recognized blocks into table."""
+        if blocks:
+            self.blocks = BlockTable(array=np.stack(blocks).view(Data.dt).ravel())
+        else:
+            self.blocks = BlockTable()
@@ -4,6 +4,7 @@ Reed-Solomon (255,223) encoding/decoding
 Derived from the software by Phil Karn
 Copyright 2002 Phil Karn, KA9Q
 """
+import numpy as np
 
 ALPHA = bytes([
     0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80,
@@ -95,3 +96,234 @@ def encode8(data):
         bb[31] = 0 if feedback == 255 else ALPHA[(feedback + POLY[0]) % 255]
 
     return bb
+
+
+def _make_mul_table():
+    """Build GF(256) multiplication table from ALPHA and INDEX."""
+    index = np.frombuffer(INDEX, dtype=np.uint8).astype(np.intp)
+    alpha = np.frombuffer(ALPHA, dtype=np.uint8)
+    table = alpha[(index[:, np.newaxis] + index[np.newaxis, :]) % 255]
+    table[0, :] = 0
+    table[:, 0] = 0
+    return table
+
+
+def _make_feedback_table():
+    """Build table of parity updates for every feedback symbol.
+
+    Row f is what encode8 XORs into the shifted parity register when the feedback symbol is f.
+    """
+    poly = np.frombuffer(POLY, dtype=np.uint8)[31::-1]
+    return GF_MUL[:, np.frombuffer(ALPHA, dtype=np.uint8)[poly]]
+
+
+GF_MUL = _make_mul_table()  # GF_MUL[a, b] is product of a and b in GF(256)
+FEEDBACK = _make_feedback_table()
+
+
+def encode8_batch(data):
+    """Calculate Reed-Solomon's error correction code of many codewords at once.
+
+    :param data: 2D array of bytes, one codeword per row (96 bytes for Data and SuperData).
+    :type  data: numpy.ndarray
+    :return: Array with 32 bytes of parity for every row, matches encode8 of the row.
+    :rtype: numpy.ndarray of shape (N, 32) and dtype numpy.uint8
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    if data.ndim != 2:
+        raise ValueError("Expected 2D array of codewords.")
+    bb = np.zeros((data.shape[0], 32), dtype=np.uint8)
+    for i in range(data.shape[1]):
+        feedback = data[:, i] ^ bb[:, 0]
+        bb[:, :-1] = bb[:, 1:]
+        bb[:, -1] = 0
+        bb ^= FEEDBACK[feedback]
+    return bb
+
+
+SYNDROME_CHUNK = 1024  # Number of blocks whose syndromes are computed at once
+
+
+def _syndromes(data):
+    """Calculate syndromes of 2D array of codewords in polynomial form.
+
+    Syndrome i of codeword d of length n is the sum of d[j] * alpha^((112 + i) * 11 * (n - 1 - j)),
+    the same value Decode8() gets by Horner's scheme.
+
+    :rtype: numpy.ndarray of shape (N, 32) and dtype numpy.uint8
+    """
+    n = data.shape[1]
+    exponents = (np.arange(112, 144)[:, np.newaxis] * 11 * np.arange(n - 1, -1, -1)) % 255
+    powers = np.frombuffer(ALPHA, dtype=np.uint8)[exponents]
+    out = np.empty((data.shape[0], 32), dtype=np.uint8)
+    for i in range(0, data.shape[0], SYNDROME_CHUNK):
+        chunk = data[i:i + SYNDROME_CHUNK]
+        out[i:i + SYNDROME_CHUNK] = np.bitwise_xor.reduce(
+            GF_MUL[chunk[:, np.newaxis, :], powers], axis=2)
+    return out
+
+
+def _correct(data, s, eras_pos, pad):
+    """Correct errors in codeword with nonzero syndromes s.
+
+    Berlekamp-Massey, Chien search and Forney algorithm of Decode8() from old_cpp/Ecc.cpp.
+
+    :return: Positions of errors in padded codeword or None if errors can't be corrected.
+    :rtype: list of int
+    """
+    no_eras = len(eras_pos)
+    s = [INDEX[x] for x in s]
+    # Initialize lambda to be the erasure locator polynomial.
+    lambda_ = [1] + [0] * 32
+    if no_eras > 0:
+        lambda_[1] = ALPHA[(11 * (254 - eras_pos[0])) % 255]
+        for i in range(1, no_eras):
+            u = (11 * (254 - eras_pos[i])) % 255
+            for j in range(i + 1, 0, -1):
+                tmp = INDEX[lambda_[j - 1]]
+                if tmp != 255:
+                    lambda_[j] ^= ALPHA[(u + tmp) % 255]
+    b = [INDEX[x] for x in lambda_]
+    # Berlekamp-Massey algorithm to determine error+erasure locator polynomial.
+    r = el = no_eras
+    for r in range(no_eras + 1, 33):
+        discr_r = 0
+        for i in range(r):
+            if lambda_[i] != 0 and s[r - i - 1] != 255:
+                discr_r ^= ALPHA[(INDEX[lambda_[i]] + s[r - i - 1]) % 255]
+        discr_r = INDEX[discr_r]
+        if discr_r == 255:
+            b = [255] + b[:32]
+            continue
+        t = [lambda_[0]] + [
+            lambda_[i + 1] ^ ALPHA[(discr_r + b[i]) % 255] if b[i] != 255 else lambda_[i + 1]
+            for i in range(32)]
+        if 2 * el <= r + no_eras - 1:
+            el = r + no_eras - el
+            b = [255 if x == 0 else (INDEX[x] - discr_r + 255) % 255 for x in lambda_]
+        else:
+            b = [255] + b[:32]
+        lambda_ = t
+    # Convert lambda to index form and compute its degree.
+    lambda_ = [INDEX[x] for x in lambda_]
+    deg_lambda = max((i for i in range(33) if lambda_[i] != 255), default=0)
+    # Chien search for roots of the error+erasure locator polynomial.
+    reg = list(lambda_)
+    root = []
+    loc = []
+    k = 115
+    for i in range(1, 256):
+        q = 1
+        for j in range(deg_lambda, 0, -1):
+            if reg[j] != 255:
+                reg[j] = (reg[j] + j) % 255
+                q ^= ALPHA[reg[j]]
+        if q == 0:
+            root.append(i)
+            loc.append(k)
+            if len(root) == deg_lambda:
+                break
+        k = (k + 116) % 255
+    if len(root) != deg_lambda:
+        return None  # Uncorrectable error detected
+    # Compute error evaluator polynomial omega(x) = s(x) * lambda(x) mod x^32.
+    deg_omega = deg_lambda - 1
+    omega = []
+    for i in range(deg_omega + 1):
+        tmp = 0
+        for j in range(i, -1, -1):
+            if s[i - j] != 255 and lambda_[j] != 255:
+                tmp ^= ALPHA[(s[i - j] + lambda_[j]) % 255]
+        omega.append(INDEX[tmp])
+    # Forney algorithm, compute and apply error values.
+    for j in range(len(root) - 1, -1, -1):
+        num1 = 0
+        for i in range(deg_omega, -1, -1):
+            if omega[i] != 255:
+                num1 ^= ALPHA[(omega[i] + i * root[j]) % 255]
+        num2 = ALPHA[(root[j] * 111 + 255) % 255]
+        den = 0
+        for i in range(min(deg_lambda, 31) & ~1, -1, -2):
+            if lambda_[i + 1] != 255:
+                den ^= ALPHA[(lambda_[i + 1] + i * root[j]) % 255]
+        if num1 != 0 and loc[j] >= pad:
+            data[loc[j] - pad] ^= ALPHA[(INDEX[num1] + INDEX[num2] + 255 - INDEX[den]) % 255]
+    return loc
+
+
+def _decode(data, s, eras_pos, pad):
+    """Correct codeword with syndromes s and replace erasures by positions of corrected bytes.
+
+    :rtype: int
+    """
+    if not s.any():
+        if eras_pos is not None:
+            del eras_pos[:]
+        return 0
+    loc = _correct(data, s.tolist(), [pos + pad for pos in eras_pos or []], pad)
+    if loc is None:
+        return -1
+    if eras_pos is not None:
+        # https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Ecc.cpp#L232-L234  #NOQA
+        eras_pos[:] = [pos - pad for pos in loc]
+    return len(loc)
+
+
+def _check_codewords(data):
+    """Check that data is writable 2D array of codewords which can be corrected in place."""
+    if not isinstance(data, np.ndarray) or data.dtype != np.uint8:
+        raise ValueError("Expected numpy array of dtype uint8.")
+    if data.ndim != 2:
+        raise ValueError("Expected 2D array of codewords.")
+    if not 32 < data.shape[1] <= 255:
+        raise ValueError("Codeword must be 33 to 255 bytes long, including parity.")
+    if not data.flags.writeable:
+        raise ValueError("Codewords are corrected in place, array must be writable.")
+
+
+def decode8(data, eras_pos=None):
+    """Correct errors in codeword protected by encode8.
+
+    Port of Decode8() from old_cpp/Ecc.cpp. Data is corrected in place. Like in the original,
+    list of erasures is replaced by positions of corrected bytes, unless errors can't be
+    corrected.
+
+    :param data: Codeword followed by 32 bytes of parity (128 bytes for Data and SuperData).
+    :type  data: bytearray, writable memoryview or numpy.ndarray
+    :param eras_pos: Positions of known erased bytes in data.
+    :type  eras_pos: list of int
+    :return: Number of corrected bytes or -1 if errors can't be corrected.
+    :rtype: int
+    """
+    pad = 255 - len(data)
+    s = _syndromes(np.frombuffer(data, dtype=np.uint8)[np.newaxis])[0]
+    return _decode(data, s, eras_pos, pad)
+
+
+def decode8_batch(data, eras_pos=None):
+    """Correct errors in many codewords at once.
+
+    Syndromes of all codewords are computed together and only codewords with nonzero syndromes
+    are passed to the (slow) error locator.
+
+    Rows of data are corrected in place, so it must be writable array of dtype uint8, it isn't
+    converted. Like in decode8, lists of erasures are replaced by positions of corrected bytes.
+
+    :param data: 2D array of codewords with parity, one per row. Corrected in place.
+    :type  data: numpy.ndarray
+    :param eras_pos: Positions of known erased bytes in every row, list per row or None.
+    :type  eras_pos: list of list of int
+    :return: Number of corrected bytes in each row, -1 where errors can't be corrected.
+    :rtype: numpy.ndarray of int
+    """
+    _check_codewords(data)
+    if eras_pos is not None and len(eras_pos) != data.shape[0]:
+        raise ValueError("Expected list of erasures for every codeword.")
+    pad = 255 - data.shape[1]
+    syndromes = _syndromes(data)
+    result = np.zeros(data.shape[0], dtype=int)
+    rows = range(data.shape[0]) if eras_pos is not None else \
+        np.flatnonzero(syndromes.any(axis=1))
+    for i in rows:
+        result[i] = _decode(data[i], syndromes[i], None if eras_pos is None else eras_pos[i], pad)
+    return result
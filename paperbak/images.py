@@ -0,0 +1,385 @@
+"""Loading of scanned pages from image files.
+
+Port of Decodebitmap and ProcessDIB from old_cpp/Scanner.cpp. Instead of reading the whole
+bitmap into memory, files are memory mapped by np.memmap and the decoder gets 2D view of the
+pixels, so pages are read from disk only as the decoder touches them. Pixels are converted only
+if they aren't stored as 8-bit grayscale.
+
+Supported are uncompressed 8-bit and 24-bit BMP, binary PGM and PBM (also several images in one
+file), uncompressed 8-bit grayscale TIFF (also multi-page), non-interlaced 1-bit or 8-bit
+grayscale and 8-bit RGB PNG, Flate compressed grayscale images of PDF (like the pages saved by
+render.save_pdf) and raw 8-bit pixels. Files with more images are iterated lazily, image by
+image. Compressed and 1-bit images are unpacked into memory.
+"""
+import re
+import struct
+import zlib
+
+import numpy as np
+
+BMP_MIN_SIZE = 128  # Minimal width and height of BMP, pixels
+BMP_MAX_SIZE = 32768  # Maximal width and height of BMP, pixels
+
+# TIFF tags
+TIFF_WIDTH = 256
+TIFF_HEIGHT = 257
+TIFF_BITS = 258
+TIFF_COMPRESSION = 259
+TIFF_PHOTOMETRIC = 262
+TIFF_STRIP_OFFSETS = 273
+TIFF_SAMPLES = 277
+TIFF_STRIP_BYTES = 279
+TIFF_TYPES = {3: "H", 4: "I"}  # Formats of SHORT and LONG values
+
+PGM_HEADER = re.compile(br"P5(?:\s|#[^\n]*\n)+(\d+)(?:\s|#[^\n]*\n)+(\d+)(?:\s|#[^\n]*\n)+(\d+)\s")
+PBM_HEADER = re.compile(br"P4(?:\s|#[^\n]*\n)+(\d+)(?:\s|#[^\n]*\n)+(\d+)\s")
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+# Image XObject of PDF with its dictionary, which must not contain nested dictionaries
+PDF_IMAGE = re.compile(br"<<((?:(?!<<|>>).)*?/Subtype\s*/Image(?:(?!<<|>>).)*)>>\s*stream\r?\n",
+                       re.DOTALL)
+PDF_INT = br"/%s\s+(\d+)(?!\s+\d+\s+R)"  # Direct integer value of key in dictionary
+
+
+def _memmap(path):
+    """Map the whole file read-only as bytes."""
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+def _from_1bit(rows, width, black=1):
+    """Unpack rows of 1-bit pixels into 8-bit pixels, bits equal to black are black.
+
+    :rtype: np.ndarray of np.uint8, shape (height, width)
+    """
+    bits = np.unpackbits(rows, axis=1)[:, :width]
+    return np.where(bits == black, 0, 255).astype(np.uint8)
+
+
+def _gray(pixels):
+    """Convert RGB (or BGR) pixels into gray as average of channels, as in the original code.
+
+    :type pixels: np.ndarray of np.uint8, shape (height, width, 3)
+    :rtype: np.ndarray of np.uint8, shape (height, width)
+    """
+    return (pixels.sum(axis=2, dtype=np.uint16) // 3).astype(np.uint8)
+
+
+def load_bmp(path):
+    """Load 8-bit or 24-bit uncompressed BMP.
+
+    Grayscale bitmaps, like the ones saved by render.save_bmp, are returned as view of the
+    mapped file. Bitmaps with other palette and 24-bit bitmaps are converted to gray.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Scanner.cpp#L48-L112  #NOQA
+
+    :rtype: np.ndarray of np.uint8, shape (height, width), top row first
+    """
+    data = _memmap(path)
+    if len(data) < 54:
+        raise ValueError("Unsupported bitmap type.")
+    magic, offset = struct.unpack_from("<2s8xI", data)
+    size, width, height, planes, bits, compression, ncolor = struct.unpack_from(
+        "<IiiHHI12xI", data, 14)
+    if magic != b"BM" or size != 40 or planes != 1 or bits not in (8, 24) or \
+            (bits == 24 and ncolor != 0) or compression != 0 or \
+            not BMP_MIN_SIZE <= width <= BMP_MAX_SIZE or \
+            not BMP_MIN_SIZE <= abs(height) <= BMP_MAX_SIZE:
+        raise ValueError("Unsupported bitmap type.")
+    # Scan lines are aligned to 4 bytes.
+    stride = (width * bits // 8 + 3) & ~3
+    if offset + stride * abs(height) > len(data):
+        raise ValueError("Bitmap is truncated.")
+    rows = data[offset:offset + stride * abs(height)].reshape(abs(height), stride)
+    # Rows are stored from bottom to top, unless height is negative.
+    if height > 0:
+        rows = rows[::-1]
+    if bits == 24:
+        return _gray(rows[:, :width * 3].reshape(abs(height), width, 3))
+    pixels = rows[:, :width]
+    if ncolor == 0:
+        return pixels
+    palette = data[14 + size:14 + size + 4 * ncolor].reshape(ncolor, 4)
+    scale = np.zeros(256, dtype=np.uint8)
+    scale[:ncolor] = _gray(palette[None, :, :3])[0]
+    if np.array_equal(scale, np.arange(256)):
+        return pixels
+    return scale[pixels]
+
+
+def iter_pgm(path):
+    """Yield images of binary PGM file with 8-bit pixels, file may contain more images.
+
+    :rtype: iterator of np.ndarray of np.uint8, shape (height, width)
+    """
+    data = _memmap(path)
+    offset = 0
+    while offset < len(data):
+        match = PGM_HEADER.match(data[offset:offset + 1024].tobytes())
+        if match is None:
+            raise ValueError("Unsupported PGM type.")
+        width, height, maxval = (int(value) for value in match.groups())
+        if maxval > 255:
+            raise ValueError("Only PGM with 8-bit pixels is supported.")
+        offset += match.end()
+        if offset + width * height > len(data):
+            raise ValueError("PGM is truncated.")
+        yield data[offset:offset + width * height].reshape(height, width)
+        offset += width * height
+        # Skip whitespace between concatenated images.
+        while offset < len(data) and data[offset] in b" \t\r\n":
+            offset += 1
+
+
+def iter_pbm(path):
+    """Yield images of binary PBM file, like the pages saved by render.save_pbm.
+
+    File may contain more images, black pixels are returned as 0, white as 255.
+
+    :rtype: iterator of np.ndarray of np.uint8, shape (height, width)
+    """
+    data = _memmap(path)
+    offset = 0
+    while offset < len(data):
+        match = PBM_HEADER.match(data[offset:offset + 1024].tobytes())
+        if match is None:
+            raise ValueError("Unsupported PBM type.")
+        width, height = (int(value) for value in match.groups())
+        offset += match.end()
+        # Rows are padded to whole bytes.
+        stride = (width + 7) // 8
+        if offset + stride * height > len(data):
+            raise ValueError("PBM is truncated.")
+        yield _from_1bit(data[offset:offset + stride * height].reshape(height, stride), width)
+        offset += stride * height
+        # Skip whitespace between concatenated images.
+        while offset < len(data) and data[offset] in b" \t\r\n":
+            offset += 1
+
+
+def _png_unfilter(filters, lines, bpp):
+    """Reverse filters of PNG scan lines.
+
+    None, Sub and Up filters are reversed by numpy, Average and Paeth filters depend on the
+    previous byte of the same line and are reversed byte by byte.
+
+    :param filters: Filter type of every line
+    :param lines: Filtered lines without the filter type byte
+    :param bpp: Number of bytes per complete pixel, at least 1
+    :rtype: np.ndarray of np.uint8, shape of lines
+    """
+    rows = lines.copy()
+    previous = np.zeros(rows.shape[1], dtype=np.uint8)
+    for row, kind in zip(rows, filters):
+        if kind == 1:
+            row[:] = np.cumsum(row.reshape(-1, bpp), axis=0, dtype=np.uint8).ravel()
+        elif kind == 2:
+            row += previous
+        elif kind in (3, 4):
+            line, above = row.tolist(), previous.tolist()
+            for i in range(len(line)):
+                left = line[i - bpp] if i >= bpp else 0
+                if kind == 3:
+                    line[i] = (line[i] + (left + above[i]) // 2) & 0xFF
+                    continue
+                corner = above[i - bpp] if i >= bpp else 0
+                estimate = left + above[i] - corner
+                pa, pb, pc = abs(estimate - left), abs(estimate - above[i]), abs(estimate - corner)
+                if pa <= pb and pa <= pc:
+                    line[i] = (line[i] + left) & 0xFF
+                elif pb <= pc:
+                    line[i] = (line[i] + above[i]) & 0xFF
+                else:
+                    line[i] = (line[i] + corner) & 0xFF
+            row[:] = line
+        elif kind != 0:
+            raise ValueError("Unknown PNG filter type %d." % kind)
+        previous = row
+    return rows
+
+
+def load_png(path):
+    """Load non-interlaced 1-bit or 8-bit grayscale or 8-bit RGB PNG.
+
+    Pages saved by render.save_png are supported. RGB pixels are converted to gray.
+
+    :rtype: np.ndarray of np.uint8, shape (height, width)
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if data[:8] != PNG_MAGIC:
+        raise ValueError("Unsupported PNG type.")
+    offset = 8
+    header = None
+    compressed = []
+    while offset + 8 <= len(data):
+        length, kind = struct.unpack_from(">I4s", data, offset)
+        chunk = data[offset + 8:offset + 8 + length]
+        offset += length + 12  # Length, type and CRC
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif kind == b"IDAT":
+            compressed.append(chunk)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise ValueError("PNG is truncated.")
+    width, height, depth, color, _, _, interlace = header
+    if interlace or (color, depth) not in ((0, 1), (0, 8), (2, 8)):
+        raise ValueError("Only non-interlaced 1-bit or 8-bit grayscale and 8-bit RGB PNG is "
+                         "supported.")
+    channels = 3 if color == 2 else 1
+    stride = (width * channels * depth + 7) // 8
+    raw = np.frombuffer(zlib.decompress(b"".join(compressed)), dtype=np.uint8)
+    if len(raw) < height * (stride + 1):
+        raise ValueError("PNG is truncated.")
+    # Every line starts with its filter type.
+    lines = raw[:height * (stride + 1)].reshape(height, stride + 1)
+    rows = _png_unfilter(lines[:, 0], lines[:, 1:], max(channels * depth // 8, 1))
+    if depth == 1:
+        return _from_1bit(rows, width, black=0)
+    if channels == 3:
+        return _gray(rows.reshape(height, width, 3))
+    return rows
+
+
+def iter_pdf(path):
+    """Yield grayscale images of PDF file, like the pages saved by render.save_pdf.
+
+    Only image XObjects with plain dictionaries are found, their pixels must be Flate
+    compressed or uncompressed, 1-bit or 8-bit DeviceGray. Images are yielded in the order
+    in which they are stored in the file.
+
+    :rtype: iterator of np.ndarray of np.uint8, shape (height, width)
+    """
+    data = _memmap(path)
+    match = PDF_IMAGE.search(data)
+    while match is not None:
+        info = match.group(1)
+
+        def get_int(key):
+            found = re.search(PDF_INT % key, info)
+            return int(found.group(1)) if found else None
+
+        width, height, depth = get_int(b"Width"), get_int(b"Height"), get_int(b"BitsPerComponent")
+        filters = re.findall(br"/Filter\s*\[?\s*/(\w+)", info)
+        if None in (width, height) or depth not in (1, 8) or \
+                not re.search(br"/ColorSpace\s*/DeviceGray", info) or \
+                filters not in ([], [b"FlateDecode"]) or b"/DecodeParms" in info:
+            raise ValueError("Only Flate compressed 1-bit or 8-bit grayscale images of PDF are "
+                             "supported.")
+        start = match.end()
+        length = get_int(b"Length")
+        end = start + length if length is not None else data[start:].tobytes().find(b"endstream")
+        pixels = data[start:end].tobytes()
+        if filters:
+            pixels = zlib.decompress(pixels)
+        stride = (width * depth + 7) // 8
+        if len(pixels) < stride * height:
+            raise ValueError("PDF image is truncated.")
+        rows = np.frombuffer(pixels, dtype=np.uint8, count=stride * height).reshape(height, stride)
+        yield _from_1bit(rows, width, black=0) if depth == 1 else rows
+        # Streams are skipped, their data could look like a dictionary.
+        match = PDF_IMAGE.search(data, end)
+
+
+def _tiff_ifd(data, endian, offset):
+    """Read tags of image file directory.
+
+    :return: Values of tags and offset of the next directory
+    :rtype: tuple(dict, int)
+    """
+    count, = struct.unpack_from(endian + "H", data, offset)
+    tags = {}
+    for entry in range(offset + 2, offset + 2 + 12 * count, 12):
+        tag, type_, length = struct.unpack_from(endian + "HHI", data, entry)
+        if type_ not in TIFF_TYPES:
+            continue  # Only integer tags are needed
+        fmt = endian + TIFF_TYPES[type_] * length
+        # Values which fit into 4 bytes are stored in the entry itself.
+        if struct.calcsize(fmt) > 4:
+            entry, = struct.unpack_from(endian + "I", data, entry + 8)
+        else:
+            entry += 8
+        tags[tag] = struct.unpack_from(fmt, data, entry)
+    next_offset, = struct.unpack_from(endian + "I", data, offset + 2 + 12 * count)
+    return tags, next_offset
+
+
+def iter_tiff(path):
+    """Yield pages of uncompressed 8-bit grayscale TIFF.
+
+    Strips stored one after another are returned as view of the mapped file.
+
+    :rtype: iterator of np.ndarray of np.uint8, shape (height, width)
+    """
+    data = _memmap(path)
+    order = data[:2].tobytes()
+    if order not in (b"II", b"MM"):
+        raise ValueError("Unsupported TIFF type.")
+    endian = "<" if order == b"II" else ">"
+    magic, offset = struct.unpack_from(endian + "HI", data, 2)
+    if magic != 42:
+        raise ValueError("Unsupported TIFF type.")
+    while offset:
+        tags, offset = _tiff_ifd(data, endian, offset)
+        width, = tags[TIFF_WIDTH]
+        height, = tags[TIFF_HEIGHT]
+        if tags.get(TIFF_BITS, (1,))[0] != 8 or tags.get(TIFF_SAMPLES, (1,))[0] != 1 or \
+                tags.get(TIFF_COMPRESSION, (1,))[0] != 1:
+            raise ValueError("Only uncompressed 8-bit grayscale TIFF is supported.")
+        starts = np.array(tags[TIFF_STRIP_OFFSETS])
+        ends = starts + np.array(tags[TIFF_STRIP_BYTES])
+        if (starts[1:] == ends[:-1]).all():
+            pixels = data[starts[0]:starts[0] + width * height]
+        else:
+            pixels = np.concatenate([data[start:end] for start, end in zip(starts, ends)])
+        pixels = pixels[:width * height].reshape(height, width)
+        # WhiteIsZero
+        if tags.get(TIFF_PHOTOMETRIC, (1,))[0] == 0:
+            pixels = 255 - pixels
+        yield pixels
+
+
+def iter_raw(path, width, height, offset=0):
+    """Yield images of file with stack of raw 8-bit pixels.
+
+    :param width: Width of images, pixels
+    :param height: Height of images, pixels
+    :param offset: Size of header before the first image, bytes
+    :rtype: iterator of np.ndarray of np.uint8, shape (height, width)
+    """
+    data = _memmap(path)[offset:]
+    count = len(data) // (width * height)
+    if count == 0:
+        raise ValueError("File is smaller than single image.")
+    stack = data[:count * width * height].reshape(count, height, width)
+    for image in stack:
+        yield image
+
+
+def iter_images(path, width=None, height=None):
+    """Yield images stored in file, the type of file is recognized by its content.
+
+    Files which are not BMP, PGM, PBM, TIFF, PNG or PDF are read as raw pixels of given size.
+
+    :rtype: iterator of np.ndarray of np.uint8, shape (height, width)
+    """
+    with open(path, "rb") as file:
+        magic = file.read(4)
+    if magic[:2] == b"BM":
+        yield load_bmp(path)
+    elif magic[:2] == b"P5":
+        yield from iter_pgm(path)
+    elif magic[:2] == b"P4":
+        yield from iter_pbm(path)
+    elif magic == PNG_MAGIC[:4]:
+        yield load_png(path)
+    elif magic == b"%PDF":
+        yield from iter_pdf(path)
+    elif magic in (b"II*\0", b"MM\0*"):
+        yield from iter_tiff(path)
+    elif width and height:
+        yield from iter_raw(path, width, height)
+    else:
+        raise ValueError("Unknown type of image, size of raw image must be given.")
@@ -0,0 +1,242 @@
+"""Geometry of printed page.
+
+Port of the page geometry part of Printfile from old_cpp/Printer.cpp. The geometry depends only
+on the print parameters, so it is computed once per combination of them and shared by all files
+printed with the same parameters, see get_layout.
+
+PageLayout is immutable, its arrays are read-only, so it can be freely shared between printers,
+renderer and threads.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from paperbak.constants import NDATA, NDOT, NGROUP
+from paperbak.render import CELL, grid_lines
+
+CACHESIZE = 32  # Number of layouts kept by get_layout
+
+
+def _readonly(array):
+    """Return array which can't be modified."""
+    array.flags.writeable = False
+    return array
+
+
+class PageLayout(object):
+    """Page size, borders, dot raster and grid of blocks for the print parameters.
+
+    Parameters are the attributes of FilePrinter with the same names.
+    """
+
+    # Parameters in order of arguments
+    params = ("resx", "resy", "papersizex", "papersizey", "in_hundredths_of_milimeters",
+              "have_margins", "marginleft", "marginright", "margintop", "marginbottom",
+              "extratop", "extrabottom", "dpi", "dpipercent", "redundancy", "printborder")
+
+    __slots__ = params + (
+        "width",  # Page width, pixels
+        "height",  # Page height, pixels
+        "borderleft",  # Left page border, pixels
+        "borderright",  # Right page border, pixels
+        "bordertop",  # Top page border, pixels
+        "borderbottom",  # Bottom page border, pixels
+        "printable_width",  # Printable area in the pixels of printer's resolution
+        "printable_height",  # Printable area in the pixels of printer's resolution
+        "dx", "dy",  # Dot raster, pixels
+        "px", "py",  # Dot size, pixels
+        "border",  # Border around the data grid, pixels
+        "nx", "ny",  # Number of blocks in x and y axis
+        "bitmap_width", "bitmap_height",  # Size of bitmap with the grid, pixels
+        "pagesize",  # Size of (compressed) data on full page, bytes
+        "cell_x", "cell_y",  # Pixel column (row) of the first dot of every column (row) of cells
+        "dot_x", "dot_y",  # Offsets of dots in block, pixels
+        "block_origins",  # Pixel (row, column) of the first dot of every block, (ny, nx, 2)
+        "grid_columns", "grid_rows",  # Pixel columns and rows of grid lines
+    )
+
+    def __init__(self, resx=300, resy=300, papersizex=8270, papersizey=11690,
+                 in_hundredths_of_milimeters=False, have_margins=False, marginleft=0,
+                 marginright=0, margintop=0, marginbottom=0, extratop=0, extrabottom=0, dpi=200,
+                 dpipercent=70, redundancy=NGROUP, printborder=False):
+        values = locals()
+        for name in self.params:
+            self._set(name, values[name])
+        self._calc_page_size()
+        self._calc_borders()
+        self._calc_printable_area()
+        self._calc_dot_size()
+        self._calc_border()
+        self._calc_number_of_blocks()
+        self._calc_bitmap_size()
+        self._calc_positions()
+
+    def _set(self, name, value):
+        object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PageLayout is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError("PageLayout is immutable.")
+
+    def __reduce__(self):
+        # Unpickled layout is taken from the cache of the process.
+        return get_layout, self.get_params()
+
+    def get_params(self):
+        """Return parameters of layout in order of arguments.
+
+        :rtype: tuple
+        """
+        return tuple(getattr(self, name) for name in self.params)
+
+    def __eq__(self, other):
+        if not isinstance(other, PageLayout):
+            return NotImplemented
+        return self.get_params() == other.get_params()
+
+    def __hash__(self):
+        return hash(self.get_params())
+
+    def __repr__(self):
+        return "PageLayout(%s)" % ", ".join(
+            "%s=%r" % (name, getattr(self, name)) for name in self.params)
+
+    def _calc_page_size(self):
+        """Calculate the page size in px from printer resolution.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L630-L635  #NOQA
+        """
+        unit = 2540 if self.in_hundredths_of_milimeters else 1000
+        self._set("width", self.papersizex * self.resx // unit)
+        self._set("height", self.papersizey * self.resy // unit)
+
+    def _calc_borders(self):
+        """Calculate page borders in the pixels of printer's resolution.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L646-L660  #NOQA
+        """
+        if self.have_margins:
+            unit = 2540 if self.in_hundredths_of_milimeters else 1000
+            self._set("borderleft", self.marginleft * self.resx // unit)
+            self._set("borderright", self.marginright * self.resx // unit)
+            self._set("bordertop", self.margintop * self.resy // unit)
+            self._set("borderbottom", self.marginbottom * self.resy // unit)
+        else:
+            self._set("borderleft", self.resx)  # In original code there is no "/2" dunno why
+            self._set("borderright", self.resx // 2)
+            self._set("bordertop", self.resy // 2)
+            self._set("borderbottom", self.resy // 2)
+
+    def _calc_printable_area(self):
+        """Calculate size of printable area, in the pixels of printer's resolution.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L661-L665  #NOQA
+        """
+        self._set("printable_width", self.width - (self.borderleft + self.borderright))
+        self._set("printable_height", self.height - (
+            self.bordertop + self.borderbottom + self.extratop + self.extrabottom))
+
+    def _calc_dot_size(self):
+        """Calculate data point raster (dx,dy) and size of the point (px,py).
+
+        Note that pixels, at least in theory, may be non-rectangular.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L666-L672  #NOQA
+        """
+        self._set("dx", max(self.resx // self.dpi, 2))
+        self._set("px", max((self.dx * self.dpipercent) // 100, 1))
+        self._set("dy", max(self.resy // self.dpi, 2))
+        self._set("py", max((self.dy * self.dpipercent) // 100, 1))
+
+    def _calc_border(self):
+        """Calculate width of the border around the data grid.
+
+        Without printed border there is small gap, as in the original code when saving bitmaps.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L673-L679  #NOQA
+        """
+        self._set("border", self.dx * 16 if self.printborder else 25)
+
+    def _calc_number_of_blocks(self):
+        """Calculate the number of data blocks that fit onto the single page.
+
+        Single page must contain at least redundancy data blocks plus 1 recovery checksum,
+        and redundancy+1 superblocks with name and size of the data. Data and recovery blocks
+        should be placed into different columns.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L680-L689  #NOQA
+        """
+        nx = (self.printable_width - self.px - 2 * self.border) // (CELL * self.dx)
+        ny = (self.printable_height - self.py - 2 * self.border) // (CELL * self.dy)
+        if nx < self.redundancy + 1 or ny < 3 or nx * ny < 2 * self.redundancy + 2:
+            raise ValueError("Printable area is too small, reduce borders or block size.")
+        self._set("nx", nx)
+        self._set("ny", ny)
+        # https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L730-L736  #NOQA
+        self._set("pagesize", ((nx * ny - self.redundancy - 2) // (self.redundancy + 1)) *
+                  self.redundancy * NDATA)
+
+    def _calc_bitmap_size(self):
+        """Calculate final size of the bitmap where to draw the image.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L690-L692  #NOQA
+        """
+        self._set("bitmap_width",
+                  (self.nx * CELL * self.dx + self.px + 2 * self.border + 3) & 0xFFFFFFFC)
+        self._set("bitmap_height", self.ny * CELL * self.dy + self.py + 2 * self.border)
+
+    def _calc_positions(self):
+        """Calculate pixel positions of blocks, dots and grid lines.
+
+        Dot (j, i) of block (y, x) starts at pixel (cell_y[y] + dot_y[j], cell_x[x] + dot_x[i]).
+        """
+        self._set("cell_x", _readonly(self.border + (np.arange(self.nx) * CELL + 2) * self.dx))
+        self._set("cell_y", _readonly(self.border + (np.arange(self.ny) * CELL + 2) * self.dy))
+        self._set("dot_x", _readonly(np.arange(NDOT) * self.dx))
+        self._set("dot_y", _readonly(np.arange(NDOT) * self.dy))
+        origins = np.empty((self.ny, self.nx, 2), dtype=self.cell_x.dtype)
+        origins[..., 0] = self.cell_y[:, None]
+        origins[..., 1] = self.cell_x
+        self._set("block_origins", _readonly(origins))
+        columns, rows = grid_lines(self.nx, self.ny, self.dx, self.dy, self.px, self.py,
+                                   self.border)
+        self._set("grid_columns", _readonly(columns))
+        self._set("grid_rows", _readonly(rows))
+
+    def get_page_rows(self, size):
+        """Calculate number of groups and number of rows of the grid on page with size bytes.
+
+        The vertical size of the grid is reduced on the last page. To assure reliable
+        orientation, at least 3 rows are kept.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L821-L829  #NOQA
+
+        :param size: Size of (compressed) data on the page, at most pagesize
+        :return: Number of groups (length of string) and number of rows
+        :rtype: tuple(int, int)
+        """
+        nblocks = (size + NDATA - 1) // NDATA
+        nstring = (nblocks + self.redundancy - 1) // self.redundancy
+        nblocks = (nstring + 1) * (self.redundancy + 1) + 1
+        return nstring, min(self.ny, max((nblocks + self.nx - 1) // self.nx, 3))
+
+    def get_grid_lines(self, ny=None):
+        """Return pixel columns and rows of grid lines of the grid reduced to ny rows.
+
+        :rtype: tuple(np.ndarray, np.ndarray)
+        """
+        if ny is None:
+            ny = self.ny
+        return self.grid_columns, self.grid_rows[:(ny + 1) * self.py]
+
+
+@lru_cache(maxsize=CACHESIZE)
+def get_layout(*params):
+    """Return PageLayout for parameters, layouts are shared by all callers.
+
+    :param params: Parameters of PageLayout in order of PageLayout.params
+    :rtype: PageLayout
+    """
+    return PageLayout(*params)
@@ -0,0 +1,156 @@
+"""Capacity planning of backups without rendering pages.
+
+The number of pages is calculated from the geometry of the page (see PageLayout) and the size of
+(compressed) data of every file, including the reduced grid on the last page of file. Compressed
+size is estimated by bzip2 from few samples spread over the file, like in the compressibility
+probe of FilePrinter, so it is approximate, while uncompressed size is exact. Files are sampled
+once, then any number of settings is evaluated without touching them.
+"""
+import bz2
+import itertools
+import os
+
+from paperbak.constants import NGROUP, NGROUPMAX, NGROUPMIN
+from paperbak.layout import PageLayout, get_layout
+from paperbak.printer import PROBE_RATIO, PROBE_SAMPLES, PROBE_SIZE, FilePrinter, read_samples
+
+
+class FileEstimate(object):
+    """Size of file and estimated size of its compressed data."""
+
+    path = None  # Path of file
+    origsize = 0  # Original file size, bytes
+    packedsize = None  # Estimated size of compressed data, bytes, None if not estimated
+
+    def __init__(self, path, compressed=True, compression_level=FilePrinter.compression_level):
+        """Get size of file and estimate its compressed size if compressed is set."""
+        self.path = path
+        self.origsize = os.stat(path).st_size
+        if compressed:
+            with open(path, "rb") as file:
+                self.packedsize = self.estimate_packed_size(file, compression_level)
+
+    def estimate_packed_size(self, file, compression_level):
+        """Estimate size of file compressed by bzip2.
+
+        Small files are compressed whole. Samples which don't shrink below PROBE_RATIO mean that
+        the printer stores the file without compression.
+
+        :rtype: int
+        """
+        if self.origsize <= PROBE_SAMPLES * PROBE_SIZE:
+            return len(bz2.compress(file.read(), compression_level))
+        samples = read_samples(file, self.origsize)
+        size = sum(len(piece) for piece in samples)
+        packed = sum(len(bz2.compress(piece, compression_level)) for piece in samples)
+        if packed >= size * PROBE_RATIO:
+            return self.origsize
+        return -(-self.origsize * packed // size)
+
+    def get_datasize(self, compressed):
+        """Return size of (compressed) data aligned to 16 bytes, as printed.
+
+        Compression is turned off if it doesn't reduce the size, like in FilePrinter.
+
+        :rtype: int
+        """
+        size = self.origsize
+        if compressed:
+            if self.packedsize is None:
+                raise ValueError("Compressed size of %s wasn't estimated." % self.path)
+            size = min(self.packedsize, size)
+        return (size + 15) & 0xFFFFFFF0
+
+
+class Plan(object):
+    """Pages and bytes needed to print files with single combination of settings."""
+
+    settings = None  # Attributes of FilePrinter, dict
+    layout = None  # PageLayout of settings
+    npages = 0  # Total number of pages
+    nrows = 0  # Total number of printed rows of blocks, the last page of file is reduced
+    datasize = 0  # Total size of (compressed) data, bytes
+    files = None  # Number of pages of every file, list of tuple(path, npages)
+
+    def __init__(self, settings, layout):
+        self.settings = settings
+        self.layout = layout
+        self.files = []
+
+    def add_file(self, estimate):
+        """Add pages of file to the plan.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L730-L736  #NOQA
+        """
+        datasize = estimate.get_datasize(self.settings["compressed"])
+        pagesize = self.layout.pagesize
+        npages = (datasize + pagesize - 1) // pagesize
+        if npages:
+            self.nrows += (npages - 1) * self.layout.ny
+            self.nrows += self.layout.get_page_rows(datasize - (npages - 1) * pagesize)[1]
+        self.npages += npages
+        self.datasize += datasize
+        self.files.append((estimate.path, npages))
+
+    def get_cost(self):
+        """Return key ordering plans from the cheapest.
+
+        Plans with the same number of pages are ordered by printed rows, then the more robust
+        ones go first: more recovery blocks, lower dot density and larger dots.
+        """
+        return (self.npages, self.nrows, self.settings["redundancy"], self.settings["dpi"],
+                -self.settings["dpipercent"], self.settings["compressed"])
+
+    def __repr__(self):
+        return "<Plan %s: %d pages>" % (
+            ", ".join("%s=%r" % item for item in sorted(self.settings.items())), self.npages)
+
+
+def plan(paths, dpi=(200,), dpipercent=(70,), redundancy=(NGROUP,), compressed=(False, True),
+         **options):
+    """Evaluate all combinations of settings for printing of files.
+
+    :param paths: Paths of files
+    :param dpi: Dot rasters to try, dots per inch
+    :param dpipercent: Dot sizes to try, percent of dpi
+    :param redundancy: Numbers of data blocks per recovery block to try
+    :param compressed: Compression settings to try
+    :param options: Other attributes of FilePrinter shared by all settings, e.g. resx and resy
+    :return: Plans ordered from the cheapest, settings which don't fit onto page are skipped
+    :rtype: list of Plan
+    """
+    base = {name: getattr(FilePrinter, name) for name in PageLayout.params}
+    for name, value in options.items():
+        if name not in base:
+            raise TypeError("Unknown option %s." % name)
+        base[name] = value
+    for value in redundancy:
+        if not NGROUPMIN <= value <= NGROUPMAX:
+            raise ValueError("Redundancy is too big or too small.")
+    estimates = [FileEstimate(path, any(compressed)) for path in paths]
+
+    plans = []
+    for values in itertools.product(dpi, dpipercent, redundancy, compressed):
+        settings = dict(base, dpi=values[0], dpipercent=values[1], redundancy=values[2])
+        try:
+            layout = get_layout(*(settings[name] for name in PageLayout.params))
+        except ValueError:
+            continue  # Printable area is too small
+        settings["compressed"] = values[3]
+        result = Plan(settings, layout)
+        for estimate in estimates:
+            result.add_file(estimate)
+        plans.append(result)
+    plans.sort(key=Plan.get_cost)
+    return plans
+
+
+def cheapest(paths, *args, **kwargs):
+    """Return the cheapest plan of printing files, arguments are the same as of plan.
+
+    :rtype: Plan
+    """
+    plans = plan(paths, *args, **kwargs)
+    if not plans:
+        raise ValueError("None of the settings fits onto the page.")
+    return plans[0]
@@ -1,13 +1,71 @@
 import bz2
-import datetime
+import copy
 import os
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+from multiprocessing import shared_memory
 from stat import (
     FILE_ATTRIBUTE_ARCHIVE, FILE_ATTRIBUTE_HIDDEN, FILE_ATTRIBUTE_NORMAL, FILE_ATTRIBUTE_READONLY,
     FILE_ATTRIBUTE_SYSTEM)
 
-from paperbak.constants import MAXSIZE, NDATA, NDOT, NGROUP, NGROUPMAX, NGROUPMIN
-from paperbak.crc16 import crc16
-from paperbak.structures import SuperData
+import numpy as np
+
+from paperbak import render
+from paperbak.constants import MAXSIZE, NDATA, NGROUP, NGROUPMAX, NGROUPMIN, PACKLEN
+from paperbak.crc16 import CRC16
+from paperbak.crypto import SALTLEN, CbcEncryptor, derive_key
+from paperbak.layout import PageLayout, get_layout
+from paperbak.recovery import recovery_address, recovery_data
+from paperbak.render import BLACK
+from paperbak.structures import NAMELEN, BlockTable, SuperData
+
+
+SPOOLSIZE = 16 * PACKLEN  # Data buffer larger than this is moved from memory to temporary file
+CHUNKSIZE = 16 * PACKLEN  # Size of chunk of file compressed into separate bzip2 stream
+PROBE_SAMPLES = 4  # Number of samples of file checked by compressibility probe
+PROBE_SIZE = PACKLEN  # Size of sample, bytes
+PROBE_ENTROPY = 7.5  # Samples with lower entropy, bits per byte, are surely compressible
+PROBE_RATIO = 0.98  # Samples which don't compress below this ratio are incompressible
+
+# State of worker process of FilePrinter.render_pages
+_worker_printer = None
+_worker_memory = None
+
+
+def _from_layout(name):
+    """Return read-only attribute of printer taken from its PageLayout."""
+    return property(lambda self: getattr(self.layout, name))
+
+
+def read_samples(file, size):
+    """Read PROBE_SAMPLES samples of PROBE_SIZE bytes spread evenly over file and rewind it.
+
+    :param size: Size of file, at least PROBE_SIZE bytes
+    :rtype: list of bytes
+    """
+    samples = []
+    for offset in np.linspace(0, size - PROBE_SIZE, PROBE_SAMPLES).astype(int):
+        file.seek(offset)
+        samples.append(file.read(PROBE_SIZE))
+    file.seek(0)
+    return samples
+
+
+def _init_worker(printer, name):
+    """Attach worker process to shared memory with (compressed) data."""
+    global _worker_printer, _worker_memory
+    _worker_printer = printer
+    _worker_memory = shared_memory.SharedMemory(name=name)
+
+
+def _render_worker_page(page, bits):
+    """Draw page in worker process."""
+    start, end = _worker_printer.get_page_range(page)
+    with _worker_memory.buf[start:end] as page_data:
+        return _worker_printer.render_page(page, bits, page_data)
 
 
 class FilePrinter:
@@ -15,7 +73,14 @@ class FilePrinter:
     # Print parameters
     compressed = False  # is the file compressed
     compression_level = 1  # level of bzip compression
+    compression_workers = None  # processes compressing chunks into multi-stream data if over 1
+    compatible = True  # keep data readable by the original PaperBack, i.e. single stream
+    probe = True  # check samples of file and don't compress it if they are incompressible
+    multistream = False  # is the compressed data concatenation of bzip2 streams
     encrypted = False  # is the file encrypted
+    password = None  # password of encrypted file, empty password means no encryption
+    salt = None  # salt and IV of encryption, random if not set
+    key = None  # AES key derived from password and salt, derived if not set
     printheader = False  # should we print header
     printborder = False  # should we print border or something??
     redundancy = NGROUP  # NGROUP Redundancy (NGROUPMIN..NGROUPMAX)
@@ -27,6 +92,7 @@ class FilePrinter:
     datasize = 0  # Size of (compressed) data
     alignedsize = 0  # Data size aligned to next 16 bytes
     filecrc = None  # 16-bit CRC of (packed) data
+    crc = None  # CRC16 state of (packed) data read so far
 
     # page size
     resx = 300  # resolution, dpi (default 300)
@@ -34,20 +100,11 @@ class FilePrinter:
     in_hundredths_of_milimeters = False  # False => INTHOUSANDTHSOFINCHES units of papersize
     papersizex = 8270  # default A4 size (210x292 mm)
     papersizey = 11690  # default A4 size (210x292 mm)
-    width = None  # Page width, pixels
-    height = None  # Page height, pixels
     extratop = 0  # Height of title line, pixels
     extrabottom = 0  # Height of info line, pixels
-    printable_width = None  # printable area in the pixels of printer's resolution
-    printable_height = None  # printable area in the pixels of printer's resolution
 
     # margins
     printborder = False  # Print border around bitmap
-    border = None  # Border around the data grid, pixels
-    bordertop = 0  # Top page border, pixels
-    borderleft = 0  # Left page border, pixels
-    borderright = 0  # Right page border, pixels
-    borderbottom = 0  # Bottom page border, pixels
     have_margins = False  # Does have page set margins?
     margintop = 0  # Top printer page margin
     marginleft = 0  # Left printer page margin
@@ -58,13 +115,34 @@ class FilePrinter:
     dpi = 200  # Dot raster, dots per inch
     dpipercent = 70  # Dot size, percent of dpi
 
+    # geometry, computed by calc_layout
+    layout = None  # PageLayout shared by all printers with the same parameters
+    width = _from_layout("width")  # Page width, pixels
+    height = _from_layout("height")  # Page height, pixels
+    printable_width = _from_layout("printable_width")  # printable area, pixels
+    printable_height = _from_layout("printable_height")  # printable area, pixels
+    border = _from_layout("border")  # Border around the data grid, pixels
+    bordertop = _from_layout("bordertop")  # Top page border, pixels
+    borderleft = _from_layout("borderleft")  # Left page border, pixels
+    borderright = _from_layout("borderright")  # Right page border, pixels
+    borderbottom = _from_layout("borderbottom")  # Bottom page border, pixels
+    dx = _from_layout("dx")  # Dot raster in x axis, pixels
+    dy = _from_layout("dy")  # Dot raster in y axis, pixels
+    px = _from_layout("px")  # Dot width, pixels
+    py = _from_layout("py")  # Dot height, pixels
+    bitmap_width = _from_layout("bitmap_width")  # Width of bitmap with the grid, pixels
+    bitmap_height = _from_layout("bitmap_height")  # Height of bitmap with the grid, pixels
+
     # blocks
-    ny = None  # Number of blocks in y axis
-    nx = None  # Number of blocks in x axis
+    ny = _from_layout("ny")  # Number of blocks in y axis
+    nx = _from_layout("nx")  # Number of blocks in x axis
     pagesize = None  # Size of (compressed) data on page
+    npages = None  # Number of pages
+    black = BLACK  # Colour of dots
+    workers = None  # Number of processes drawing pages
 
     # File
-    data = None
+    buffer = None  # (compressed) data aligned to 16 bytes, spilled to disk when large
     superdata = None
 
     path = None  # path to file
@@ -73,7 +151,8 @@ class FilePrinter:
     def __init__(self, path):
         self.path = path
         self.name = os.path.basename(path)
-        if len(self.name) > 64:
+        # Name is stored encoded by UTF-8, like in SuperDataView.name.
+        if len(self.name.encode("utf8")) > NAMELEN:
             raise ValueError("Name is too long.")
 
     def get_file_info(self):
@@ -90,19 +169,192 @@ class FilePrinter:
         self.attributes = getattr(result, "st_file_attributes", FILE_ATTRIBUTE_NORMAL)
         self.mtime = datetime.utcfromtimestamp(result.st_mtime)
         self.origsize = result.st_size
+        if self.origsize == 0:
+            raise ValueError("File is empty.")
         if self.origsize > MAXSIZE:
             raise ValueError("File is too big.")
 
-    def compress_data(self):
-        """Compress the file data by bzip2.
+    def read_and_compress(self):
+        """Read the file in PACKLEN pieces and compress them by bzip2 into buffer.
+
+        Only one piece of the file is kept in memory, buffer is moved to temporary file when it
+        grows over SPOOLSIZE. Files which look incompressible by is_compressible are stored
+        without compression.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L336-L429  #NOQA
+        """
+        with open(self.path, "rb") as file:
+            if self.compressed and self.probe and not self.is_compressible(file):
+                self.compressed = False
+            self.multistream = self.use_multistream()
+            readsize = self.read_chunks(file) if self.multistream else self.read_pieces(file)
+            if readsize is None:
+                # If compressed data is larger than the file, probably the data is already
+                # packed. Silently restart without compression.
+                self.compressed = self.multistream = False
+                file.seek(0)
+                readsize = self.read_pieces(file)
+        if self.origsize != readsize:
+            self.origsize = readsize
+            # TODO: Log warning.
+        # Align size of (compressed) data to next 16-byte border. Note that bzip2
+        # doesn't mind if data passed to decompressor is longer than expected.
+        # https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L415-L420  #NOQA
+        self.alignedsize = (self.datasize + 15) & 0xFFFFFFF0
+        datasize = self.datasize
+        self.write_data(bytes(self.alignedsize - self.datasize))
+        self.datasize = datasize
+
+    def read_pieces(self, file):
+        """Read (and compress) all pieces of file into new buffer.
 
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L325-L429  #NOQA
+        :return: Number of bytes read or None if compressed data outgrew the original size.
+        """
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=SPOOLSIZE)
+        self.datasize = 0
+        self.crc = CRC16()
+        compressor = None
+        if self.compressed:
+            compressor = bz2.BZ2Compressor(self.compression_level)
+        bufsize = (self.origsize + 15) & 0xFFFFFFF0
+        readsize = 0
+        for piece in iter(lambda: file.read(PACKLEN), b""):
+            readsize += len(piece)
+            self.write_data(compressor.compress(piece) if compressor else piece)
+            if compressor and self.datasize >= bufsize:
+                break
+        else:
+            if compressor:
+                self.write_data(compressor.flush())
+            if not compressor or self.datasize < bufsize:
+                return readsize
+        self.close()
+        return None
+
+    def is_compressible(self, file):
+        """Estimate compressibility of file from few samples spread over it.
+
+        Already compressed or encrypted data has nearly 8 bits of entropy per byte. Samples with
+        high entropy are compressed by bzip2 as a trial and the file is considered incompressible
+        only if all of them together don't shrink. Small files are always tried, compression is
+        turned off after the fact if it doesn't reduce size.
         """
-        self.data = bz2.compress(self.data, compresslevel=self.compression_level)
-        self.datasize = len(self.data)
+        if self.origsize <= PROBE_SAMPLES * PROBE_SIZE:
+            return True
+        samples = read_samples(file, self.origsize)
+        sample = b"".join(samples)
+        counts = np.bincount(np.frombuffer(sample, dtype=np.uint8), minlength=256)
+        probabilities = counts[counts > 0] / len(sample)
+        if -(probabilities * np.log2(probabilities)).sum() < PROBE_ENTROPY:
+            return True
+        packed = sum(len(bz2.compress(piece, self.compression_level)) for piece in samples)
+        return packed < len(sample) * PROBE_RATIO
+
+    def use_multistream(self):
+        """Return whether file is compressed in chunks by pool of processes.
+
+        Every chunk becomes separate bzip2 stream (like in pbzip2). The original PaperBack unpacks
+        only the first stream, so the chunks are used only if compatibility is not required.
+        """
+        return bool(self.compressed and not self.compatible and self.compression_workers and
+                    self.compression_workers > 1 and self.origsize > CHUNKSIZE)
+
+    def read_chunks(self, file):
+        """Read file in CHUNKSIZE chunks and compress them in parallel into new buffer.
 
-    def calc_filecrc(self):
-        self.filecrc = crc16(self.data)
+        Streams are appended in order of chunks, at most two chunks per worker are read ahead.
+
+        :return: Number of bytes read or None if compressed data outgrew the original size.
+        """
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=SPOOLSIZE)
+        self.datasize = 0
+        self.crc = CRC16()
+        bufsize = (self.origsize + 15) & 0xFFFFFFF0
+        readsize = 0
+        with ProcessPoolExecutor(self.compression_workers) as executor:
+            pending = deque()
+            for chunk in iter(lambda: file.read(CHUNKSIZE), b""):
+                readsize += len(chunk)
+                pending.append(executor.submit(bz2.compress, chunk, self.compression_level))
+                if len(pending) >= 2 * self.compression_workers:
+                    self.write_data(pending.popleft().result())
+                    if self.datasize >= bufsize:
+                        break
+            else:
+                while pending:
+                    self.write_data(pending.popleft().result())
+                if self.datasize < bufsize:
+                    return readsize
+            for future in pending:
+                future.cancel()
+        self.close()
+        return None
+
+    def write_data(self, data):
+        """Append (compressed) data to buffer and update its size and CRC."""
+        self.buffer.write(data)
+        self.datasize += len(data)
+        self.calc_filecrc(data)
+
+    def calc_filecrc(self, data):
+        """Update CRC of (packed) data with next piece of data."""
+        self.crc.update(data)
+        self.filecrc = self.crc.value
+
+    def encrypt_data(self):
+        """Encrypt (compressed) data in buffer by AES in CBC mode.
+
+        CRC of data is calculated before encryption, so it verifies the password when the data
+        is restored. The key is derived from password unless it was derived before, e.g. by
+        print_files.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L444-L498  #NOQA
+        """
+        if not self.encrypted:
+            return
+        if not self.password and self.key is None:
+            # Empty password means: leave data unencrypted.
+            self.encrypted = False
+            return
+        if self.salt is None:
+            self.salt = os.urandom(SALTLEN)
+        if self.key is None:
+            self.key = derive_key(self.password, self.salt)
+        # The second 16-byte block of salt is the IV.
+        encryptor = CbcEncryptor(self.key, self.salt[16:])
+        self.buffer.seek(0)
+        for offset in range(0, self.alignedsize, PACKLEN):
+            piece = encryptor.update(self.buffer.read(PACKLEN))
+            self.buffer.seek(offset)
+            self.buffer.write(piece)
+
+    def get_page_range(self, page):
+        """Return start and end of (compressed) data printed on page (0-based).
+
+        :rtype: tuple(int, int)
+        """
+        start = page * self.pagesize
+        return start, start + min(self.pagesize, max(self.alignedsize - start, 0))
+
+    def get_page_data(self, page):
+        """Return (compressed) data printed on page (0-based).
+
+        :rtype: bytes
+        """
+        start, end = self.get_page_range(page)
+        self.buffer.seek(start)
+        return self.buffer.read(end - start)
+
+    def iter_pages(self):
+        """Yield (compressed) data of pages one by one."""
+        for page in range((self.alignedsize + self.pagesize - 1) // self.pagesize):
+            yield self.get_page_data(page)
+
+    def close(self):
+        """Release buffer with (compressed) data."""
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
 
     def make_superdata(self):
         """Prepare superdata block.
@@ -114,109 +366,30 @@ class FilePrinter:
         self.superdata.origsize = self.origsize
         self.superdata.pbm_compressed = self.compressed
         self.superdata.pbm_encrypted = self.encrypted
+        self.superdata.pbm_multistream = self.multistream
+        if self.compatible and not self.superdata.compatible:
+            raise ValueError("Data wouldn't be readable by the original PaperBack.")
         self.superdata.attributes = self.attributes & (
             FILE_ATTRIBUTE_READONLY | FILE_ATTRIBUTE_HIDDEN | FILE_ATTRIBUTE_SYSTEM |
             FILE_ATTRIBUTE_ARCHIVE | FILE_ATTRIBUTE_NORMAL)
         self.superdata.modified = self.mtime
         self.superdata.filecrc = self.filecrc
         if self.encrypted:
-            if len(self.name) > 31:
-                raise ValueError("Name can be only 31 characters long if encryption is enabled.")
-            # don't overwrite the salt and iv
-            self.superdata.name = self.name + "\0" * (32 - len(self.name)) + self.superdata.name
-        else:
-            self.superdata.name = self.name
-
-    def calc_page_size(self):
-        """Calculate the page size in px from printer resolution.
-
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L630-L635  #NOQA
-        """
-        if self.in_hundredths_of_milimeters:
-            self.width = self.pagesizex * self.resx / 2540
-            self.height = self.papersizey * self.resy / 2540
-        else:
-            self.width = self.pagesizex * self.resx / 1000
-            self.height = self.papersizey * self.resy / 1000
-
-    def calc_borders(self):
-        """Calculate page borders in the pixels of printer's resolution.
+            if len(self.name.encode("utf8")) > NAMELEN - SALTLEN - 1:
+                raise ValueError("Name can be only %d bytes long if encryption is enabled." % (
+                    NAMELEN - SALTLEN - 1))
+        self.superdata.name = self.name
+        self.superdata.salt = self.salt if self.encrypted else None
 
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L646-L660  #NOQA
-        """
-        if self.have_margins:
-            if self.in_hundredths_of_milimeters:
-                self.borderleft = self.marginleft * self.resx / 2540
-                self.borderright = self.marginright * self.resx / 2540
-                self.bordertop = self.margintop * self.resy / 2540
-                self.borderbottom = self.marginbottom * self.resy / 2540
-            else:
-                self.borderleft = self.marginleft * self.resx / 1000
-                self.borderright = self.marginright * self.resx / 1000
-                self.bordertop = self.margintop * self.resy / 1000
-                self.borderbottom = self.marginbottom * self.resy / 1000
-        else:
-            self.borderleft = self.resx  # In original code there is no "/2" dunno why
-            self.borderright = self.resx / 2
-            self.bordertop = self.resy / 2
-            self.borderbottom = self.resy / 2
+    def calc_layout(self):
+        """Get geometry of the page: page size, borders, dot raster and the number of blocks.
 
-    def calc_printable_area(self):
-        """Calculate size of printable area, in the pixels of printer's resolution.
+        The geometry depends only on the print parameters, so it is computed once and shared
+        by all files printed with the same parameters.
 
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L661-L665  #NOQA
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L630-L692  #NOQA
         """
-        self.printable_width = self.width - (self.borderleft + self.borderright)
-        self.printable_height = self.height - \
-            (self.bordertop + self.borderbottom + self.extratop + self.extrabottom)
-
-    def calc_dot_size(self):
-        """Calculate data point raster and size of point.
-
-        Calculate data point raster (dx,dy) and size of the point (px,py) in the
-        pixels of printer's resolution. Note that pixels, at least in theory, may
-        be non-rectangular.
-
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L666-L672  #NOQA
-        """
-
-        self.dx = max(self.resx / self.dpi, 2)
-        self.px = max((self.dx * self.dotpercent) / 100, 1)
-        self.dy = max(self.resy / self.dpi, 2)
-        self.py = max((self.dy * self.dotpercent) / 100, 1)
-
-    def calc_border(self):
-        """Calculate width of the border around the data grid.
-
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L673-L679  #NOQA
-        """
-        self.border = self.sx * 16 if self.printborder else 0
-
-    def calc_number_of_blocks(self):
-        """Calculate the number of data blocks that fit onto the single page.
-
-        Single page must contain at least redundancy data blocks plus 1 recovery checksum,
-        and redundancy+1 superblocks with name and size of the data. Data and recovery blocks
-        should be placed into different columns.
-
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L680-L689  #NOQA
-        """
-        self.nx = (self.printable_width - self.px - 2 * self.border) / \
-            (NDOT * self.dx + 3 * self.dx)
-        self.ny = (self.printable_height - self.py - 2 * self.border) / \
-            (NDOT * self.dy + 3 * self.dy)
-        if self.nx < self.redundancy + 1 or self.ny < 3 or \
-                self.nx * self.ny < 2 * self.redundancy + 2:
-            raise ValueError("Printable area is too small, reduce borders or block size.")
-
-    def calc_bitmap_size(self):
-        """Calculate final size of the bitmap where to draw the image.
-
-        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L690-L692  #NOQA
-        """
-        self.bitmap_width = (self.nx * (NDOT + 3) * self.dx +
-                             self.px + 2 * self.border + 3) & 0xFFFFFFFC
-        self.bitmap_height = self.ny * (NDOT + 3) * self.dy + self.py + 2 * self.border
+        self.layout = get_layout(*(getattr(self, name) for name in PageLayout.params))
 
     def calc_data_page_size(self):
         """Calculate the total size of useful data, bytes, that fits onto the page.
@@ -227,46 +400,253 @@ class FilePrinter:
 
         https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L730-L736  #NOQA
         """
-        self.pagesize = ((self.nx * self.ny - self.redundancy - 2) /
-                         (self.redundancy + 1)) * self.redundancy * NDATA
+        self.pagesize = self.layout.pagesize
         self.superdata.pagesize = self.pagesize
+        self.npages = (self.alignedsize + self.pagesize - 1) // self.pagesize
 
-    def print_file(self, out_path):
-        if not NGROUPMIN <= self.redundancy <= NGROUPMAX:
-            raise ValueError("Redundancy is too big or too small.")
+    def calc_page_rows(self, page):
+        """Calculate number of groups and number of rows of the grid on the page (0-based).
 
-        self.get_file_info()
+        :return: Number of groups (length of string) and number of rows
+        :rtype: tuple(int, int)
+        """
+        return self.layout.get_page_rows(min(self.alignedsize - page * self.pagesize,
+                                             self.pagesize))
 
-        with open(self.path, "rb") as file:
-            self.data = file.read()
+    def calc_cells(self, nstring):
+        """Calculate cells of strings on the page.
 
-        if self.origsize != len(self.data):
-            self.origsize = len(self.data)
-            # TODO: Log warning.
+        First block in every string (including redundancy string) is a superblock, it is
+        followed by the blocks of groups. To improve redundancy, blocks belonging to the same
+        group are not placed in the same column (consider damaged diode in laser printer).
 
-        if self.compressed:
-            self.compress_data()
-        else:
-            self.datasize = self.origsize
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L875-L926  #NOQA
 
-        # Align size of (compressed) data to next 16-byte border. Note that bzip2
-        # doesn't mind if data passed to decompressor is longer than expected.
-        # https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L415-L420  #NOQA
-        self.alignedsize = (self.datasize + 15) & 0xFFFFFFF0
-        self.data = self.data + bytes(self.alignedsize)
+        :param nstring: Number of groups on the page
+        :return: Cell index of i-th block of j-th string at [j, i], i=0 is the superblock
+        :rtype: np.ndarray, shape (redundancy + 1, nstring + 1)
+        """
+        string = np.arange(self.redundancy + 1)[:, None]
+        start = string * (nstring + 1)
+        index = np.arange(nstring + 1)
+        if nstring + 1 < self.nx:
+            return start + index
+        # Optimal shift between the first columns of the strings is nx/(redundancy+1).
+        rot = (self.nx // (self.redundancy + 1) * string - start % self.nx + self.nx) % self.nx
+        return start + (index + rot) % (nstring + 1)
+
+    def make_page_blocks(self, page, page_data=None):
+        """Prepare blocks of page (0-based) in order of cells of the grid.
+
+        Every group of redundancy data blocks is followed by its recovery block. Superblock is
+        printed in all cells which are not occupied by data.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L870-L930  #NOQA
+
+        :param page_data: Data of the page, read from buffer if not given
+        :type page_data: bytes-like object
+        :rtype: BlockTable
+        """
+        nstring, ny = self.calc_page_rows(page)
+        self.superdata.page = page + 1  # Page number is 1-based
+        self.superdata.calc_crc()
+        self.superdata.calc_ecc()
+        blocks = BlockTable(self.nx * ny)
+        self.superdata.pack_into(blocks.array)
+        blocks.array[1:] = blocks.array[0]
+
+        # Row i holds data blocks of i-th group followed by its recovery block.
+        groups = BlockTable(nstring * (self.redundancy + 1))
+        table = groups.array.reshape(nstring, self.redundancy + 1)
+        offsets = page * self.pagesize + np.arange(nstring) * self.redundancy * NDATA
+        table["address"][:, :-1] = offsets[:, None] + np.arange(self.redundancy) * NDATA
+        # Bytes beyond the data are set to 0.
+        if page_data is None:
+            page_data = self.get_page_data(page)
+        flat = np.zeros(nstring * self.redundancy * NDATA, dtype=np.uint8)
+        flat[:len(page_data)] = np.frombuffer(page_data, dtype=np.uint8)
+        table["data"][:, :-1] = flat.reshape(nstring, self.redundancy, NDATA)
+        table["address"][:, -1] = recovery_address(offsets, self.redundancy)
+        table["data"][:, -1] = recovery_data(table["data"][:, :-1])
+        groups.calc_crc()
+        groups.calc_ecc()
+        # j-th block of i-th group is in j-th string, recovery blocks are in the last string
+        blocks.array[self.calc_cells(nstring)[:, 1:].T.ravel()] = groups.array
+        return blocks
+
+    def render_page(self, page, bits=8, page_data=None):
+        """Draw page (0-based) into bitmap.
+
+        :param bits: Bits per pixel, 8 or 1
+        :param page_data: Data of the page, read from buffer if not given
+        :type page_data: bytes-like object
+        :rtype: np.ndarray
+        """
+        blocks = self.make_page_blocks(page, page_data)
+        ny = len(blocks) // self.nx
+        return render.render_page(
+            blocks.raw, self.nx, ny, self.dx, self.dy, self.px, self.py, self.border,
+            self.bitmap_width, self.printborder, self.black, bits, self.layout.get_grid_lines(ny))
+
+    def render_pages(self, workers=None, bits=8):
+        """Yield bitmaps of all pages in page order.
+
+        Pages depend only on their data and the superblock, so with more workers they are drawn
+        in parallel by a pool of processes. The (compressed) data is passed to workers once,
+        through shared memory, and at most two pages per worker are drawn ahead, so memory
+        doesn't grow with the number of pages.
+
+        :param workers: Number of processes, pages are drawn in this process if 1 or None
+        :type workers: int
+        :param bits: Bits per pixel, 8 or 1
+        """
+        if not workers or workers == 1 or self.npages <= 1:
+            for page in range(self.npages):
+                yield self.render_page(page, bits)
+            return
+
+        memory = shared_memory.SharedMemory(create=True, size=max(self.alignedsize, 1))
+        try:
+            self.buffer.seek(0)
+            offset = 0
+            for piece in iter(lambda: self.buffer.read(PACKLEN), b""):
+                memory.buf[offset:offset + len(piece)] = piece
+                offset += len(piece)
+            state = copy.copy(self)
+            state.buffer = state.crc = None
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(state, memory.name)) as executor:
+                pending = deque()
+                for page in range(self.npages):
+                    pending.append(executor.submit(_render_worker_page, page, bits))
+                    if len(pending) >= 2 * workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        finally:
+            memory.close()
+            memory.unlink()
+
+    def get_page_path(self, out_path, page):
+        """Return path of bitmap file with page (0-based).
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L955-L961  #NOQA
+        """
+        root, ext = os.path.splitext(out_path)
+        ext = ext or ".bmp"
+        if self.npages > 1:
+            return "%s_%04i%s" % (root, page + 1, ext)
+        return root + ext
 
-        # TODO: encryption
-        # https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L431-L498  #NOQA
-        if self.encrypted:
-            raise NotImplemented("Encryption is not implemented yet.")
+    def print_file(self, out_path):
+        if not NGROUPMIN <= self.redundancy <= NGROUPMAX:
+            raise ValueError("Redundancy is too big or too small.")
 
-        self.calc_filecrc()
+        self.get_file_info()
+        self.read_and_compress()
+        self.encrypt_data()
         self.make_superdata()
-        self.calc_page_size()
         # TODO: Calculate height of title and info lines on the paper. If printheader or printborder
         # https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L584-L616  #NOQA
-        self.calc_borders()
-        self.calc_printable_area()
-        self.calc_dot_size()
-        self.calc_border()
-        self.calc_number_of_blocks()
+        self.calc_layout()
+        self.calc_data_page_size()
+
+        # Formats other than BMP store 1-bit bitmaps, which take 8 times less memory.
+        bits = 8 if os.path.splitext(out_path)[1].lower() in ("", ".bmp") else 1
+        paths = []
+        # Bitmap is released before the next page is drawn, enumerate would keep it in its tuple.
+        for image in self.render_pages(self.workers, bits):
+            paths.append(self.get_page_path(out_path, len(paths)))
+            render.save_image(paths[-1], image, self.resx, self.resy)
+            del image
+        self.close()
+        return paths
+
+
+def _print_worker(path, out_path, options):
+    """Print single file in worker process of print_files.
+
+    :return: Path of file, paths of pages or None and error message or None
+    :rtype: tuple
+    """
+    try:
+        printer = FilePrinter(path)
+        for name, value in options.items():
+            setattr(printer, name, value)
+        return path, printer.print_file(out_path), None
+    except (OSError, ValueError) as error:
+        return path, None, str(error)
+
+
+def print_files(paths, outdir, ext=".bmp", workers=None, max_pages=None, **options):
+    """Print many files into page images in directory and yield them as they are finished.
+
+    Every file is compressed, protected by CRC and ECC and drawn by single worker process,
+    which saves the pages one by one and releases every bitmap before drawing the next one. So
+    every worker keeps at most one page bitmap in memory and the number of bitmaps in memory is
+    limited by limiting the number of workers. Pages of every file are drawn serially by its
+    worker and files queued for the workers don't hold any bitmaps.
+
+    Budget of compression_workers is split among the files printed at once, a single file is
+    printed in this process and gets all of them.
+
+    Keys of encrypted files are derived by the same pool as separate jobs queued ahead of the
+    files, so the slow key derivation of later files runs while earlier files are compressed
+    and drawn.
+
+    :param paths: Paths of files
+    :param outdir: Directory of page images, they are named by files
+    :param ext: Extension of page images, .bmp, .pbm, .png or .pdf
+    :param workers: Number of processes, files are printed in this process if 1 or None
+    :param max_pages: Maximal number of page bitmaps in memory at once
+    :param options: Attributes of FilePrinter, e.g. compressed, redundancy or password
+    :return: Path of file, paths of its pages or None and error message or None
+    :rtype: iterator of tuple
+    """
+    paths = list(paths)
+    names = [os.path.basename(path) for path in paths]
+    if len(set(names)) != len(names):
+        raise ValueError("Names of files must be unique.")
+    out_paths = [os.path.join(outdir, name + ext) for name in names]
+    if max_pages is not None:
+        if max_pages < 1:
+            raise ValueError("At least one page must fit into memory.")
+        workers = min(workers or 1, max_pages)
+    workers = min(workers or 1, len(paths))
+    if workers > 1 and options.get("compression_workers"):
+        # Every file process compresses by its own pool, the processes are split among them.
+        options = dict(options, compression_workers=max(
+            1, options["compression_workers"] // workers))
+    if workers <= 1:
+        for path, out_path in zip(paths, out_paths):
+            yield _print_worker(path, out_path, options)
+        return
+
+    encrypted = options.get("encrypted") and options.get("password")
+    files = zip(paths, out_paths)
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        keys = {}  # Files waiting for key: path, page images and salt by future of key
+        while True:
+            for path, out_path in islice(files, 2 * workers - len(pending)):
+                if encrypted:
+                    salt = os.urandom(SALTLEN)
+                    future = executor.submit(derive_key, options["password"], salt)
+                    keys[future] = (path, out_path, salt)
+                else:
+                    future = executor.submit(_print_worker, path, out_path, options)
+                pending.add(future)
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in keys:
+                    path, out_path, salt = keys.pop(future)
+                    try:
+                        file_options = dict(options, salt=salt, key=future.result())
+                    except ValueError as error:
+                        yield path, None, str(error)
+                        continue
+                    pending.add(executor.submit(_print_worker, path, out_path, file_options))
+                else:
+                    yield future.result()
@@ -0,0 +1,66 @@
+"""Recovery blocks of groups of data blocks.
+
+For every group of redundancy data blocks on the page one recovery block is printed. Its data is
+the inverted XOR of the data of all blocks in the group, so any single lost block of the group
+can be rebuilt from the recovery block and the remaining blocks. Address of the recovery block is
+the address of the first block of the group with redundancy in the highest 4 bits.
+
+All groups are processed at once, data of groups is passed as array of shape
+(groups, redundancy, NDATA).
+"""
+import numpy as np
+
+from paperbak.constants import NDATA
+
+
+def recovery_data(data):
+    """Calculate data of recovery blocks of groups.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L884-L901  #NOQA
+
+    :param data: Data of blocks of groups
+    :type data: np.ndarray of np.uint8, shape (groups, redundancy, NDATA)
+    :rtype: np.ndarray of np.uint8, shape (groups, NDATA)
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    if data.ndim != 3 or data.shape[2] != NDATA:
+        raise ValueError("Data must be 3D array with %d bytes per block." % NDATA)
+    return np.bitwise_xor.reduce(data, axis=1) ^ 0xFF
+
+
+def recovery_address(offset, redundancy):
+    """Return address of recovery block of group starting at offset.
+
+    :param offset: Address of the first data block of group, may be an array
+    :param redundancy: Number of data blocks in group
+    """
+    return offset ^ (redundancy << 28)
+
+
+def split_address(address):
+    """Split address of block into offset and redundancy, redundancy is 0 for data blocks.
+
+    :param address: Address of block, may be an array
+    :rtype: tuple
+    """
+    return address & 0x0FFFFFFF, address >> 28
+
+
+def rebuild(data, recovery, missing):
+    """Rebuild single missing block in every group.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L214-L229  #NOQA
+
+    :param data: Data of blocks of groups, content of missing blocks is ignored
+    :type data: np.ndarray of np.uint8, shape (groups, redundancy, NDATA)
+    :param recovery: Data of recovery blocks of groups
+    :type recovery: np.ndarray of np.uint8, shape (groups, NDATA)
+    :param missing: Index of missing block in every group
+    :type missing: np.ndarray of int, shape (groups,)
+    :return: Data of missing blocks
+    :rtype: np.ndarray of np.uint8, shape (groups, NDATA)
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    missing = np.asarray(missing)
+    known = np.arange(data.shape[1]) != missing[:, None]
+    return recovery_data(np.where(known[:, :, None], data, 0)) ^ recovery
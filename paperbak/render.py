@@ -0,0 +1,336 @@
+"""Drawing of data blocks into page bitmaps.
+
+Port of Drawblock, Fillblock and the drawing part of Printnextpage from old_cpp/Printer.cpp.
+Instead of setting pixels dot by dot, all blocks of the page are unpacked into one array of dots
+by np.unpackbits and the dots are expanded into pixels by broadcasting against the pixel mask of
+a single dot.
+
+Bitmaps are 2D numpy arrays with the top row first, 8-bit bitmaps are grayscale (0 is black),
+1-bit bitmaps are boolean with True for black. Bitmaps are saved as BMP like in the original
+code, or as PBM, PNG or PDF, which store 1-bit bitmaps without expanding them to bytes.
+"""
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from paperbak.constants import NDOT
+
+CELL = NDOT + 3  # Size of cell with block, grid line and gaps between them, dots
+WHITE = 255  # Colour of paper
+GRID = 0  # Colour of grid lines
+BLACK = 64  # Colour of dots, dark gray simplifies recognition of grid on high-contrast bitmap
+
+BLOCKSIZE = NDOT * NDOT // 8  # Size of block, bytes
+
+# Rows of dots are XOR-ed with 55 or AA to increase reliability of empty or half-empty blocks.
+SCRAMBLE = np.array([0x55, 0xAA] * (NDOT // 2), dtype=np.uint8).reshape(NDOT, 1)
+
+
+def _unpack_rows(rows):
+    """Unpack rows of dots stored as 32-bit little endian words, bit i is the dot in column i.
+
+    :type rows: np.ndarray of np.uint8, shape (..., 32, 4)
+    :rtype: np.ndarray of bool, shape (..., 32, 32)
+    """
+    return np.unpackbits(rows, axis=-1, bitorder="little").view(bool)
+
+
+def block_dots(raw):
+    """Unpack blocks into dots.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L164-L198  #NOQA
+
+    :param raw: Blocks with calculated CRC and ECC, one block per row
+    :type raw: np.ndarray of np.uint8, shape (N, 128)
+    :return: Dots of blocks, True is black dot
+    :rtype: np.ndarray of bool, shape (N, 32, 32)
+    """
+    raw = np.asarray(raw, dtype=np.uint8)
+    if raw.ndim != 2 or raw.shape[1] != BLOCKSIZE:
+        raise ValueError("Blocks must be 2D array with %d bytes per row." % BLOCKSIZE)
+    return _unpack_rows(raw.reshape(-1, NDOT, NDOT // 8) ^ SCRAMBLE)
+
+
+def fill_dots(blockx, blocky, nx, ny):
+    """Return regular raster drawn into the cell outside the data grid.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L203-L237  #NOQA
+
+    :param blockx: Column of the cell, -1 or nx for cells in left and right border
+    :param blocky: Row of the cell, -1 or ny for cells in top and bottom border
+    :rtype: np.ndarray of bool, shape (32, 32)
+    """
+    words = np.empty(NDOT, dtype="<u4")
+    for j in range(NDOT):
+        if j & 1 == 0:
+            words[j] = 0x55555555
+        elif blocky < 0 and j <= 24:
+            words[j] = 0
+        elif blocky >= ny and j > 8:
+            words[j] = 0
+        elif blockx < 0:
+            words[j] = 0xAA000000
+        elif blockx >= nx:
+            words[j] = 0x000000AA
+        else:
+            words[j] = 0xAAAAAAAA
+    return _unpack_rows(words.view(np.uint8).reshape(NDOT, 4))
+
+
+def _paste(image, canvas, top, left):
+    """Copy canvas into image at position top, left, parts outside of image are clipped."""
+    y0, x0 = max(top, 0), max(left, 0)
+    y1 = min(top + canvas.shape[0], image.shape[0])
+    x1 = min(left + canvas.shape[1], image.shape[1])
+    if y0 < y1 and x0 < x1:
+        image[y0:y1, x0:x1] = canvas[y0 - top:y1 - top, x0 - left:x1 - left]
+
+
+def draw_dots(cells, dx, dy, px, py):
+    """Expand dots of cells into pixels.
+
+    Dot (j, i) of cell (y, x) covers px*py pixels starting at pixel
+    ((y * CELL + 2 + j) * dy, (x * CELL + 2 + i) * dx).
+
+    :param cells: Dots of cells, True is black dot
+    :type cells: np.ndarray of bool, shape (rows, columns, 32, 32)
+    :return: Pixels, True is black pixel
+    :rtype: np.ndarray of bool, shape (rows * CELL * dy, columns * CELL * dx)
+    """
+    rows, columns = cells.shape[:2]
+    dots = np.zeros((rows, CELL, columns, CELL), dtype=bool)
+    dots[:, 2:NDOT + 2, :, 2:NDOT + 2] = cells.transpose(0, 2, 1, 3)
+    dot = np.zeros((dy, dx), dtype=bool)
+    dot[:py, :px] = True
+    pixels = dots[:, :, None, :, :, None] & dot[:, None, None, :]
+    return pixels.reshape(rows * CELL * dy, columns * CELL * dx)
+
+
+def grid_lines(nx, ny, dx, dy, px, py, border):
+    """Return pixel columns and rows of vertical and horizontal grid lines.
+
+    :rtype: tuple(np.ndarray, np.ndarray)
+    """
+    columns = (border + np.arange(nx + 1)[:, None] * CELL * dx + np.arange(px)).ravel()
+    rows = (border + np.arange(ny + 1)[:, None] * CELL * dy + np.arange(py)).ravel()
+    return columns, rows
+
+
+def _draw_grid(image, value, columns, rows, nx, ny, dx, dy, px, py, border, printborder):
+    """Draw vertical and horizontal grid lines.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L833-L859  #NOQA
+    """
+    if printborder:
+        image[:, columns] = value
+        image[rows, :] = value
+    else:
+        image[border:border + ny * CELL * dy + py, columns] = value
+        image[rows, border:border + nx * CELL * dx + px] = value
+
+
+def render_page(raw, nx, ny, dx, dy, px, py, border, width, printborder=False, black=BLACK,
+                bits=8, lines=None):
+    """Draw blocks of the page into bitmap.
+
+    Blocks are placed into the cells of grid row by row. When printborder is set, the border
+    around the grid is filled with regular raster.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L831-L868  #NOQA
+
+    :param raw: Blocks with calculated CRC and ECC in order of cells
+    :type raw: np.ndarray of np.uint8, shape (nx * ny, 128)
+    :param nx: Number of blocks in x axis
+    :param ny: Number of blocks in y axis
+    :param dx: Dot raster in x axis, pixels
+    :param dy: Dot raster in y axis, pixels
+    :param px: Dot width, pixels
+    :param py: Dot height, pixels
+    :param border: Border around the data grid, pixels
+    :param width: Bitmap width, pixels
+    :param printborder: Fill border with raster
+    :param black: Colour of dots in 8-bit bitmap
+    :param bits: Bits per pixel, 8 or 1
+    :param lines: Pixel columns and rows of grid lines as returned by grid_lines, calculated if
+                  not given, e.g. by PageLayout.get_grid_lines
+    :type lines: tuple(np.ndarray, np.ndarray)
+    :rtype: np.ndarray of np.uint8 or bool, shape (ny * CELL * dy + py + 2 * border, width)
+    """
+    if bits not in (1, 8):
+        raise ValueError("Bitmap can have only 1 or 8 bits per pixel.")
+    if len(raw) != nx * ny:
+        raise ValueError("Number of blocks doesn't match the number of cells.")
+    height = ny * CELL * dy + py + 2 * border
+    # Cells in border are included, so their raster is drawn with blocks.
+    cells = np.zeros((ny + 2, nx + 2, NDOT, NDOT), dtype=bool)
+    cells[1:-1, 1:-1] = block_dots(raw).reshape(ny, nx, NDOT, NDOT)
+    if printborder:
+        for y in range(-1, ny + 1):
+            cells[y + 1, 0] = fill_dots(-1, y, nx, ny)
+            cells[y + 1, -1] = fill_dots(nx, y, nx, ny)
+        for x in range(nx):
+            cells[0, x + 1] = fill_dots(x, -1, nx, ny)
+            cells[-1, x + 1] = fill_dots(x, ny, nx, ny)
+    columns, rows = grid_lines(nx, ny, dx, dy, px, py, border) if lines is None else lines
+    dots = np.zeros((height, width), dtype=bool)
+    _paste(dots, draw_dots(cells, dx, dy, px, py), border - CELL * dy, border - CELL * dx)
+    if bits == 1:
+        _draw_grid(dots, True, columns, rows, nx, ny, dx, dy, px, py, border, printborder)
+        return dots
+    image = np.full((height, width), WHITE, dtype=np.uint8)
+    image[dots] = black
+    _draw_grid(image, GRID, columns, rows, nx, ny, dx, dy, px, py, border, printborder)
+    return image
+
+
+def save_bmp(path, image, resx=0, resy=0):
+    """Save 8-bit grayscale bitmap as BMP file.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Printer.cpp#L955-L998  #NOQA
+
+    :param path: Path of the file
+    :param image: Bitmap with top row first, width must be multiple of 4
+    :type image: np.ndarray of np.uint8
+    :param resx: Horizontal resolution, dpi
+    :param resy: Vertical resolution, dpi
+    """
+    height, width = image.shape
+    if width % 4:
+        raise ValueError("Width of bitmap must be multiple of 4.")
+    palette = np.repeat(np.arange(256, dtype=np.uint8), 4).reshape(256, 4)
+    palette[:, 3] = 0
+    offset = 14 + 40 + palette.nbytes
+    with open(path, "wb") as file:
+        file.write(struct.pack("<2sIHHI", b"BM", offset + width * height, 0, 0, offset))
+        file.write(struct.pack(
+            "<IiiHHIIiiII", 40, width, height, 1, 8, 0, 0, resx * 10000 // 254,
+            resy * 10000 // 254, 256, 256))
+        file.write(palette.tobytes())
+        # Rows of BMP are stored from bottom to top.
+        file.write(np.ascontiguousarray(image[::-1], dtype=np.uint8).tobytes())
+
+
+def _to_1bit(image):
+    """Return 1-bit bitmap, pixels of 8-bit bitmap which are not white are black."""
+    return image if image.dtype == bool else image != WHITE
+
+
+def _to_8bit(image):
+    """Return 8-bit bitmap, black pixels of 1-bit bitmap are drawn as grid."""
+    return np.where(image, GRID, WHITE).astype(np.uint8) if image.dtype == bool else image
+
+
+def save_pbm(path, image):
+    """Save bitmap as binary PBM file, 8-bit bitmap is converted to 1-bit.
+
+    :param path: Path of the file
+    :param image: Bitmap with top row first
+    :type image: np.ndarray of bool or np.uint8
+    """
+    height, width = image.shape
+    with open(path, "wb") as file:
+        file.write(b"P4\n%d %d\n" % (width, height))
+        file.write(np.packbits(_to_1bit(image), axis=1).tobytes())
+
+
+def _png_chunk(kind, data):
+    """Return PNG chunk with its length and CRC."""
+    return struct.pack(">I", len(data)) + kind + data + \
+        struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def _png_bytes(image, resx=0, resy=0):
+    """Return grayscale PNG with bitmap, 1-bit bitmaps are stored with 1 bit per pixel."""
+    height, width = image.shape
+    if image.dtype == bool:
+        depth, rows = 1, np.packbits(~image, axis=1)
+    else:
+        depth, rows = 8, image
+    # Every row starts with filter type 0 (none).
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), rows])
+    chunks = [_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, depth, 0, 0, 0, 0))]
+    if resx and resy:
+        chunks.append(_png_chunk(b"pHYs", struct.pack(
+            ">IIB", resx * 10000 // 254, resy * 10000 // 254, 1)))
+    chunks.append(_png_chunk(b"IDAT", zlib.compress(rows.tobytes())))
+    chunks.append(_png_chunk(b"IEND", b""))
+    return b"\x89PNG\r\n\x1a\n" + b"".join(chunks)
+
+
+def save_png(path, image, resx=0, resy=0):
+    """Save bitmap as grayscale PNG file.
+
+    :param path: Path of the file
+    :param image: Bitmap with top row first
+    :type image: np.ndarray of bool or np.uint8
+    :param resx: Horizontal resolution, dpi
+    :param resy: Vertical resolution, dpi
+    """
+    with open(path, "wb") as file:
+        file.write(_png_bytes(image, resx, resy))
+
+
+def save_pdf(path, image, resx=0, resy=0):
+    """Save bitmap as single page PDF file, the page has the size of the bitmap.
+
+    :param path: Path of the file
+    :param image: Bitmap with top row first
+    :type image: np.ndarray of bool or np.uint8
+    :param resx: Horizontal resolution, dpi (default 300)
+    :param resy: Vertical resolution, dpi (default 300)
+    """
+    height, width = image.shape
+    if image.dtype == bool:
+        depth, pixels = 1, np.packbits(~image, axis=1)
+    else:
+        depth, pixels = 8, image
+    pixels = zlib.compress(np.ascontiguousarray(pixels).tobytes())
+    sizex = width * 72.0 / (resx or 300)
+    sizey = height * 72.0 / (resy or 300)
+    content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (sizex, sizey)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Contents 4 0 R "
+        b"/Resources << /XObject << /Im0 5 0 R >> >> >>" % (sizex, sizey),
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+        b"/BitsPerComponent %d /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream" % (
+            width, height, depth, len(pixels), pixels),
+    ]
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, xref))
+
+
+def save_image(path, image, resx=0, resy=0):
+    """Save bitmap in format given by extension of path: .bmp, .pbm, .png or .pdf.
+
+    :param path: Path of the file
+    :param image: Bitmap with top row first
+    :type image: np.ndarray of bool or np.uint8
+    :param resx: Horizontal resolution, dpi
+    :param resy: Vertical resolution, dpi
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".bmp":
+        save_bmp(path, _to_8bit(image), resx, resy)
+    elif ext == ".pbm":
+        save_pbm(path, image)
+    elif ext == ".png":
+        save_png(path, image, resx, resy)
+    elif ext == ".pdf":
+        save_pdf(path, image, resx, resy)
+    else:
+        raise ValueError("Unsupported image format %s." % ext)
@@ -0,0 +1,607 @@
+"""Assembling of files from blocks decoded from scanned pages.
+
+Port of Startnextpage, Addblock and Finishpage from old_cpp/Fileproc.cpp. Blocks are added in
+batches, addresses of the whole batch are checked and the data is scattered into preallocated
+buffer at once. Validity of blocks is kept in numpy bitmap together with the number of missing
+blocks of every page, so the list of pages which still need scanning is known without walking
+the bitmap.
+
+Restored file is written while the pages are gathered. Whenever the prefix of valid data grows,
+it is decrypted, checksummed and passed through bz2 decompressor to the output in PACKLEN
+pieces, so the memory needed doesn't depend on the size of the original file. Multi-stream data
+is unpacked stream after stream.
+
+Restorer decodes image files in a pool of processes and routes the pages to assemblers of
+their files, every file is saved as soon as its last page is processed.
+"""
+import bz2
+import mmap
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from stat import FILE_ATTRIBUTE_READONLY, S_IMODE
+
+import numpy as np
+
+from paperbak.constants import NDATA, PACKLEN
+from paperbak.crc16 import CRC16
+from paperbak.crypto import CbcDecryptor, derive_key
+from paperbak.decoder import BitmapDecoder
+from paperbak.images import iter_images
+from paperbak.recovery import rebuild, split_address
+from paperbak.structures import BlockTable, SuperData
+
+
+class FileAssembler(object):
+    """Descriptor of file restored from pages.
+
+    Pages are processed one by one: start_page with the superblock of the page, add_blocks
+    with decoded blocks and finish_page, which rebuilds missing blocks from recovery blocks.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/paperbak.h#L255-L283  #NOQA
+    """
+
+    # general file data, copied from superblock
+    name = None  # File name
+    modified = None  # Time of last file modification
+    attributes = None  # Basic file attributes
+    datasize = None  # Size of (compressed) data
+    pagesize = None  # Size of (compressed) data on page, 0 if pages of different layout are mixed
+    origsize = None  # Size of original (uncompressed) data
+    mode = None  # Special mode bits, set of PBM_xxx
+    filecrc = None  # CRC of decrypted packed file
+    salt = None  # Salt and IV of encrypted file
+    npages = 0  # Total number of pages
+
+    # currently processed page
+    page = None  # Currently processed page (1-based)
+    minblock = None  # Index of the first block on the page
+    maxblock = None  # Index after the last block on the page
+
+    # gathered data
+    nblock = 0  # Total number of data blocks
+    ndata = 0  # Number of valid data blocks so far
+    ngroup = None  # Number of data blocks in group, known from the first recovery block
+    valid = None  # Validity of data blocks, np.ndarray of bool
+    missing = None  # Number of missing blocks on every page, np.ndarray of int
+    recovery = None  # Data of recovery blocks of groups, np.ndarray of np.uint8
+    hasrecovery = None  # Recovery block of group was read, np.ndarray of bool
+
+    # statistics
+    goodblocks = 0  # Total number of good blocks read
+    badblocks = 0  # Total number of unreadable blocks
+    restoredbytes = 0  # Total number of bytes restored by ECC
+    recoveredblocks = 0  # Total number of blocks rebuilt from recovery blocks
+
+    # output
+    output = None  # File object receiving restored data as the valid prefix grows
+    prefix = 0  # Number of leading data blocks which are all valid
+    written = 0  # Number of bytes of (compressed) data passed to output
+    restored = 0  # Number of bytes of restored file written to output
+    crc = None  # CRC16 of (compressed) data passed to output
+    decompressor = None  # bz2.BZ2Decompressor of compressed data
+    decryptor = None  # CbcDecryptor of encrypted data
+
+    def __init__(self, superblock, path=None):
+        """Prepare buffer for the data of file described by superblock.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L85-L123  #NOQA
+
+        :param superblock: Superblock of any page of the file
+        :type superblock: SuperData or SuperDataView
+        :param path: Memory map the data to file at path instead of keeping it in memory
+        :type path: str
+        """
+        self.name = superblock.name
+        self.modified = superblock.modified
+        self.attributes = int(superblock.attributes)
+        self.datasize = int(superblock.datasize)
+        self.pagesize = int(superblock.pagesize)
+        self.origsize = int(superblock.origsize)
+        self.mode = int(superblock.mode)
+        self.filecrc = int(superblock.filecrc)
+        self.salt = superblock.salt
+        self.nblock = (self.datasize + NDATA - 1) // NDATA
+        size = self.nblock * NDATA
+        if path is None or size == 0:
+            self.buffer = bytearray(size)
+        else:
+            with open(path, "w+b") as file:
+                file.truncate(size)
+                self.buffer = mmap.mmap(file.fileno(), size)
+        self.blocks = np.frombuffer(self.buffer, dtype=np.uint8).reshape(self.nblock, NDATA)
+        self.valid = np.zeros(self.nblock, dtype=bool)
+        if self.pagesize > 0:
+            self.npages = (self.datasize + self.pagesize - 1) // self.pagesize
+            self.missing = np.minimum(
+                self.page_blocks, self.nblock - np.arange(self.npages) * self.page_blocks)
+        else:
+            self.missing = np.zeros(0, dtype=int)
+        self.start_page(superblock)
+
+    @property
+    def page_blocks(self):
+        """Number of data blocks on a page."""
+        return self.pagesize // NDATA
+
+    @property
+    def complete(self):
+        """All data blocks of the file are valid."""
+        return self.ndata == self.nblock
+
+    @property
+    def data(self):
+        """Gathered (compressed) data of the file.
+
+        :rtype: memoryview
+        """
+        return memoryview(self.buffer)[:self.datasize]
+
+    def matches(self, superblock):
+        """Check whether page with superblock belongs to the file.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L69-L79  #NOQA
+        """
+        return (superblock.name == self.name and int(superblock.mode) == self.mode and
+                superblock.modified == self.modified and
+                int(superblock.datasize) == self.datasize and
+                int(superblock.origsize) == self.origsize)
+
+    def start_page(self, superblock):
+        """Start processing of the page with superblock.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L80-L131  #NOQA
+        """
+        if not self.matches(superblock):
+            raise ValueError("Page doesn't belong to the file.")
+        # Two backup copies printed with different settings.
+        if int(superblock.pagesize) != self.pagesize:
+            # Pages of the copies don't match, missing blocks can't be counted per page.
+            self.pagesize = 0
+            self.missing = np.zeros(0, dtype=int)
+        self.page = int(superblock.page)
+        self.minblock = self.maxblock = None
+
+    def _touch(self, first, last):
+        """Extend range of blocks on the current page."""
+        if len(first):
+            first, last = int(first.min()), int(last.max())
+            self.minblock = first if self.minblock is None else min(self.minblock, first)
+            self.maxblock = last if self.maxblock is None else max(self.maxblock, last)
+
+    def _validate(self, index):
+        """Mark data blocks at index as valid, index must not contain valid blocks."""
+        self.valid[index] = True
+        self.ndata += len(index)
+        if len(self.missing):
+            self.missing -= np.bincount(index // self.page_blocks, minlength=len(self.missing))
+
+    def add_blocks(self, blocks):
+        """Add data and recovery blocks recognized by decoder.
+
+        Blocks with invalid address are ignored. Data of recovery blocks is kept for rebuilding
+        of missing blocks of their groups.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L134-L177  #NOQA
+
+        :type blocks: BlockTable
+        :return: Number of accepted blocks
+        :rtype: int
+        """
+        array = blocks.array
+        offset, redundancy = split_address(array["address"].astype(np.int64))
+        index = offset // NDATA
+        accepted = (redundancy == 0) & (offset % NDATA == 0) & (index < self.nblock)
+        new = accepted.copy()
+        new[accepted] = ~self.valid[index[accepted]]
+        # The same block may be read several times, keep only the first one.
+        index, first = np.unique(index[new], return_index=True)
+        self.blocks[index] = array["data"][new][first]
+        self._validate(index)
+        self._touch(index, index + 1)
+
+        isrecovery = redundancy > 0
+        if isrecovery.any() and self.ngroup is None:
+            self.ngroup = int(redundancy[isrecovery][0])
+            ngroups = (self.nblock + self.ngroup - 1) // self.ngroup
+            self.recovery = np.zeros((ngroups, NDATA), dtype=np.uint8)
+            self.hasrecovery = np.zeros(ngroups, dtype=bool)
+        if self.ngroup is not None:
+            size = self.ngroup * NDATA
+            isrecovery &= (redundancy == self.ngroup) & (offset % size == 0)
+            isrecovery &= offset // size < len(self.recovery)
+            group = offset[isrecovery] // size
+            self.recovery[group] = array["data"][isrecovery]
+            self.hasrecovery[group] = True
+            self._touch(group * self.ngroup, (group + 1) * self.ngroup)
+            accepted |= isrecovery
+        return int(accepted.sum())
+
+    def recover(self):
+        """Rebuild missing blocks of groups on the current page from recovery blocks.
+
+        Single missing block can be rebuilt in every group. Blocks of the last group beyond the
+        end of data are printed as zeros, so they are never missing.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L196-L232  #NOQA
+
+        :return: Number of rebuilt blocks
+        :rtype: int
+        """
+        if self.ngroup is None or self.minblock is None:
+            return 0
+        groups = np.arange(self.minblock // self.ngroup,
+                           (self.maxblock + self.ngroup - 1) // self.ngroup)
+        index = groups[:, None] * self.ngroup + np.arange(self.ngroup)
+        inside = index < self.nblock
+        index = np.minimum(index, self.nblock - 1)
+        known = ~inside | self.valid[index]
+        rebuildable = ((~known).sum(axis=1) == 1) & self.hasrecovery[groups]
+        if not rebuildable.any():
+            return 0
+        index, inside, known = index[rebuildable], inside[rebuildable], known[rebuildable]
+        data = np.where(inside[:, :, None], self.blocks[index], 0)
+        missing = np.argmin(known, axis=1)
+        target = index[np.arange(len(index)), missing]
+        self.blocks[target] = rebuild(data, self.recovery[groups[rebuildable]], missing)
+        self._validate(target)
+        self.recoveredblocks += len(target)
+        return len(target)
+
+    def finish_page(self, ngood=0, nbad=0, nrestored=0):
+        """Finish processing of the current page.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L179-L269  #NOQA
+
+        :param ngood: Number of good blocks on the page
+        :param nbad: Number of unreadable blocks on the page
+        :param nrestored: Number of bytes restored by ECC on the page
+        :return: Pages which still need to be scanned, 1-based
+        :rtype: list
+        """
+        self.goodblocks += ngood
+        self.badblocks += nbad
+        self.restoredbytes += nrestored
+        self.recover()
+        self.minblock = self.maxblock = None
+        if self.output is not None:
+            self.write_output()
+        return self.remaining_pages()
+
+    def remaining_pages(self):
+        """Return list of (partially) incomplete pages, 1-based.
+
+        Pages are unknown if pages printed with different settings are mixed.
+
+        :rtype: list
+        """
+        if not self.pagesize:
+            return []
+        return (np.flatnonzero(self.missing) + 1).tolist()
+
+    def open_output(self, file, key=None):
+        """Start writing restored file, data gathered so far is written immediately.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L290-L325  #NOQA
+
+        :param file: File object opened for binary writing
+        :param key: Key of encrypted data, see crypto.derive_key
+        :type key: bytes
+        """
+        self.decryptor = None
+        if self.mode & SuperData.PBM_ENCRYPTED:
+            if self.datasize & 0xF:
+                raise ValueError("Encrypted data is not aligned.")
+            if key is None:
+                raise ValueError("Data is encrypted, password is required.")
+            # The second 16-byte block of salt is the IV.
+            self.decryptor = CbcDecryptor(key, self.salt[16:])
+        self.output = file
+        self.written = self.restored = 0
+        self.crc = CRC16()
+        self.decompressor = None
+        if self.mode & SuperData.PBM_COMPRESSED:
+            self.decompressor = bz2.BZ2Decompressor()
+        self.write_output()
+
+    def _advance_prefix(self):
+        """Extend the prefix of valid blocks."""
+        rest = self.valid[self.prefix:]
+        if len(rest):
+            end = int(np.argmin(rest))
+            self.prefix += len(rest) if rest[end] else end
+
+    def _write(self, piece):
+        """Write (unpacked) piece of data to output."""
+        if self.decompressor is None:
+            # Data is aligned to 16 bytes, cut the padding.
+            piece = piece[:max(self.origsize - self.restored, 0)]
+            self.output.write(piece)
+            self.restored += len(piece)
+            return
+        try:
+            while len(piece):
+                if self.decompressor.eof:
+                    # Another stream of multi-stream data follows, unless it's zero padding
+                    # after the last stream.
+                    if piece[0] == 0:
+                        return
+                    self.decompressor = bz2.BZ2Decompressor()
+                unpacked = self.decompressor.decompress(piece, PACKLEN)
+                while not self.decompressor.eof and not self.decompressor.needs_input:
+                    self.output.write(unpacked)
+                    self.restored += len(unpacked)
+                    unpacked = self.decompressor.decompress(b"", PACKLEN)
+                self.output.write(unpacked)
+                self.restored += len(unpacked)
+                piece = self.decompressor.unused_data if self.decompressor.eof else b""
+        except OSError:
+            raise ValueError("Unable to unpack data.")
+
+    def write_output(self):
+        """Checksum newly valid prefix of data and write it (unpacked) to output."""
+        self._advance_prefix()
+        end = min(self.prefix * NDATA, self.datasize)
+        if self.decryptor is not None:
+            end &= ~0xF  # AES decrypts whole 16-byte blocks
+        with memoryview(self.buffer) as view:
+            start = self.written
+            while start < end:
+                # Pieces end at multiples of PACKLEN, so the CRC and the decryptor get pieces
+                # of the same size, whatever the length of the prefix.
+                stop = min((start // PACKLEN + 1) * PACKLEN, end)
+                piece = view[start:stop]
+                start = stop
+                if self.decryptor is not None:
+                    piece = self.decryptor.update(piece)
+                self.crc.update(piece)
+                self._write(piece)
+        self.written = max(self.written, end)
+
+    def close_output(self):
+        """Finish writing of restored file and verify it.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L329-L350  #NOQA
+        """
+        self.write_output()
+        self.output = None
+        if not self.complete:
+            raise ValueError("Data is incomplete.")
+        if self.crc.value != self.filecrc:
+            if self.decryptor is not None:
+                raise ValueError("Invalid password.")
+            raise ValueError("CRC of restored data doesn't match.")
+        if self.decompressor is not None and not self.decompressor.eof:
+            raise ValueError("Unable to unpack data.")
+
+    def save(self, path, key=None):
+        """Save restored file, restore its modification time and read-only attribute.
+
+        https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Fileproc.cpp#L271-L376  #NOQA
+
+        :param path: Path of the restored file
+        :param key: Key of encrypted data, see crypto.derive_key
+        """
+        if not self.complete:
+            raise ValueError("Data is incomplete.")
+        with open(path, "wb") as file:
+            self.open_output(file, key)
+            self.close_output()
+        self.set_file_info(path)
+
+    def set_file_info(self, path):
+        """Restore modification time and read-only attribute of saved file."""
+        timestamp = self.modified.get_datetime().timestamp()
+        os.utime(path, (timestamp, timestamp))
+        if self.attributes & FILE_ATTRIBUTE_READONLY:
+            os.chmod(path, S_IMODE(os.stat(path).st_mode) & ~0o222)
+
+    def close(self):
+        """Release buffer with the data, views returned by data must be released before."""
+        self.blocks = None
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.buffer = None
+
+
+class DecodedPage(object):
+    """Result of decoding of single page, passed from worker processes."""
+
+    path = None  # Path of image file
+    superblock = None  # Bytes of superblock, None if it wasn't recognized
+    blocks = None  # Data and recovery blocks, np.ndarray of dtype Data.dt
+    ngood = 0  # Number of good blocks
+    nbad = 0  # Number of unreadable blocks
+    nrestored = 0  # Number of bytes restored by ECC
+    error = None  # Reason why page wasn't decoded
+    load = 0.0  # Time of loading of image, seconds
+    decode = 0.0  # Time of decoding, seconds
+
+
+def decode_file(path, width=None, height=None, workers=None):
+    """Decode all pages stored in image file.
+
+    :param width: Width of raw images, pixels
+    :param height: Height of raw images, pixels
+    :param workers: Number of processes decoding rows of blocks of every page
+    :rtype: list of DecodedPage
+    """
+    pages = []
+    images = iter_images(path, width, height)
+    while True:
+        page = DecodedPage()
+        page.path = path
+        start = time.perf_counter()
+        try:
+            image = next(images, None)
+            if image is None:
+                break
+            page.load = time.perf_counter() - start
+            decoder = BitmapDecoder(image, workers)
+            page.blocks = decoder.decode().array
+        except (OSError, ValueError) as error:
+            page.error = str(error)
+            pages.append(page)
+            break
+        finally:
+            page.decode = time.perf_counter() - start - page.load
+        if decoder.superblock is not None:
+            page.superblock = decoder.superblock.tobytes()
+        page.ngood, page.nbad, page.nrestored = decoder.ngood, decoder.nbad, decoder.nrestored
+        pages.append(page)
+    return pages
+
+
+class Restorer(object):
+    """Router of decoded pages to assemblers of their files.
+
+    Replaces the queue of bitmaps from old_cpp/Service.cpp and the table of processed files
+    from old_cpp/Fileproc.cpp. Image files are decoded by a pool of processes, at most two
+    files per worker are queued. Single image file is decoded in this process and the rows of
+    blocks of its pages are split among the workers instead. Data of every file is written to
+    output directory as it is gathered and the file is renamed to its name once it is complete.
+
+    https://github.com/BrnoPCmaniak/python-paperbak/blob/dfba2a395bfeec4dafe9566afa4eb96c68771423/old_cpp/Service.cpp#L145-L197  #NOQA
+    """
+
+    outdir = "."  # Directory of restored files
+    workers = None  # Number of processes decoding images
+    width = height = None  # Size of raw images, pixels
+    npages = 0  # Number of processed pages
+    password = None  # Password of encrypted files
+
+    def __init__(self, outdir=".", workers=None, password=None):
+        self.outdir = outdir
+        self.workers = workers
+        self.password = password
+        self.assemblers = {}  # Incomplete files: assembler, output file and path by file key
+        self.finished = set()  # Keys of saved files
+        self.errors = []  # Pages which were not processed: path of image and reason
+        self.times = {"load": 0.0, "decode": 0.0, "assemble": 0.0}  # Time of stages, seconds
+
+    @staticmethod
+    def file_key(superblock):
+        """Return key identifying the file the page belongs to."""
+        return superblock.name, int(superblock.modified), int(superblock.origsize)
+
+    def get_output_path(self, name):
+        """Return path of restored file, directories in name are ignored."""
+        return os.path.join(self.outdir, os.path.basename(name.replace("\\", "/")) or "restored")
+
+    def add_page(self, page):
+        """Route decoded page to the assembler of its file and save the file if it is complete.
+
+        :type page: DecodedPage
+        :return: Path of saved file or None
+        """
+        self.npages += 1
+        self.times["load"] += page.load
+        self.times["decode"] += page.decode
+        if page.error is not None:
+            self.errors.append((page.path, page.error))
+            return None
+        if page.superblock is None:
+            self.errors.append((page.path, "Page label is not readable."))
+            return None
+        start = time.perf_counter()
+        try:
+            return self._add_page(page)
+        finally:
+            self.times["assemble"] += time.perf_counter() - start
+
+    def _add_page(self, page):
+        superblock = SuperData.frombuffer(bytearray(page.superblock))
+        key = self.file_key(superblock)
+        if key in self.finished:
+            return None  # Page of already restored file
+        if key not in self.assemblers:
+            assembler = FileAssembler(superblock)
+            path = self.get_output_path(assembler.name)
+            output = open(path + ".part", "wb")
+            self.assemblers[key] = (assembler, output, path)
+            try:
+                aes_key = None
+                if assembler.salt is not None and self.password:
+                    aes_key = derive_key(self.password, assembler.salt)
+                assembler.open_output(output, aes_key)
+            except ValueError as error:
+                self._discard(key)
+                self.errors.append((page.path, str(error)))
+                return None
+        assembler, output, path = self.assemblers[key]
+        try:
+            assembler.start_page(superblock)
+        except ValueError as error:
+            self.errors.append((page.path, str(error)))
+            return None
+        assembler.add_blocks(BlockTable(array=page.blocks))
+        assembler.finish_page(page.ngood, page.nbad, page.nrestored)
+        if not assembler.complete:
+            return None
+        self.finished.add(key)
+        try:
+            assembler.close_output()
+        except ValueError as error:
+            self._discard(key)
+            self.errors.append((page.path, str(error)))
+            return None
+        del self.assemblers[key]
+        output.close()
+        assembler.close()
+        os.replace(path + ".part", path)
+        assembler.set_file_info(path)
+        return path
+
+    def _discard(self, key):
+        """Close assembler of file and remove its partially written output."""
+        assembler, output, path = self.assemblers.pop(key)
+        output.close()
+        assembler.close()
+        os.remove(path + ".part")
+
+    def _add_pages(self, futures):
+        """Add pages decoded by futures and yield paths of saved files."""
+        for future in futures:
+            for page in future.result():
+                path = self.add_page(page)
+                if path is not None:
+                    yield path
+
+    def restore(self, paths):
+        """Decode image files and yield paths of restored files as soon as they are saved.
+
+        :param paths: Paths of image files
+        :rtype: iterator of str
+        """
+        paths = list(paths)
+        if not self.workers or self.workers == 1 or len(paths) == 1:
+            for path in paths:
+                for page in decode_file(path, self.width, self.height, self.workers):
+                    saved = self.add_page(page)
+                    if saved is not None:
+                        yield saved
+            return
+
+        with ProcessPoolExecutor(self.workers) as executor:
+            pending = set()
+            for path in paths:
+                pending.add(executor.submit(decode_file, path, self.width, self.height))
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._add_pages(done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._add_pages(done)
+
+    def close(self):
+        """Discard incomplete files.
+
+        :return: Names of incomplete files with lists of pages which still need scanning
+        :rtype: list of tuple(str, list)
+        """
+        incomplete = []
+        for key in list(self.assemblers):
+            assembler = self.assemblers[key][0]
+            incomplete.append((assembler.name, assembler.remaining_pages()))
+            self._discard(key)
+        return incomplete
@@ -3,11 +3,88 @@ import stat
 import numpy as np
 
 from paperbak.constants import NDATA, SUPERBLOCK
-from paperbak.crc16 import crc16
+from paperbak.crc16 import crc16, crc16_batch
+from paperbak.crypto import SALTLEN
 from paperbak.dtypes import FileTime
-from paperbak.ecc import encode8
+from paperbak.ecc import encode8, encode8_batch
 from paperbak.type_checking import auto_attr_check
 
+NAMELEN = 64  # Length of name field, bytes
+
+
+def _record(dt, buffer, offset=0):
+    """Return structured record of dtype dt viewing buffer at offset."""
+    return np.frombuffer(buffer, dtype=dt, count=1, offset=offset)[0]
+
+
+def _select_fields(record, with_crc, with_ecc):
+    """Return memory of structured record, optionally without crc and ecc fields.
+
+    Fields are not copied, except when ecc follows the structure without crc.
+
+    :rtype: memoryview
+    """
+    crc_offset = record.dtype.fields["crc"][1]
+    ecc_offset = record.dtype.fields["ecc"][1]
+    view = memoryview(record).cast("B")
+    if with_crc and with_ecc:
+        return view
+    if with_crc:
+        return view[:ecc_offset]
+    if with_ecc:
+        return memoryview(bytes(view[:crc_offset]) + bytes(view[ecc_offset:]))
+    return view[:crc_offset]
+
+
+def _scalar_field(name, default=0):
+    """Property reading and writing numeric field of record in place."""
+    def getter(self):
+        return self._record[name]
+
+    def setter(self, value):
+        self._record[name] = default if value is None else value
+    return property(getter, setter)
+
+
+def _store_bytes(field, value):
+    """Copy bytes into array field and pad it with zeros."""
+    value = np.frombuffer(value, dtype=np.uint8)
+    field[:len(value)] = value
+    field[len(value):] = 0
+
+
+def _name(field):
+    """Decode file name stored in name field, it ends by the first zero byte."""
+    return field.tobytes().split(b"\0", 1)[0].decode("utf8")
+
+
+def _salt(field, mode):
+    """Return salt and IV stored at the end of name field of encrypted file or None."""
+    if mode & SuperData.PBM_ENCRYPTED:
+        return field[NAMELEN - SALTLEN:].tobytes()
+    return None
+
+
+def _bytes_field(name):
+    """Property reading and writing bytes field of record in place, zero padded."""
+    def getter(self):
+        return self._record[name].tobytes()
+
+    def setter(self, value):
+        _store_bytes(self._record[name], bytes(value or bytes()))
+    return property(getter, setter)
+
+
+def _calc_crc(view):
+    """Calculate cyclic redundancy of structure in place."""
+    view.crc = crc16(view.getbuffer(False, False)) ^ 0x55AA
+
+
+def _calc_ecc(view):
+    """Calculate Reed-Solomon's error correction code of structure in place."""
+    assert view.crc != None, "CRC not calculated yet."
+    view.ecc = encode8(view.getbuffer(with_ecc=False))
+
 
 @auto_attr_check
 class Data(object):
@@ -27,8 +104,8 @@ class Data(object):
         "crc": np.uint16,
         "ecc": bytes,
     }
-    dt = np.dtype([("address", np.uint32, 1), ("data", np.uint8, 90),
-                   ("crc", np.uint16, 1), ("ecc", np.uint8, 32)])
+    dt = np.dtype([("address", np.uint32), ("data", np.uint8, NDATA),
+                   ("crc", np.uint16), ("ecc", np.uint8, 32)])
 
     def tobytes(self, with_crc=True, with_ecc=True):
         """Convert datastructure into bytes.
@@ -39,35 +116,53 @@ class Data(object):
         :type  with_ecc: bool
         :rtype: bytes
         """
-        out = (self.address or np.uint32(0)).tobytes()
-        # data + 0 till end
-        out += self.data or bytes() + bytes([0] * (NDATA - len(self.data or [])))
-        if with_crc:
-            out += (self.crc or np.uint16(0)).tobytes()
-        if with_ecc:
-            # ecc + 0 till end
-            out += self.ecc or bytes() + bytes([0] * (32 - len(self.ecc or [])))
-        return out
+        return bytes(self.pack_into(bytearray(self.dt.itemsize)).getbuffer(with_crc, with_ecc))
+
+    def pack_into(self, buffer, offset=0):
+        """Write datastructure into writable buffer (e.g. page buffer or BlockTable) at offset.
+
+        Fields are stored directly into the buffer without intermediate copies.
+
+        :return: View of the written structure
+        :rtype: DataView
+        """
+        view = DataView(_record(self.dt, buffer, offset))
+        for name in DataView.fields:
+            setattr(view, name, getattr(self, name))
+        return view
 
     def calc_crc(self):
         """Calculate cyclic redundancy of addr and data."""
-        self.crc = crc16(self.tobytes(False, False)) ^ 0x55AA
+        view = self.pack_into(bytearray(self.dt.itemsize))
+        view.calc_crc()
+        self.crc = view.crc
 
     def calc_ecc(self):
         """Calculate Reed-Solomon's error correction code."""
         assert self.crc != None, "CRC not calculated yet."
-        self.ecc = encode8(self.tobytes(with_ecc=False))
+        view = self.pack_into(bytearray(self.dt.itemsize))
+        view.calc_ecc()
+        self.ecc = view.ecc
 
     @classmethod
     def frombytes(cls, bytes_):
         """Parse structure from bytes."""
-        d = cls()
         parsed = np.frombuffer(bytes_, dtype=cls.dt)[0]
-        d.address = parsed["address"]
-        d.data = bytes(parsed["data"])
-        d.crc = parsed["crc"]
-        d.ecc = bytes(parsed["ecc"])
-        return d
+        # Parsed fields already have types of params.
+        return cls.from_trusted_fields(
+            address=parsed["address"], data=bytes(parsed["data"]), crc=parsed["crc"],
+            ecc=bytes(parsed["ecc"]))
+
+    @staticmethod
+    def frombuffer(buffer, offset=0):
+        """Return view of structure stored in buffer at offset.
+
+        Fields are not copied, changes of writable buffer are visible through the view and
+        vice versa.
+
+        :rtype: DataView
+        """
+        return DataView(_record(Data.dt, buffer, offset))
 
     def __eq__(self, other):
         return self.address == other.address and self.data == other.data and self.crc == other.crc \
@@ -89,17 +184,21 @@ class SuperData(object):
     page      np.uint16 - Actual page (1-based)
     modified   FileTime - Time of last file modification
     filecrc   np.uint16 - CRC of compressed decrypted file
-    name            str - File name - may have all 64 chars
+    name            str - File name - may have all 64 chars, 31 chars if encrypted
     crc       np.uint16 - Cyclic redundancy of previous fields
     ecc        np.uint8 - Reed-Solomon's error correction code 32 bytes
 
     Extra attributes:
     pbm_compressed bool(False) - Paper backup is compressed
     pbm_encrypted  bool(False) - Paper backup is encrypted
+    pbm_multistream bool(False) - Compressed data is concatenation of bzip2 streams, it can't be
+                                  unpacked by the original PaperBack
+    salt          bytes(None) - Salt and IV of encryption, stored in the last 32 bytes of name
     """
     PBM_COMPRESSED = 0x01
     PBM_ENCRYPTED = 0x02
-
+    PBM_MULTISTREAM = 0x04
+    PBM_ORIGINAL = PBM_COMPRESSED | PBM_ENCRYPTED  # Modes known to the original PaperBack
 
     address = np.uint32(SUPERBLOCK)
     params = {
@@ -109,20 +208,22 @@ class SuperData(object):
         "origsize": np.uint32,
         "pbm_compressed": (bool, False, False),
         "pbm_encrypted": (bool, False, False),
+        "pbm_multistream": (bool, False, False),
         "attributes": (np.uint8, np.uint8(stat.FILE_ATTRIBUTE_NORMAL)),
         "page": np.uint16,
         "modified": FileTime,
         "filecrc": np.uint16,
         "name": str,
+        "salt": bytes,
         "crc": np.uint16,
         "ecc": bytes,
     }
 
     dt = np.dtype([
-        ("address", np.uint32, 1), ("datasize", np.uint32, 1), ("pagesize", np.uint32, 1),
-        ("origsize", np.uint32, 1), ("mode", np.uint8, 1), ("attributes", np.uint8, 1),
-        ("page", np.uint16, 1), ("modified", FileTime, 1), ("filecrc", np.uint16, 1),
-        ("name", np.uint8, 64), ("crc", np.uint16, 1), ("ecc", np.uint8, 32)])
+        ("address", np.uint32), ("datasize", np.uint32), ("pagesize", np.uint32),
+        ("origsize", np.uint32), ("mode", np.uint8), ("attributes", np.uint8),
+        ("page", np.uint16), ("modified", FileTime), ("filecrc", np.uint16),
+        ("name", np.uint8, NAMELEN), ("crc", np.uint16), ("ecc", np.uint8, 32)])
 
     @property
     def mode(self):
@@ -132,8 +233,15 @@ class SuperData(object):
             out |= np.uint8(self.PBM_ENCRYPTED)
         if self.pbm_compressed:
             out |= np.uint8(self.PBM_COMPRESSED)
+        if self.pbm_multistream:
+            out |= np.uint8(self.PBM_MULTISTREAM)
         return out
 
+    @property
+    def compatible(self):
+        """Return whether the file can be restored by the original PaperBack."""
+        return not int(self.mode) & ~SuperData.PBM_ORIGINAL
+
     def tobytes(self, with_crc=True, with_ecc=True):
         """Convert datastructure into bytes.
 
@@ -143,54 +251,54 @@ class SuperData(object):
         :type  with_ecc: bool
         :rtype: bytes
         """
-        out = self.address.tobytes()
-        out += (self.datasize or np.uint32(0)).tobytes()
-        out += (self.pagesize or np.uint32(0)).tobytes()
-        out += (self.origsize or np.uint32(0)).tobytes()
-        out += self.mode.tobytes()
-        out += (self.attributes or np.uint8(stat.FILE_ATTRIBUTE_NORMAL)).tobytes()
-        out += (self.page or np.uint16(0)).tobytes()
-        out += (self.modified or FileTime(0)).tobytes()
-        out += (self.filecrc or np.uint16(0)).tobytes()
-        # name + 0 till end of field
-        name_bytes = bytes(self.name or "", encoding="utf8")
-        out += name_bytes + bytes([0] * (64 - len(name_bytes)))
-        if with_crc:
-            out += (self.crc or np.uint16(0)).tobytes()
-        if with_ecc:
-            out += self.ecc or bytes() + bytes([0] * (32 - len(self.ecc or [])))
-        return out
+        return bytes(self.pack_into(bytearray(self.dt.itemsize)).getbuffer(with_crc, with_ecc))
 
-    def calc_crc(self):
-        """Calculate cyclic redundancy of addr and data."""
-        self.crc = crc16(self.tobytes(False, False)) ^ 0x55AA
+    def pack_into(self, buffer, offset=0):
+        """Write datastructure into writable buffer (e.g. page buffer or BlockTable) at offset.
 
-    def calc_ecc(self):
-        """Calculate Reed-Solomon's error correction code."""
-        assert self.crc != None, "CRC not calculated yet."
-        self.ecc = encode8(self.tobytes(with_ecc=False))
+        Fields are stored directly into the buffer without intermediate copies.
+
+        :return: View of the written structure
+        :rtype: SuperDataView
+        """
+        record = _record(self.dt, buffer, offset)
+        record["address"] = self.address
+        view = SuperDataView(record)
+        for name in SuperDataView.fields:
+            setattr(view, name, getattr(self, name))
+        return view
+
+    calc_crc = Data.calc_crc
+    calc_ecc = Data.calc_ecc
 
     @classmethod
     def frombytes(cls, bytes_):
         """Parse structure from bytes."""
-        d = cls()
         parsed = np.frombuffer(bytes_, dtype=cls.dt)[0]
-        assert d.address == parsed["address"], "Adress of superdata doesn't match."
-        d.datasize = parsed["datasize"]
-        d.pagesize = parsed["pagesize"]
-        d.origsize = parsed["origsize"]
-        d.pbm_compressed = (
-            parsed["mode"] & np.uint8(cls.PBM_COMPRESSED) == np.uint8(cls.PBM_COMPRESSED))
-        d.pbm_encrypted = (
-            parsed["mode"] & np.uint8(cls.PBM_ENCRYPTED) == np.uint8(cls.PBM_ENCRYPTED))
-        d.attributes = parsed["attributes"]
-        d.page = parsed["page"]
-        d.modified = parsed["modified"]
-        d.filecrc = parsed["filecrc"]
-        d.name = bytes(parsed["name"]).decode("utf8").strip("\x00")
-        d.crc = parsed["crc"]
-        d.ecc = bytes(parsed["ecc"])
-        return d
+        assert parsed["address"] == SUPERBLOCK, "Adress of superdata doesn't match."
+        mode = parsed["mode"]
+        # Parsed fields already have types of params, except of flags and modified.
+        return cls.from_trusted_fields(
+            datasize=parsed["datasize"], pagesize=parsed["pagesize"],
+            origsize=parsed["origsize"],
+            pbm_compressed=bool(mode & cls.PBM_COMPRESSED),
+            pbm_encrypted=bool(mode & cls.PBM_ENCRYPTED),
+            pbm_multistream=bool(mode & cls.PBM_MULTISTREAM),
+            attributes=parsed["attributes"], page=parsed["page"],
+            modified=FileTime(parsed["modified"]), filecrc=parsed["filecrc"],
+            name=_name(parsed["name"]), salt=_salt(parsed["name"], mode), crc=parsed["crc"],
+            ecc=bytes(parsed["ecc"]))
+
+    @staticmethod
+    def frombuffer(buffer, offset=0):
+        """Return view of structure stored in buffer at offset.
+
+        Fields are not copied, changes of writable buffer are visible through the view and
+        vice versa.
+
+        :rtype: SuperDataView
+        """
+        return SuperDataView(_record(SuperData.dt, buffer, offset))
 
     def __eq__(self, other):
         return (
@@ -198,6 +306,226 @@ class SuperData(object):
             self.pagesize == other.pagesize and self.origsize == other.origsize and
             self.mode == other.mode and self.attributes == other.attributes and
             self.page == other.page and self.modified == other.modified and
-            self.filecrc == other.filecrc and self.name == other.name and self.crc == other.crc and
-            self.ecc == other.ecc
+            self.filecrc == other.filecrc and self.name == other.name and
+            self.salt == other.salt and self.crc == other.crc and self.ecc == other.ecc
         )
+
+
+class DataView(object):
+    """Data block stored in a row of BlockTable or in a buffer.
+
+    Behaves like Data, but fields are read from and written to the underlying memory directly.
+    """
+    __slots__ = ("_record",)
+    fields = ("address", "data", "crc", "ecc")
+
+    def __init__(self, record):
+        self._record = record
+
+    address = _scalar_field("address")
+    data = _bytes_field("data")
+    crc = _scalar_field("crc")
+    ecc = _bytes_field("ecc")
+
+    def tobytes(self, with_crc=True, with_ecc=True):
+        """Convert datastructure into bytes.
+
+        :param with_crc: Include Cyclic redundancy
+        :type  with_crc: bool
+        :param with_ecc: Include error correction code
+        :type  with_ecc: bool
+        :rtype: bytes
+        """
+        return bytes(self.getbuffer(with_crc, with_ecc))
+
+    def getbuffer(self, with_crc=True, with_ecc=True):
+        """Return memory of datastructure, it is copied only if ecc is included without crc.
+
+        :rtype: memoryview
+        """
+        return _select_fields(self._record, with_crc, with_ecc)
+
+    def pack_into(self, buffer, offset=0):
+        """Write datastructure into writable buffer (e.g. page buffer) at offset.
+
+        :return: View of the written structure
+        :rtype: DataView
+        """
+        records = np.frombuffer(buffer, dtype=Data.dt, count=1, offset=offset)
+        records[0] = self._record
+        return DataView(records[0])
+
+    calc_crc = _calc_crc
+    calc_ecc = _calc_ecc
+    __eq__ = Data.__eq__
+
+
+class SuperDataView(object):
+    """SuperData block stored in a buffer.
+
+    Behaves like SuperData, but fields are read from and written to the underlying memory
+    directly.
+    """
+    __slots__ = ("_record",)
+    fields = ("datasize", "pagesize", "origsize", "pbm_compressed", "pbm_encrypted",
+              "pbm_multistream", "attributes", "page", "modified", "filecrc", "name", "salt", "crc",
+              "ecc")
+
+    def __init__(self, record):
+        self._record = record
+
+    @property
+    def address(self):
+        return self._record["address"]
+
+    datasize = _scalar_field("datasize")
+    pagesize = _scalar_field("pagesize")
+    origsize = _scalar_field("origsize")
+    mode = property(lambda self: self._record["mode"])
+    attributes = _scalar_field("attributes", stat.FILE_ATTRIBUTE_NORMAL)
+    page = _scalar_field("page")
+    filecrc = _scalar_field("filecrc")
+    crc = _scalar_field("crc")
+    ecc = _bytes_field("ecc")
+
+    def _get_flag(self, flag):
+        return bool(self._record["mode"] & flag)
+
+    def _set_flag(self, flag, value):
+        if value:
+            self._record["mode"] |= flag
+        else:
+            self._record["mode"] &= ~flag & 0xFF
+
+    pbm_compressed = property(lambda self: self._get_flag(SuperData.PBM_COMPRESSED),
+                              lambda self, value: self._set_flag(SuperData.PBM_COMPRESSED, value))
+    pbm_encrypted = property(lambda self: self._get_flag(SuperData.PBM_ENCRYPTED),
+                             lambda self, value: self._set_flag(SuperData.PBM_ENCRYPTED, value))
+    pbm_multistream = property(lambda self: self._get_flag(SuperData.PBM_MULTISTREAM),
+                               lambda self, value: self._set_flag(SuperData.PBM_MULTISTREAM, value))
+    compatible = SuperData.compatible
+
+    @property
+    def modified(self):
+        return FileTime(self._record["modified"])
+
+    @modified.setter
+    def modified(self, value):
+        self._record["modified"] = FileTime(value or 0)
+
+    @property
+    def name(self):
+        return _name(self._record["name"])
+
+    @name.setter
+    def name(self, value):
+        # Name of encrypted file mustn't overwrite the salt.
+        field = self._record["name"][:NAMELEN - SALTLEN if self.pbm_encrypted else NAMELEN]
+        value = bytes(value or "", encoding="utf8")
+        if len(value) > len(field):
+            raise ValueError("Name can be only %d bytes long." % len(field))
+        _store_bytes(field, value)
+
+    @property
+    def salt(self):
+        return _salt(self._record["name"], self._record["mode"])
+
+    @salt.setter
+    def salt(self, value):
+        if not self.pbm_encrypted:
+            if value is not None:
+                raise ValueError("Salt can be stored only in superblock of encrypted file.")
+            return
+        _store_bytes(self._record["name"][NAMELEN - SALTLEN:], bytes(value or bytes()))
+
+    def tobytes(self, with_crc=True, with_ecc=True):
+        """Convert datastructure into bytes.
+
+        :param with_crc: Include Cyclic redundancy
+        :type  with_crc: bool
+        :param with_ecc: Include error correction code
+        :type  with_ecc: bool
+        :rtype: bytes
+        """
+        return bytes(self.getbuffer(with_crc, with_ecc))
+
+    def getbuffer(self, with_crc=True, with_ecc=True):
+        """Return memory of datastructure, it is copied only if ecc is included without crc.
+
+        :rtype: memoryview
+        """
+        return _select_fields(self._record, with_crc, with_ecc)
+
+    def pack_into(self, buffer, offset=0):
+        """Write datastructure into writable buffer (e.g. page buffer) at offset.
+
+        :return: View of the written structure
+        :rtype: SuperDataView
+        """
+        records = np.frombuffer(buffer, dtype=SuperData.dt, count=1, offset=offset)
+        records[0] = self._record
+        return SuperDataView(records[0])
+
+    calc_crc = _calc_crc
+    calc_ecc = _calc_ecc
+    __eq__ = SuperData.__eq__
+
+
+class BlockTable(object):
+    """Table of Data blocks backed by single structured array of dtype Data.dt.
+
+    Each block takes exactly 128 bytes. CRC and ECC are calculated for all blocks at once. Items
+    of the table are DataView objects, which can be used in place of Data.
+    """
+
+    def __init__(self, size=0, array=None):
+        if array is None:
+            array = np.zeros(size, dtype=Data.dt)
+        elif array.dtype != Data.dt:
+            raise ValueError("Array must be of dtype Data.dt.")
+        self.array = array
+
+    @classmethod
+    def frombytes(cls, bytes_):
+        """Parse table from bytes, the length must be multiple of 128."""
+        return cls(array=np.frombuffer(bytes_, dtype=Data.dt).copy())
+
+    @classmethod
+    def fromblocks(cls, blocks):
+        """Create table from sequence of Data blocks."""
+        blocks = list(blocks)
+        table = cls(len(blocks))
+        for i, block in enumerate(blocks):
+            block.pack_into(table.array, i * Data.dt.itemsize)
+        return table
+
+    @property
+    def raw(self):
+        """2D array of bytes of all blocks, one block per row."""
+        return np.ascontiguousarray(self.array).view(np.uint8).reshape(-1, Data.dt.itemsize)
+
+    def tobytes(self):
+        """Convert all blocks into bytes.
+
+        :rtype: bytes
+        """
+        return self.array.tobytes()
+
+    def calc_crc(self):
+        """Calculate cyclic redundancy of addr and data of all blocks."""
+        self.array["crc"] = crc16_batch(self.raw[:, :Data.dt.fields["crc"][1]]) ^ 0x55AA
+
+    def calc_ecc(self):
+        """Calculate Reed-Solomon's error correction code of all blocks."""
+        self.array["ecc"] = encode8_batch(self.raw[:, :Data.dt.fields["ecc"][1]])
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return type(self)(array=self.array[key])
+        return DataView(self.array[key])
+
+    def __iter__(self):
+        return (DataView(record) for record in self.array)
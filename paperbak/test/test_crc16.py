@@ -1,3 +1,5 @@
+import os
+import tracemalloc
 import unittest
 
 import numpy as np
@@ -16,3 +18,119 @@ class TestCRC16(unittest.TestCase):
     def test_type(self):
         """Test CRC16 return correct data type."""
         self.assertEqual(type(crc16.crc16(bytes(TEST_DATA))), np.uint16)
+
+    def test_empty(self):
+        """Test CRC16 of empty data is 0."""
+        self.assertEqual(crc16.crc16(bytes()), 0)
+
+    def test_bytewise(self):
+        """Test CRC16 matches the byte-at-a-time loop across slice boundaries."""
+        for size in (1, 2, 93, crc16.SLICE - 1, crc16.SLICE, crc16.SLICE + 1, 5 * crc16.SLICE + 7):
+            data = os.urandom(size)
+            self.assertEqual(crc16.crc16(data), crc16.crc16_bytewise(data), size)
+
+    def test_memoryview(self):
+        """Test CRC16 accepts memoryview and numpy array."""
+        data = bytes(TEST_DATA)
+        self.assertEqual(crc16.crc16(memoryview(data)), np.uint16(62557))
+        self.assertEqual(crc16.crc16(np.array(TEST_DATA, dtype=np.uint8)), np.uint16(62557))
+
+    def test_continue(self):
+        """Test CRC16 continued over pieces matches CRC16 of the whole data."""
+        data = os.urandom(3000)
+        crc = crc16.crc16(data[:1], crc16.crc16(data[:0]))
+        crc = crc16.crc16(data[1:2500], crc)
+        self.assertEqual(crc16.crc16(data[2500:], crc), crc16.crc16(data))
+
+    def test_combine(self):
+        """Test that CRCs are combined over lengths composed of many powers of two."""
+        data = os.urandom(2 * crc16.SLICE + 999)
+        for split in (1, 700, crc16.SLICE, len(data) - 1):
+            self.assertEqual(crc16.combine(crc16.crc16(data[:split]), crc16.crc16(data[split:]),
+                                           len(data) - split), crc16.crc16_bytewise(data))
+
+    def test_bytewise_test_data(self):
+        """Test reference loop over TEST_DATA matches new_cpp/test_crc16.cpp."""
+        self.assertEqual(crc16.crc16_bytewise(bytes(TEST_DATA)), np.uint16(62557))
+
+
+class TestCRC16Batch(unittest.TestCase):
+
+    def test(self):
+        """Test crc16_batch matches crc16 of every row."""
+        blocks = np.frombuffer(os.urandom(20 * 94), dtype=np.uint8).reshape(20, 94)
+        crcs = crc16.crc16_batch(blocks)
+        self.assertEqual(crcs.dtype, np.uint16)
+        self.assertEqual([crc16.crc16(row.tobytes()) for row in blocks], list(crcs))
+
+    def test_long_rows(self):
+        """Test crc16_batch of rows longer than slice."""
+        blocks = np.frombuffer(os.urandom(3 * 2500), dtype=np.uint8).reshape(3, 2500)
+        self.assertEqual([crc16.crc16_bytewise(row.tobytes()) for row in blocks],
+                         list(crc16.crc16_batch(blocks)))
+
+    def test_wrong_shape(self):
+        """Test crc16_batch raises ValueError on 1D input."""
+        with self.assertRaises(ValueError):
+            crc16.crc16_batch(np.zeros(94, dtype=np.uint8))
+
+
+class TestCRC16Object(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(5000)
+
+    def test_update(self):
+        """Test that CRC updated piece by piece matches crc16."""
+        crc = crc16.CRC16()
+        for i in range(0, len(self.data), 777):
+            crc.update(self.data[i:i + 777])
+        self.assertEqual(crc.value, crc16.crc16(self.data))
+        self.assertEqual(crc.length, len(self.data))
+
+    def test_odd_chunks(self):
+        """Test that streaming chunks of many different lengths doesn't keep memory."""
+        chunks = [os.urandom(size) for size in range(1, 3000, 3)]
+        crc = crc16.CRC16(chunks[0])
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            for chunk in chunks[1:]:
+                crc.update(chunk)
+            kept = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertLess(kept, 64 * 1024)
+        self.assertEqual(crc.value, crc16.crc16_bytewise(b"".join(chunks)))
+
+    def test_constructor(self):
+        """Test that data passed to constructor is checksummed."""
+        self.assertEqual(crc16.CRC16(bytes(TEST_DATA)).value, np.uint16(62557))
+
+    def test_digest(self):
+        """Test that digest is CRC as big endian bytes."""
+        crc = crc16.CRC16(bytes(TEST_DATA))
+        self.assertEqual(crc.digest(), (62557).to_bytes(2, "big"))
+        self.assertEqual(crc.hexdigest(), "f45d")
+
+    def test_copy(self):
+        """Test that copy is independent of original."""
+        crc = crc16.CRC16(self.data[:100])
+        copy = crc.copy()
+        copy.update(self.data[100:])
+        self.assertEqual(crc.value, crc16.crc16(self.data[:100]))
+        self.assertEqual(copy.value, crc16.crc16(self.data))
+
+    def test_combine(self):
+        """Test that CRC objects of consecutive pieces can be merged."""
+        first = crc16.CRC16(self.data[:1234])
+        second = crc16.CRC16(self.data[1234:])
+        first.combine(second)
+        self.assertEqual(first.value, crc16.crc16(self.data))
+        self.assertEqual(first.length, len(self.data))
+
+    def test_combine_function(self):
+        """Test that combine merges CRCs of two pieces."""
+        crc_a = crc16.crc16(self.data[:3000])
+        crc_b = crc16.crc16(self.data[3000:])
+        self.assertEqual(crc16.combine(crc_a, crc_b, 2000), crc16.crc16(self.data))
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+from paperbak.crypto import AESKEYLEN, CbcDecryptor, CbcEncryptor, derive_key
+
+
+class TestAes(unittest.TestCase):
+
+    def setUp(self):
+        # NIST SP 800-38A, F.2.3 CBC-AES192.Encrypt
+        self.key = bytes.fromhex("8e73b0f7da0e6452c810f32b809079e562f8ead2522c6b7b")
+        self.iv = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+        self.plain = bytes.fromhex(
+            "6bc1bee22e409f96e93d7e117393172aae2d8a571e03ac9c9eb76fac45af8e51"
+            "30c81c46a35ce411e5fbc1191a0a52eff69f2445df4f9b17ad2b417be66c3710")
+        self.encrypted = bytes.fromhex(
+            "4f021db243bc633d7178183a9fa071e8b4d9ada9ad7dedf4e5e738763f69145a"
+            "571b242012fb7ae07fa9baac3df102e008b0e27988598881d920a9e64f5615cd")
+
+    def test_encrypt(self):
+        """Test that encryption matches NIST test vector."""
+        self.assertEqual(CbcEncryptor(self.key, self.iv).update(self.plain), self.encrypted)
+
+    def test_decrypt(self):
+        """Test that decryption matches NIST test vector."""
+        self.assertEqual(CbcDecryptor(self.key, self.iv).update(self.encrypted), self.plain)
+
+    def test_streaming(self):
+        """Test that data encrypted and decrypted in pieces of different size is restored."""
+        data = os.urandom(4096)
+        encryptor = CbcEncryptor(self.key, self.iv)
+        encrypted = encryptor.update(data[:1600]) + encryptor.update(data[1600:])
+        self.assertEqual(encrypted, CbcEncryptor(self.key, self.iv).update(data))
+        decryptor = CbcDecryptor(self.key, self.iv)
+        pieces = [decryptor.update(encrypted[start:start + 480]) for start in range(0, 4096, 480)]
+        self.assertEqual(b"".join(pieces), data)
+
+    def test_unaligned(self):
+        """Test that data not aligned to 16 bytes is rejected."""
+        with self.assertRaises(ValueError):
+            CbcEncryptor(self.key, self.iv).update(bytes(17))
+        with self.assertRaises(ValueError):
+            CbcDecryptor(self.key, self.iv).update(bytes(17))
+
+    def test_invalid_key(self):
+        """Test that key of other length than AES-192 is rejected."""
+        with self.assertRaises(ValueError):
+            CbcEncryptor(self.key[:16], self.iv)
+
+    def test_missing_package(self):
+        """Test that encryption without package cryptography raises clear error."""
+        with mock.patch("paperbak.crypto.Cipher", None):
+            with self.assertRaisesRegex(ValueError, "cryptography"):
+                CbcEncryptor(self.key, self.iv)
+            with self.assertRaisesRegex(ValueError, "cryptography"):
+                CbcDecryptor(self.key, self.iv)
+
+    def test_derive_key(self):
+        """Test that key is derived by PBKDF2 from the first half of salt."""
+        salt = os.urandom(32)
+        key = derive_key("secret", salt)
+        self.assertEqual(len(key), AESKEYLEN)
+        self.assertEqual(key, hashlib.pbkdf2_hmac("sha1", b"secret", salt[:16], 524288, 24))
+
+    def test_derive_key_password(self):
+        """Test that empty and too long passwords are rejected."""
+        for password in ("", "x" * 33):
+            with self.assertRaises(ValueError):
+                derive_key(password, bytes(32))
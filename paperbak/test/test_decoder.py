@@ -0,0 +1,178 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from paperbak.constants import SUPERBLOCK
+from paperbak.decoder import BADBLOCK, BitmapDecoder, find_peaks
+from paperbak.printer import FilePrinter
+from paperbak.render import block_dots
+from paperbak.structures import BlockTable
+
+
+def make_page(data):
+    """Render the first page of data and return bitmap with its blocks."""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "file.bin")
+        with open(path, "wb") as file:
+            file.write(data)
+        printer = FilePrinter(path)
+        printer.get_file_info()
+        printer.read_and_compress()
+        printer.make_superdata()
+        printer.calc_layout()
+        printer.calc_data_page_size()
+        image = printer.render_page(0)
+        blocks = printer.make_page_blocks(0)
+        printer.close()
+    finally:
+        shutil.rmtree(tmpdir)
+    return image, blocks
+
+
+def sorted_blocks(table):
+    """Return sorted list of bytes of blocks in table."""
+    return sorted(table.raw[i].tobytes() for i in range(len(table)))
+
+
+class TestFindPeaks(unittest.TestCase):
+
+    def test_grid(self):
+        """Test that phase and step of regular dark lines are found."""
+        h = np.full(700, 200)
+        for x in range(25, 700, 70):
+            h[x:x + 2] = 10
+        weight, peak, step = find_peaks(h)
+        self.assertGreater(weight, 0.0)
+        self.assertAlmostEqual(step, 70.0, places=3)
+        self.assertAlmostEqual((peak - 25.5) % 70.0, 0.0, places=3)
+
+    def test_no_grid(self):
+        """Test that flat or too short histogram has no grid."""
+        self.assertEqual(find_peaks(np.full(500, 100))[0], 0.0)
+        self.assertEqual(find_peaks(np.arange(10))[0], 0.0)
+
+
+class TestBitmapDecoder(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.image, cls.blocks = make_page(os.urandom(20000))
+        mask = cls.blocks.array["address"] != SUPERBLOCK
+        cls.expected = BlockTable(array=cls.blocks.array[mask])
+
+    def assertDecoded(self, image):
+        decoder = BitmapDecoder(image)
+        blocks = decoder.decode()
+        self.assertEqual(sorted_blocks(blocks), sorted_blocks(self.expected))
+        self.assertEqual(decoder.nbad, 0)
+        self.assertEqual(decoder.superblock.name, "file.bin")
+        self.assertEqual(decoder.superblock.page, 1)
+        return decoder
+
+    def test_decode(self):
+        """Test that all blocks of rendered page are decoded."""
+        decoder = self.assertDecoded(self.image)
+        self.assertEqual(decoder.ngood, len(self.expected))
+        self.assertEqual(decoder.nsuper, len(self.blocks) - len(self.expected))
+        self.assertEqual(decoder.orientation, 0)
+
+    def test_workers(self):
+        """Test that rows of blocks decoded by pool of processes are the same as serially."""
+        serial = BitmapDecoder(self.image)
+        blocks = serial.decode()
+        decoder = BitmapDecoder(self.image, workers=2)
+        np.testing.assert_array_equal(decoder.decode().raw, blocks.raw)
+        np.testing.assert_array_equal(decoder.quality, serial.quality)
+        self.assertEqual((decoder.ngood, decoder.nsuper, decoder.nbad),
+                         (serial.ngood, serial.nsuper, serial.nbad))
+        self.assertEqual(decoder.superblock, serial.superblock)
+        self.assertTrue(self.image.flags.writeable)
+
+    def test_margin(self):
+        """Test that grid is found on page with white margins."""
+        image = np.full((self.image.shape[0] + 150, self.image.shape[1] + 300), 255, np.uint8)
+        image[100:100 + self.image.shape[0], 170:170 + self.image.shape[1]] = self.image
+        self.assertDecoded(image)
+
+    def test_upside_down(self):
+        """Test that blocks are decoded from page rotated by 180 degrees."""
+        decoder = self.assertDecoded(self.image[::-1, ::-1])
+        self.assertNotEqual(decoder.orientation, 0)
+
+    def test_noise(self):
+        """Test that noisy page is decoded."""
+        noise = np.random.randint(-40, 40, size=self.image.shape)
+        self.assertDecoded(np.clip(self.image + noise, 0, 255).astype(np.uint8))
+
+    def test_too_small(self):
+        """Test that small bitmap is rejected."""
+        with self.assertRaises(ValueError):
+            BitmapDecoder(np.zeros((50, 500), dtype=np.uint8)).decode()
+
+    def test_no_image(self):
+        """Test that blank bitmap is rejected."""
+        with self.assertRaises(ValueError):
+            BitmapDecoder(np.full((500, 500), 255, dtype=np.uint8)).decode()
+
+
+class TestRecognizeBits(unittest.TestCase):
+
+    def setUp(self):
+        self.block = make_page(b"recognize")[1].raw[1]
+        self.grid = np.where(block_dots(self.block[None])[0], 64, 255)
+        self.decoder = BitmapDecoder(np.zeros((200, 200), dtype=np.uint8))
+        self.decoder.cmin, self.decoder.cmax = 64, 255
+
+    def test_clean(self):
+        """Test that clean grid is recognized without corrections."""
+        answer, result = self.decoder.recognize_bits(self.grid)
+        self.assertEqual(answer, 0)
+        np.testing.assert_array_equal(result, self.block)
+
+    def test_errors(self):
+        """Test that errors in grid are corrected by ECC."""
+        grid = self.grid.copy()
+        grid[3, :8] = 319 - grid[3, :8]
+        answer, result = self.decoder.recognize_bits(grid)
+        self.assertEqual(answer, 1)
+        np.testing.assert_array_equal(result, self.block)
+
+    def test_orientation(self):
+        """Test that mirrored grid is recognized and the orientation is remembered."""
+        answer, result = self.decoder.recognize_bits(self.grid.T)
+        self.assertEqual(answer, 0)
+        self.assertEqual(self.decoder.orientation, 4)
+        self.assertEqual(self.decoder.recognize_bits(self.grid)[0], BADBLOCK)
+
+    def test_stack(self):
+        """Test that the first recognizable grid of the stack is used."""
+        noise = np.random.randint(0, 256, size=(32, 32))
+        grid = self.grid.copy()
+        grid[3, :4] = 319 - grid[3, :4]
+        answer, result = self.decoder.recognize_bits(np.stack([noise, grid, self.grid]))
+        self.assertEqual(answer, 0)
+        np.testing.assert_array_equal(result, self.block)
+        answer, result = self.decoder.recognize_bits(np.stack([noise, grid]))
+        self.assertGreater(answer, 0)
+        np.testing.assert_array_equal(result, self.block)
+
+    def test_check_crc(self):
+        """Test that CRC of stack of blocks is checked at once."""
+        blocks = np.stack([self.block] * 3)
+        blocks[1, 10] ^= 1
+        blocks[2, 95] ^= 1
+        np.testing.assert_array_equal(BitmapDecoder.check_crc(blocks), [True, False, False])
+        self.assertIs(BitmapDecoder.check_crc(self.block), True)
+
+    def test_combine_subblocks(self):
+        """Test that subblocks are taken from the grids with the highest dispersion."""
+        grids = np.full((9, 32, 32), 128, dtype=np.uint8)
+        grids[4] = self.grid
+        grids[0, :8, :8] = np.where(np.arange(64).reshape(8, 8) % 2, 0, 255)
+        grid = BitmapDecoder.combine_subblocks(grids)
+        np.testing.assert_array_equal(grid[:8, :8], grids[0, :8, :8])
+        np.testing.assert_array_equal(grid[8:], self.grid[8:])
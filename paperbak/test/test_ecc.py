@@ -0,0 +1,137 @@
+import os
+import unittest
+
+import numpy as np
+
+from paperbak import ecc
+
+
+class TestGFMul(unittest.TestCase):
+
+    def test_identity(self):
+        """Test that 1 is multiplicative identity and 0 is absorbing."""
+        values = np.arange(256, dtype=np.uint8)
+        np.testing.assert_array_equal(ecc.GF_MUL[1], values)
+        np.testing.assert_array_equal(ecc.GF_MUL[0], np.zeros(256, dtype=np.uint8))
+
+    def test_alpha(self):
+        """Test that products of powers of alpha follow ALPHA table."""
+        self.assertEqual(ecc.GF_MUL[ecc.ALPHA[10], ecc.ALPHA[20]], ecc.ALPHA[30])
+        self.assertEqual(ecc.GF_MUL[ecc.ALPHA[200], ecc.ALPHA[100]], ecc.ALPHA[45])
+
+
+class TestEncode8Batch(unittest.TestCase):
+
+    def test(self):
+        """Test that encode8_batch matches encode8 byte for byte."""
+        data = np.frombuffer(os.urandom(50 * 96), dtype=np.uint8).reshape(50, 96).copy()
+        data[0] = 0
+        data[1, :48] = 0
+        parity = ecc.encode8_batch(data)
+        self.assertEqual(parity.shape, (50, 32))
+        for row, expected in zip(data, parity):
+            self.assertEqual(bytes(ecc.encode8(row.tobytes())), expected.tobytes())
+
+    def test_empty(self):
+        """Test that encode8_batch accepts zero blocks."""
+        self.assertEqual(ecc.encode8_batch(np.zeros((0, 96), dtype=np.uint8)).shape, (0, 32))
+
+    def test_wrong_shape(self):
+        """Test that encode8_batch raises ValueError on 1D input."""
+        with self.assertRaises(ValueError):
+            ecc.encode8_batch(np.zeros(96, dtype=np.uint8))
+
+
+class TestDecode8(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(96)
+        self.codeword = bytes(self.data) + bytes(ecc.encode8(self.data))
+
+    def test_clean(self):
+        """Test that decode8 returns 0 for valid codeword."""
+        codeword = bytearray(self.codeword)
+        self.assertEqual(ecc.decode8(codeword), 0)
+        self.assertEqual(codeword, self.codeword)
+
+    def test_errors(self):
+        """Test that decode8 corrects 16 errors in place."""
+        codeword = bytearray(self.codeword)
+        for pos in range(0, 128, 8):
+            codeword[pos] ^= 0x5A
+        self.assertEqual(ecc.decode8(codeword), 16)
+        self.assertEqual(codeword, self.codeword)
+
+    def test_error_positions(self):
+        """Test that erasures are replaced by positions of corrected bytes, like in Decode8."""
+        codeword = bytearray(self.codeword)
+        codeword[3] = 0
+        codeword[90] ^= 0x5A
+        positions = [3]
+        self.assertEqual(ecc.decode8(codeword, positions), 2)
+        self.assertEqual(sorted(positions), [3, 90])
+        self.assertEqual(codeword, self.codeword)
+
+    def test_erasures(self):
+        """Test that decode8 corrects 32 erasures at known positions."""
+        codeword = bytearray(self.codeword)
+        positions = list(range(40, 72))
+        for pos in positions:
+            codeword[pos] = 0
+        self.assertGreaterEqual(ecc.decode8(codeword, positions), 0)
+        self.assertEqual(codeword, self.codeword)
+
+    def test_uncorrectable(self):
+        """Test that decode8 returns -1 when there are too many errors."""
+        codeword = bytearray(self.codeword)
+        for pos in range(0, 128, 4):
+            codeword[pos] ^= 0xFF
+        self.assertEqual(ecc.decode8(codeword), -1)
+
+
+class TestDecode8Batch(unittest.TestCase):
+
+    def test(self):
+        """Test that decode8_batch corrects only damaged rows."""
+        data = np.frombuffer(os.urandom(30 * 96), dtype=np.uint8).reshape(30, 96)
+        codewords = np.hstack([data, ecc.encode8_batch(data)])
+        expected = codewords.copy()
+        codewords[3, 10] ^= 1
+        codewords[7, [0, 50, 127]] ^= 0xFF
+        for pos in range(0, 128, 4):
+            codewords[9, pos] ^= 0xFF
+        result = ecc.decode8_batch(codewords)
+        self.assertEqual(result[3], 1)
+        self.assertEqual(result[7], 3)
+        self.assertEqual(result[9], -1)
+        self.assertEqual(np.count_nonzero(result), 3)
+        mask = np.arange(30) != 9
+        np.testing.assert_array_equal(codewords[mask], expected[mask])
+
+    def test_eras_pos(self):
+        """Test that lists of erasures are replaced by positions of corrected bytes."""
+        data = np.frombuffer(os.urandom(3 * 96), dtype=np.uint8).reshape(3, 96)
+        codewords = np.hstack([data, ecc.encode8_batch(data)])
+        expected = codewords.copy()
+        codewords[0, 5] ^= 0xFF
+        codewords[1, [20, 100]] ^= 0x33
+        eras_pos = [[5], [], [7]]
+        result = ecc.decode8_batch(codewords, eras_pos)
+        np.testing.assert_array_equal(result, [1, 2, 0])
+        self.assertEqual([sorted(positions) for positions in eras_pos], [[5], [20, 100], []])
+        np.testing.assert_array_equal(codewords, expected)
+
+    def test_invalid(self):
+        """Test that data which can't be corrected in place is rejected."""
+        codewords = np.zeros((2, 128), dtype=np.uint8)
+        with self.assertRaises(ValueError):
+            ecc.decode8_batch(codewords.tolist())
+        with self.assertRaises(ValueError):
+            ecc.decode8_batch(codewords.astype(int))
+        with self.assertRaises(ValueError):
+            ecc.decode8_batch(codewords[0])
+        with self.assertRaises(ValueError):
+            ecc.decode8_batch(codewords, [[]])
+        codewords.flags.writeable = False
+        with self.assertRaises(ValueError):
+            ecc.decode8_batch(codewords)
@@ -0,0 +1,213 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+from paperbak.images import (iter_images, iter_pbm, iter_pdf, iter_pgm, iter_raw, iter_tiff,
+                             load_bmp, load_png)
+from paperbak.render import save_bmp, save_pbm, save_pdf, save_png
+
+
+def tiff_bytes(images, endian="<", split=False):
+    """Return uncompressed grayscale TIFF with images, strips of pixels are stored before
+    their directory, with gap between strips if split is set."""
+    out = bytearray((b"II" if endian == "<" else b"MM") + struct.pack(endian + "HI", 42, 0))
+    link = 4  # Offset of the pointer to the next directory
+    for image in images:
+        height, width = image.shape
+        half = height // 2 * width
+        offsets = [len(out), len(out) + half + (4 if split else 0)]
+        out += image.tobytes()[:half] + (b"\0" * 4 if split else b"") + image.tobytes()[half:]
+        out += b"\0" * (len(out) % 2)
+        strips = len(out)
+        out += struct.pack(endian + "II", *offsets)
+        counts = len(out)
+        out += struct.pack(endian + "II", half, width * height - half)
+        entries = [(256, 4, 1, width), (257, 4, 1, height), (258, 3, 1, 8), (259, 3, 1, 1),
+                   (262, 3, 1, 1), (273, 4, 2, strips), (277, 3, 1, 1), (279, 4, 2, counts)]
+        struct.pack_into(endian + "I", out, link, len(out))
+        out += struct.pack(endian + "H", len(entries))
+        for tag, type_, count, value in entries:
+            fmt = endian + "HHI" + ("H2x" if type_ == 3 and count == 1 else "I")
+            out += struct.pack(fmt, tag, type_, count, value)
+        link = len(out)
+        out += struct.pack(endian + "I", 0)
+    return bytes(out)
+
+
+def png_bytes(rows, bpp, color, filters):
+    """Return PNG with 8-bit rows of pixels, every row is filtered by filter type of filters."""
+    height, stride = rows.shape
+    lines = []
+    previous = [0] * stride
+    for row, kind in zip(rows.tolist(), filters):
+        line = [kind]
+        for i, value in enumerate(row):
+            left = row[i - bpp] if i >= bpp else 0
+            corner = previous[i - bpp] if i >= bpp else 0
+            estimate = left + previous[i] - corner
+            paeth = min((abs(estimate - left), 0, left), (abs(estimate - previous[i]), 1,
+                        previous[i]), (abs(estimate - corner), 2, corner))[2]
+            line.append((value - (0, left, previous[i], (left + previous[i]) // 2, paeth)[kind])
+                        & 0xFF)
+        lines.append(bytes(line))
+        previous = row
+    chunks = b""
+    for kind, data in ((b"IHDR", struct.pack(">IIBBBBB", stride // bpp, height, 8, color, 0, 0,
+                                             0)),
+                       (b"IDAT", zlib.compress(b"".join(lines))), (b"IEND", b"")):
+        chunks += struct.pack(">I", len(data)) + kind + data + struct.pack(
+            ">I", zlib.crc32(kind + data))
+    return b"\x89PNG\r\n\x1a\n" + chunks
+
+
+class TestImages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = np.random.randint(0, 256, size=(150, 132), dtype=np.uint8)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def bmp_bytes(self, bits, rows, palette=b""):
+        offset = 54 + len(palette)
+        ncolor = len(palette) // 4
+        return (struct.pack("<2sIHHI", b"BM", offset + len(rows), 0, 0, offset) +
+                struct.pack("<IiiHHIIiiII", 40, rows.shape[1] * 8 // bits, -rows.shape[0], 1,
+                            bits, 0, 0, 0, 0, ncolor, ncolor) + palette + rows.tobytes())
+
+    def test_bmp(self):
+        """Test that grayscale BMP is mapped without copying."""
+        path = os.path.join(self.tmpdir, "page.bmp")
+        save_bmp(path, self.image)
+        image = load_bmp(path)
+        np.testing.assert_array_equal(image, self.image)
+        self.assertFalse(image.flags.owndata)
+        self.assertFalse(image.flags.writeable)
+
+    def test_bmp_palette(self):
+        """Test that BMP with palette is converted to gray."""
+        palette = np.zeros((256, 4), dtype=np.uint8)
+        palette[:, :3] = 255 - np.arange(256)[:, None]
+        path = self.write("page.bmp", self.bmp_bytes(8, self.image, palette.tobytes()))
+        np.testing.assert_array_equal(load_bmp(path), 255 - self.image)
+
+    def test_bmp_24bit(self):
+        """Test that 24-bit BMP is converted to gray."""
+        rgb = np.random.randint(0, 256, size=(130, 128, 3), dtype=np.uint8)
+        path = self.write("page.bmp", self.bmp_bytes(24, rgb.reshape(130, 128 * 3)))
+        np.testing.assert_array_equal(load_bmp(path), rgb.sum(axis=2) // 3)
+
+    def test_bmp_unsupported(self):
+        """Test that small bitmap is rejected."""
+        path = os.path.join(self.tmpdir, "page.bmp")
+        save_bmp(path, self.image[:100])
+        with self.assertRaises(ValueError):
+            load_bmp(path)
+
+    def test_pgm(self):
+        """Test that all images of PGM file are read."""
+        header = b"P5\n# comment\n132 150\n255\n"
+        path = self.write("page.pgm", header + self.image.tobytes() + b"\n" +
+                          header + self.image[::-1].tobytes())
+        images = list(iter_pgm(path))
+        self.assertEqual(len(images), 2)
+        np.testing.assert_array_equal(images[0], self.image)
+        np.testing.assert_array_equal(images[1], self.image[::-1])
+
+    def test_pbm(self):
+        """Test that all images of PBM file are read, black pixels are 0."""
+        bits = self.image < 128
+        path = os.path.join(self.tmpdir, "page.pbm")
+        save_pbm(path, bits)
+        with open(path, "ab") as file:
+            file.write(b"\nP4 5 1\n\xa8")
+        images = list(iter_pbm(path))
+        self.assertEqual(len(images), 2)
+        np.testing.assert_array_equal(images[0], np.where(bits, 0, 255))
+        np.testing.assert_array_equal(images[1], [[0, 255, 0, 255, 0]])
+
+    def test_png(self):
+        """Test that pages saved by save_png are read in both bit depths."""
+        path = os.path.join(self.tmpdir, "page.png")
+        save_png(path, self.image, 300, 300)
+        np.testing.assert_array_equal(load_png(path), self.image)
+        save_png(path, self.image < 128)
+        np.testing.assert_array_equal(load_png(path), np.where(self.image < 128, 0, 255))
+
+    def test_png_filters(self):
+        """Test that all filter types of PNG are reversed and RGB is converted to gray."""
+        filters = [0, 1, 2, 3, 4] * 30
+        path = self.write("page.png", png_bytes(self.image, 1, 0, filters))
+        np.testing.assert_array_equal(load_png(path), self.image)
+        rgb = np.random.randint(0, 256, size=(10, 20, 3), dtype=np.uint8)
+        path = self.write("page.png", png_bytes(rgb.reshape(10, 60), 3, 2, filters))
+        np.testing.assert_array_equal(load_png(path), rgb.sum(axis=2) // 3)
+        path = self.write("page.png", png_bytes(self.image, 1, 4, filters))
+        with self.assertRaises(ValueError):
+            load_png(path)
+
+    def test_pdf(self):
+        """Test that pages saved by save_pdf are read in both bit depths."""
+        path = os.path.join(self.tmpdir, "page.pdf")
+        save_pdf(path, self.image, 300, 300)
+        np.testing.assert_array_equal(next(iter_pdf(path)), self.image)
+        save_pdf(path, self.image < 128)
+        images = list(iter_pdf(path))
+        self.assertEqual(len(images), 1)
+        np.testing.assert_array_equal(images[0], np.where(self.image < 128, 0, 255))
+
+    def test_pdf_unsupported(self):
+        """Test that PDF with image compressed by JPEG is rejected."""
+        path = self.write("page.pdf", b"%PDF-1.4\n1 0 obj\n<< /Type /XObject /Subtype /Image "
+                          b"/Width 2 /Height 2 /ColorSpace /DeviceGray /BitsPerComponent 8 "
+                          b"/Filter /DCTDecode /Length 4 >>\nstream\n\0\0\0\0\nendstream\n")
+        with self.assertRaises(ValueError):
+            list(iter_pdf(path))
+
+    def test_tiff(self):
+        """Test that pages of TIFF are read in both byte orders."""
+        for endian in "<>":
+            path = self.write("pages.tif", tiff_bytes([self.image, self.image.T], endian))
+            images = list(iter_tiff(path))
+            self.assertEqual(len(images), 2)
+            np.testing.assert_array_equal(images[0], self.image)
+            np.testing.assert_array_equal(images[1], self.image.T)
+            self.assertFalse(images[0].flags.owndata)
+
+    def test_tiff_strips(self):
+        """Test that TIFF with scattered strips is read."""
+        path = self.write("pages.tif", tiff_bytes([self.image], split=True))
+        np.testing.assert_array_equal(next(iter_tiff(path)), self.image)
+
+    def test_raw(self):
+        """Test that raw stack is iterated image by image."""
+        path = self.write("pages.raw", self.image.tobytes())
+        images = list(iter_raw(path, 132, 50))
+        self.assertEqual(len(images), 3)
+        np.testing.assert_array_equal(images[2], self.image[100:])
+
+    def test_iter_images(self):
+        """Test that type of file is recognized by its content."""
+        path = self.write("page", tiff_bytes([self.image]))
+        np.testing.assert_array_equal(next(iter_images(path)), self.image)
+        for save in (save_pbm, save_png, save_pdf):
+            path = os.path.join(self.tmpdir, "page")
+            save(path, self.image < 128)
+            np.testing.assert_array_equal(next(iter_images(path)),
+                                          np.where(self.image < 128, 0, 255))
+        path = self.write("pages.raw", self.image.tobytes())
+        self.assertEqual(len(list(iter_images(path, 132, 75))), 2)
+        with self.assertRaises(ValueError):
+            list(iter_images(path))
@@ -0,0 +1,66 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from paperbak.layout import PageLayout, get_layout
+from paperbak.render import BLACK, block_dots, render_page
+
+
+class TestPageLayout(unittest.TestCase):
+
+    def test_geometry(self):
+        """Test that default A4 page at 300 dpi has the same geometry as in original code."""
+        layout = PageLayout()
+        self.assertEqual((layout.width, layout.height), (2481, 3507))
+        self.assertEqual((layout.dx, layout.dy, layout.px, layout.py), (2, 2, 1, 1))
+        self.assertEqual((layout.nx, layout.ny), (28, 45))
+        self.assertEqual((layout.bitmap_width, layout.bitmap_height), (2012, 3201))
+        self.assertEqual(layout.pagesize, 208 * 5 * 90)
+
+    def test_margins(self):
+        """Test that page borders are calculated from margins in both units."""
+        layout = PageLayout(have_margins=True, marginleft=1000, marginright=500, margintop=250)
+        self.assertEqual((layout.borderleft, layout.borderright, layout.bordertop,
+                          layout.borderbottom), (300, 150, 75, 0))
+        layout = PageLayout(papersizex=21000, papersizey=29700, in_hundredths_of_milimeters=True,
+                            have_margins=True, marginleft=2540)
+        self.assertEqual((layout.width, layout.height, layout.borderleft), (2480, 3507, 300))
+
+    def test_too_small(self):
+        """Test that page without space for redundancy blocks is rejected."""
+        with self.assertRaises(ValueError):
+            PageLayout(papersizex=2000, dpi=100)
+
+    def test_immutable(self):
+        """Test that layout and its arrays can't be modified."""
+        layout = PageLayout()
+        with self.assertRaises(AttributeError):
+            layout.nx = 10
+        with self.assertRaises(AttributeError):
+            layout.foo = 10
+        with self.assertRaises(ValueError):
+            layout.block_origins[0, 0] = 0
+
+    def test_cache(self):
+        """Test that layouts with the same parameters are shared."""
+        params = PageLayout(dpi=150).get_params()
+        layout = get_layout(*params)
+        self.assertIs(get_layout(*params), layout)
+        self.assertIsNot(get_layout(*PageLayout().get_params()), layout)
+        self.assertEqual(layout, PageLayout(dpi=150))
+        self.assertIs(pickle.loads(pickle.dumps(layout)), layout)
+
+    def test_positions(self):
+        """Test that dots of blocks are drawn at the positions of layout."""
+        layout = PageLayout(resx=600, resy=600, dpi=200)
+        raw = np.random.randint(0, 256, size=(layout.nx * 3, 128), dtype=np.uint8)
+        image = render_page(raw, layout.nx, 3, layout.dx, layout.dy, layout.px, layout.py,
+                            layout.border, layout.bitmap_width, lines=layout.get_grid_lines(3))
+        np.testing.assert_array_equal(image, render_page(
+            raw, layout.nx, 3, layout.dx, layout.dy, layout.px, layout.py, layout.border,
+            layout.bitmap_width))
+        origins = layout.block_origins[:3].reshape(-1, 1, 1, 2)
+        y = origins[..., 0] + layout.dot_y[:, None]
+        x = origins[..., 1] + layout.dot_x
+        np.testing.assert_array_equal(image[y, x] == BLACK, block_dots(raw))
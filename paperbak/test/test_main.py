@@ -0,0 +1,154 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from paperbak.__main__ import main
+from paperbak.printer import FilePrinter
+
+
+class TestRestore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.scans = os.path.join(self.tmpdir, "scans")
+        self.output = os.path.join(self.tmpdir, "output")
+        os.mkdir(self.scans)
+        os.mkdir(self.output)
+        self.files = {}
+        for name in ("first.txt", "second.bin"):
+            path = os.path.join(self.tmpdir, name)
+            self.files[name] = os.urandom(3000)
+            with open(path, "wb") as file:
+                file.write(self.files[name])
+            FilePrinter(path).print_file(os.path.join(self.scans, name + ".bmp"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def restore(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = main(["restore", self.scans, "-o", self.output] + list(args))
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def assertRestored(self):
+        self.assertEqual(sorted(os.listdir(self.output)), sorted(self.files))
+        for name, data in self.files.items():
+            with open(os.path.join(self.output, name), "rb") as file:
+                self.assertEqual(file.read(), data)
+
+    def test_restore(self):
+        """Test that all files are restored and timing is printed."""
+        code, stdout, stderr = self.restore("-j", "1")
+        self.assertEqual(code, 0)
+        self.assertRestored()
+        self.assertIn("Restored %s" % os.path.join(self.output, "first.txt"), stdout)
+        self.assertIn("2 pages", stdout)
+        self.assertEqual(stderr, "")
+
+    def test_workers(self):
+        """Test that pages are decoded by pool of processes and bad files are reported."""
+        with open(os.path.join(self.scans, "notes.txt"), "w") as file:
+            file.write("not an image")
+        code, stdout, stderr = self.restore("-j", "2")
+        self.assertEqual(code, 1)
+        self.assertRestored()
+        self.assertIn("notes.txt", stderr)
+
+
+class TestBackup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "key.pem")
+        self.data = os.urandom(2000)
+        with open(self.path, "wb") as file:
+            file.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_main(self, *args):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            code = main(list(args))
+        return code, stdout.getvalue()
+
+    def test_backup(self):
+        """Test that file is printed into pages which can be restored."""
+        pages = os.path.join(self.tmpdir, "pages")
+        code, stdout = self.run_main("backup", self.path, "--out", pages, "-j", "1",
+                                     "--compress")
+        self.assertEqual(code, 0)
+        self.assertIn("1 files, 1 pages", stdout)
+        self.assertEqual(os.listdir(pages), ["key.pem.bmp"])
+        output = os.path.join(self.tmpdir, "output")
+        os.mkdir(output)
+        code, stdout = self.run_main("restore", pages, "-o", output, "-j", "1")
+        self.assertEqual(code, 0)
+        with open(os.path.join(output, "key.pem"), "rb") as file:
+            self.assertEqual(file.read(), self.data)
+
+    def test_formats(self):
+        """Test that pages saved in every format are restored."""
+        for fmt in ("bmp", "pbm", "png", "pdf"):
+            pages = os.path.join(self.tmpdir, "pages_" + fmt)
+            code, stdout = self.run_main("backup", self.path, "--out", pages, "-f", fmt,
+                                         "--max-pages", "1")
+            self.assertEqual(code, 0)
+            self.assertEqual(os.listdir(pages), ["key.pem." + fmt])
+            output = os.path.join(self.tmpdir, "output_" + fmt)
+            os.mkdir(output)
+            code, stdout = self.run_main("restore", pages, "-o", output, "-j", "1")
+            self.assertEqual(code, 0)
+            with open(os.path.join(output, "key.pem"), "rb") as file:
+                self.assertEqual(file.read(), self.data)
+
+    def test_empty(self):
+        """Test that empty file is reported as error."""
+        empty = os.path.join(self.tmpdir, "empty.txt")
+        open(empty, "wb").close()
+        pages = os.path.join(self.tmpdir, "pages")
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            code, stdout = self.run_main("backup", self.path, empty, "--out", pages, "-j", "1")
+        self.assertEqual(code, 1)
+        self.assertIn("empty.txt: File is empty.", stderr.getvalue())
+        self.assertNotIn("Printed %s" % empty, stdout)
+        self.assertEqual(os.listdir(pages), ["key.pem.bmp"])
+
+    def test_encrypted(self):
+        """Test that encrypted file is restored with the same password."""
+        pages = os.path.join(self.tmpdir, "pages")
+        with mock.patch("getpass.getpass", return_value="secret"):
+            code, stdout = self.run_main("backup", self.path, "--out", pages, "-j", "1",
+                                         "--encrypt")
+        self.assertEqual(code, 0)
+        output = os.path.join(self.tmpdir, "output")
+        os.mkdir(output)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            code, stdout = self.run_main("restore", pages, "-o", output, "-j", "1")
+        self.assertEqual(code, 1)
+        self.assertIn("password is required", stderr.getvalue())
+        with mock.patch("getpass.getpass", return_value="secret"):
+            code, stdout = self.run_main("restore", pages, "-o", output, "-j", "1",
+                                         "--password")
+        self.assertEqual(code, 0)
+        with open(os.path.join(output, "key.pem"), "rb") as file:
+            self.assertEqual(file.read(), self.data)
+
+    def test_plan(self):
+        """Test that settings are listed from the cheapest without printing pages."""
+        code, stdout = self.run_main("plan", self.path, "--dpi", "100", "200", "--redundancy",
+                                     "2", "10", "--compress", "no")
+        self.assertEqual(code, 0)
+        self.assertEqual(len(stdout.splitlines()), 7)
+        self.assertIn("Cheapest: --dpi 100 --dotpercent 70 --redundancy 2, 1 page(s)", stdout)
+        self.assertEqual(os.listdir(self.tmpdir), ["key.pem"])
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            code, stdout = self.run_main("plan", self.path, "--dpi", "10")
+        self.assertEqual(code, 1)
+        self.assertIn("None of the settings", stderr.getvalue())
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from paperbak.plan import FileEstimate, cheapest, plan
+from paperbak.printer import FilePrinter
+
+
+class TestPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        words = np.random.randint(0, 1000, size=200000).astype(str)
+        self.text = self.write("text.txt", " ".join(words).encode())
+        self.random = self.write("random.bin", os.urandom(300000))
+        self.small = self.write("small.bin", os.urandom(1000))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def print_pages(self, path, **options):
+        """Return number of pages and rows of the last page of file prepared by FilePrinter."""
+        printer = FilePrinter(path)
+        for name, value in options.items():
+            setattr(printer, name, value)
+        printer.get_file_info()
+        printer.read_and_compress()
+        printer.make_superdata()
+        printer.calc_layout()
+        printer.calc_data_page_size()
+        printer.close()
+        return printer.npages, printer.calc_page_rows(printer.npages - 1)[1]
+
+    def test_uncompressed(self):
+        """Test that pages of uncompressed files are predicted exactly."""
+        paths = [self.text, self.random, self.small]
+        for dpi, redundancy in ((200, 5), (100, 2), (150, 10)):
+            result = plan(paths, (dpi,), redundancy=(redundancy,), compressed=(False,))[0]
+            expected = [self.print_pages(path, dpi=dpi, redundancy=redundancy)
+                        for path in paths]
+            self.assertEqual(result.files, list(zip(paths, [npages for npages, _ in expected])))
+            self.assertEqual(result.npages, sum(npages for npages, _ in expected))
+            self.assertEqual(result.nrows, sum(
+                (npages - 1) * result.layout.ny + rows for npages, rows in expected))
+
+    def test_compressed(self):
+        """Test that compressed size is estimated from samples."""
+        estimate = FileEstimate(self.text)
+        printer = FilePrinter(self.text)
+        printer.compressed = True
+        printer.get_file_info()
+        printer.read_and_compress()
+        printer.close()
+        self.assertAlmostEqual(estimate.get_datasize(True) / printer.alignedsize, 1.0, delta=0.1)
+        self.assertEqual(FileEstimate(self.random).get_datasize(True), 300000)
+        self.assertEqual(FileEstimate(self.small).get_datasize(True), 1008)
+        with self.assertRaises(ValueError):
+            FileEstimate(self.text, compressed=False).get_datasize(True)
+
+    def test_cheapest(self):
+        """Test that plans are ordered by pages and settings which don't fit are skipped."""
+        plans = plan([self.text, self.random], (20, 100, 200), redundancy=(2, 10))
+        # Page doesn't have enough columns for 10 blocks of group at dpi 20.
+        self.assertEqual(len(plans), 10)
+        self.assertNotIn((20, 10), [(result.settings["dpi"], result.settings["redundancy"])
+                                    for result in plans])
+        self.assertEqual([result.npages for result in plans],
+                         sorted(result.npages for result in plans))
+        best = cheapest([self.text, self.random], (20, 100, 200), redundancy=(2, 10))
+        self.assertEqual(best.settings, plans[0].settings)
+        self.assertEqual(best.settings["redundancy"], 10)
+        self.assertTrue(best.settings["compressed"])
+
+    def test_invalid(self):
+        """Test that invalid settings are rejected."""
+        with self.assertRaises(ValueError):
+            plan([self.small], redundancy=(1,))
+        with self.assertRaises(TypeError):
+            plan([self.small], papersize=1000)
+        with self.assertRaises(ValueError):
+            cheapest([self.small], (20,))
@@ -0,0 +1,375 @@
+import bz2
+import os
+import shutil
+import tempfile
+import unittest
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from paperbak.constants import SUPERBLOCK
+from paperbak.crc16 import crc16
+from paperbak.crypto import CbcDecryptor
+from paperbak.printer import FilePrinter, print_files
+from paperbak.recovery import recovery_data
+from paperbak.structures import BlockTable, SuperData
+
+
+class TestReadAndCompress(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.text = b"Lorem ipsum dolor sit amet. " * 20000
+        self.random = os.urandom(100000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_printer(self, data, compressed):
+        path = os.path.join(self.tmpdir, "file.bin")
+        with open(path, "wb") as file:
+            file.write(data)
+        printer = FilePrinter(path)
+        printer.compressed = compressed
+        printer.get_file_info()
+        printer.read_and_compress()
+        self.addCleanup(printer.close)
+        return printer
+
+    def read_buffer(self, printer):
+        printer.buffer.seek(0)
+        return printer.buffer.read()
+
+    def test_compressed(self):
+        """Test that compressed buffer decompresses to the file."""
+        printer = self.make_printer(self.text, True)
+        data = self.read_buffer(printer)
+        self.assertTrue(printer.compressed)
+        self.assertEqual(len(data), printer.alignedsize)
+        self.assertEqual(bz2.decompress(data[:printer.datasize]), self.text)
+
+    def test_uncompressed(self):
+        """Test that buffer contains the file when compression is off."""
+        printer = self.make_printer(self.text, False)
+        self.assertEqual(printer.datasize, len(self.text))
+        self.assertEqual(self.read_buffer(printer)[:printer.datasize], self.text)
+
+    def test_incompressible(self):
+        """Test that compression is turned off when it doesn't reduce size."""
+        printer = self.make_printer(self.random, True)
+        self.assertFalse(printer.compressed)
+        self.assertEqual(self.read_buffer(printer)[:printer.datasize], self.random)
+
+    def test_probe_incompressible(self):
+        """Test that large incompressible file is read only once, without compression."""
+        with mock.patch.object(FilePrinter, "read_pieces", autospec=True,
+                               side_effect=FilePrinter.read_pieces) as read_pieces:
+            printer = self.make_printer(os.urandom(500000), True)
+        read_pieces.assert_called_once()
+        self.assertFalse(printer.compressed)
+        self.assertEqual(printer.datasize, 500000)
+
+    def test_probe_compressible(self):
+        """Test that samples of text are recognized as compressible."""
+        printer = self.make_printer(self.text, True)
+        with open(printer.path, "rb") as file:
+            self.assertTrue(printer.is_compressible(file))
+        self.assertTrue(printer.compressed)
+
+    def test_probe_off(self):
+        """Test that without probe incompressible file is read again when compression fails."""
+        path = os.path.join(self.tmpdir, "file.bin")
+        with open(path, "wb") as file:
+            file.write(os.urandom(500000))
+        printer = FilePrinter(path)
+        printer.compressed = True
+        printer.probe = False
+        printer.get_file_info()
+        with mock.patch.object(FilePrinter, "read_pieces", autospec=True,
+                               side_effect=FilePrinter.read_pieces) as read_pieces:
+            printer.read_and_compress()
+        self.addCleanup(printer.close)
+        self.assertEqual(read_pieces.call_count, 2)
+        self.assertFalse(printer.compressed)
+
+    def test_alignment(self):
+        """Test that data is padded with zeros to 16 bytes."""
+        printer = self.make_printer(b"x" * 17, False)
+        self.assertEqual(printer.datasize, 17)
+        self.assertEqual(printer.alignedsize, 32)
+        self.assertEqual(self.read_buffer(printer), b"x" * 17 + bytes(15))
+
+    def test_filecrc(self):
+        """Test that CRC updated piece by piece matches CRC of aligned data."""
+        printer = self.make_printer(self.text, False)
+        self.assertEqual(printer.filecrc, crc16(self.read_buffer(printer)))
+
+    def test_encrypt_data(self):
+        """Test that data is encrypted in place and CRC is kept of unencrypted data."""
+        printer = self.make_printer(self.text, False)
+        plain = self.read_buffer(printer)
+        printer.encrypted = True
+        printer.key = bytes(range(24))
+        printer.salt = bytes(range(32))
+        printer.encrypt_data()
+        encrypted = self.read_buffer(printer)
+        self.assertEqual(len(encrypted), printer.alignedsize)
+        self.assertEqual(CbcDecryptor(printer.key, printer.salt[16:]).update(encrypted), plain)
+        self.assertEqual(printer.filecrc, crc16(plain))
+
+    def test_encrypt_empty_password(self):
+        """Test that empty password turns encryption off."""
+        printer = self.make_printer(self.text, False)
+        plain = self.read_buffer(printer)
+        printer.encrypted = True
+        printer.password = ""
+        printer.encrypt_data()
+        self.assertFalse(printer.encrypted)
+        self.assertEqual(self.read_buffer(printer), plain)
+
+    def test_encrypted_name(self):
+        """Test that name of encrypted file is limited by its length in bytes."""
+        path = os.path.join(self.tmpdir, "\u010d" * 16)
+        with open(path, "wb") as file:
+            file.write(self.text[:100])
+        printer = FilePrinter(path)
+        printer.encrypted = True
+        printer.key = bytes(range(24))
+        printer.get_file_info()
+        printer.read_and_compress()
+        self.addCleanup(printer.close)
+        printer.encrypt_data()
+        with self.assertRaisesRegex(ValueError, "31 bytes"):
+            printer.make_superdata()
+
+    def make_multistream_printer(self, compatible):
+        path = os.path.join(self.tmpdir, "file.bin")
+        with open(path, "wb") as file:
+            file.write(self.text * 3)
+        printer = FilePrinter(path)
+        printer.compressed = True
+        printer.compression_workers = 2
+        printer.compatible = compatible
+        printer.get_file_info()
+        printer.read_and_compress()
+        self.addCleanup(printer.close)
+        return printer
+
+    def test_multistream(self):
+        """Test that chunks compressed in parallel are concatenated streams of the file."""
+        printer = self.make_multistream_printer(False)
+        self.assertTrue(printer.multistream)
+        data = self.read_buffer(printer)[:printer.datasize]
+        self.assertEqual(data.count(b"BZh1"), 2)
+        self.assertEqual(bz2.decompress(data), self.text * 3)
+        self.assertEqual(printer.filecrc, crc16(self.read_buffer(printer)))
+        printer.make_superdata()
+        self.assertTrue(printer.superdata.pbm_multistream)
+        self.assertFalse(printer.superdata.compatible)
+
+    def test_multistream_compatible(self):
+        """Test that single stream is kept when compatibility is required."""
+        printer = self.make_multistream_printer(True)
+        self.assertFalse(printer.multistream)
+        printer.make_superdata()
+        self.assertTrue(printer.superdata.compatible)
+
+    def test_iter_pages(self):
+        """Test that pages together give the whole aligned data."""
+        printer = self.make_printer(self.text, False)
+        printer.pagesize = 90 * 1000
+        pages = list(printer.iter_pages())
+        self.assertEqual(len(pages), 7)
+        self.assertEqual([len(page) for page in pages[:-1]], [90000] * 6)
+        self.assertEqual(b"".join(pages), self.read_buffer(printer))
+
+
+class TestPrintPages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data = os.urandom(200000)
+        self.path = os.path.join(self.tmpdir, "file.bin")
+        with open(self.path, "wb") as file:
+            file.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_printer(self):
+        printer = FilePrinter(self.path)
+        printer.get_file_info()
+        printer.read_and_compress()
+        self.addCleanup(printer.close)
+        printer.make_superdata()
+        printer.calc_layout()
+        printer.calc_data_page_size()
+        return printer
+
+    def test_geometry(self):
+        """Test that default A4 page at 300 dpi has the same geometry as in original code."""
+        printer = self.make_printer()
+        self.assertEqual((printer.width, printer.height), (2481, 3507))
+        self.assertEqual((printer.dx, printer.dy, printer.px, printer.py), (2, 2, 1, 1))
+        self.assertEqual((printer.nx, printer.ny), (28, 45))
+        self.assertEqual((printer.bitmap_width, printer.bitmap_height), (2012, 3201))
+        self.assertEqual(printer.pagesize, 208 * 5 * 90)
+        self.assertEqual(printer.npages, 3)
+        self.assertIs(self.make_printer().layout, printer.layout)
+
+    def test_page_rows(self):
+        """Test that grid on the last page is reduced, but keeps at least 3 rows."""
+        printer = self.make_printer()
+        self.assertEqual(printer.calc_page_rows(0), (208, 45))
+        nstring, ny = printer.calc_page_rows(2)
+        self.assertEqual(nstring, (200000 - 2 * 93600 + 15) // 16 * 16 // 450 + 1)
+        self.assertEqual(ny, ((nstring + 1) * 6 + 1 + 27) // 28)
+        printer.alignedsize = 2 * printer.pagesize + 16
+        self.assertEqual(printer.calc_page_rows(2), (1, 3))
+
+    def test_cells(self):
+        """Test that every string is rotated only within its cells."""
+        printer = self.make_printer()
+        for nstring in (5, 27, 100):
+            cells = printer.calc_cells(nstring)
+            self.assertEqual(cells.shape, (6, nstring + 1))
+            for j, string in enumerate(cells):
+                self.assertEqual(
+                    sorted(string), list(range(j * (nstring + 1), (j + 1) * (nstring + 1))))
+
+    def test_page_blocks(self):
+        """Test that data blocks are placed into strings and superblock fills other cells."""
+        printer = self.make_printer()
+        blocks = printer.make_page_blocks(1)
+        self.assertEqual(len(blocks), 28 * 45)
+        cells = printer.calc_cells(208)
+        data = printer.get_page_data(1)
+        for i in (0, 100, 207):
+            for j in range(5):
+                block = blocks[int(cells[j, i + 1])]
+                offset = (i * 5 + j) * 90
+                self.assertEqual(block.address, printer.pagesize + offset)
+                self.assertEqual(bytes(block.data), data[offset:offset + 90])
+            recovery = blocks[int(cells[5, i + 1])]
+            self.assertEqual(recovery.address, (printer.pagesize + i * 450) | 5 << 28)
+            group = np.frombuffer(data[i * 450:(i + 1) * 450], dtype=np.uint8).reshape(1, 5, 90)
+            self.assertEqual(bytes(recovery.data), recovery_data(group)[0].tobytes())
+        self.assertTrue(np.all(blocks.array["address"][cells[:, 0]] == SUPERBLOCK))
+        self.assertEqual(blocks.array["address"][-1], SUPERBLOCK)
+        self.assertEqual(SuperData.frombuffer(blocks.raw[-1]).page, 2)
+        expected = BlockTable(array=blocks.array.copy())
+        expected.calc_crc()
+        expected.calc_ecc()
+        self.assertEqual(expected.tobytes(), blocks.tobytes())
+
+    def test_render_pages(self):
+        """Test that pages drawn by worker processes are the same and in order."""
+        printer = self.make_printer()
+        pages = list(printer.render_pages())
+        self.assertEqual(len(pages), 3)
+        for expected, page in zip(pages, printer.render_pages(workers=2)):
+            np.testing.assert_array_equal(expected, page)
+
+    def test_render_pages_1bit(self):
+        """Test that worker processes draw 1-bit bitmaps."""
+        printer = self.make_printer()
+        pages = list(printer.render_pages(workers=2, bits=1))
+        np.testing.assert_array_equal(pages[2], printer.render_page(2, bits=1))
+
+    def test_print_file(self):
+        """Test that every page is saved into numbered bitmap."""
+        printer = FilePrinter(self.path)
+        printer.print_file(os.path.join(self.tmpdir, "backup"))
+        self.assertEqual(sorted(name for name in os.listdir(self.tmpdir) if name != "file.bin"),
+                         ["backup_0001.bmp", "backup_0002.bmp", "backup_0003.bmp"])
+        with open(os.path.join(self.tmpdir, "backup_0003.bmp"), "rb") as file:
+            header = file.read(26)
+        self.assertEqual(header[:2], b"BM")
+
+    def test_print_file_memory(self):
+        """Test that bitmap of page is released before the next page is drawn."""
+        images = []
+        render_page = FilePrinter.render_page
+
+        def render(printer, page, bits=8):
+            self.assertTrue(all(ref() is None for ref in images))
+            image = render_page(printer, page, bits)
+            images.append(weakref.ref(image))
+            return image
+
+        with mock.patch.object(FilePrinter, "render_page", render):
+            FilePrinter(self.path).print_file(os.path.join(self.tmpdir, "backup"))
+        self.assertEqual(len(images), 3)
+
+
+class TestPrintFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for name in ("a.txt", "b.txt", "c.txt"):
+            self.paths.append(os.path.join(self.tmpdir, name))
+            with open(self.paths[-1], "wb") as file:
+                file.write(os.urandom(1000))
+        self.outdir = os.path.join(self.tmpdir, "out")
+        os.mkdir(self.outdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_serial(self):
+        """Test that every file is printed into images named by the file."""
+        results = list(print_files(self.paths, self.outdir, ".pbm"))
+        self.assertEqual([path for path, pages, error in results], self.paths)
+        self.assertEqual(sorted(os.listdir(self.outdir)), ["a.txt.pbm", "b.txt.pbm", "c.txt.pbm"])
+        self.assertEqual(results[0][1], [os.path.join(self.outdir, "a.txt.pbm")])
+
+    def test_workers(self):
+        """Test that files are printed by pool of processes and errors are reported."""
+        paths = self.paths + [os.path.join(self.tmpdir, "missing.txt")]
+        results = list(print_files(paths, self.outdir, ".png", workers=2, redundancy=3))
+        self.assertEqual(sorted(path for path, pages, error in results), sorted(paths))
+        errors = [path for path, pages, error in results if error is not None]
+        self.assertEqual(errors, paths[-1:])
+        self.assertEqual(len(os.listdir(self.outdir)), 3)
+
+    def test_encrypted(self):
+        """Test that keys are derived by the pool and passed to printing of the files."""
+        results = list(print_files(self.paths, self.outdir, ".pbm", workers=2, encrypted=True,
+                                   password="secret"))
+        self.assertEqual([error for path, pages, error in results], [None] * 3)
+        self.assertEqual(len(os.listdir(self.outdir)), 3)
+
+    def test_compression_workers(self):
+        """Test that compression processes are split among files printed at once."""
+        result = (None, [], None)
+        with mock.patch("paperbak.printer._print_worker", return_value=result) as worker, \
+                mock.patch("paperbak.printer.ProcessPoolExecutor", ThreadPoolExecutor):
+            list(print_files(self.paths, self.outdir, workers=2, compression_workers=4))
+            self.assertEqual({call[0][2]["compression_workers"] for call in worker.call_args_list},
+                             {2})
+            worker.reset_mock()
+            list(print_files(self.paths[:1], self.outdir, workers=2, compression_workers=4))
+            worker.assert_called_once_with(self.paths[0], mock.ANY, {"compression_workers": 4})
+
+    def test_max_pages(self):
+        """Test that max_pages limits the number of processes."""
+        result = (None, [], None)
+        with mock.patch("paperbak.printer._print_worker", return_value=result) as worker, \
+                mock.patch("paperbak.printer.ProcessPoolExecutor",
+                           side_effect=ThreadPoolExecutor) as executor:
+            list(print_files(self.paths, self.outdir, workers=3, max_pages=2))
+            executor.assert_called_once_with(2)
+            self.assertEqual(worker.call_count, 3)
+            executor.reset_mock()
+            list(print_files(self.paths, self.outdir, workers=3, max_pages=1))
+            executor.assert_not_called()
+        with self.assertRaises(ValueError):
+            list(print_files(self.paths, self.outdir, max_pages=0))
+
+    def test_unique_names(self):
+        """Test that files with the same name are rejected."""
+        with self.assertRaises(ValueError):
+            list(print_files(self.paths + self.paths[:1], self.outdir))
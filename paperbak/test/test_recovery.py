@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+
+from paperbak.recovery import rebuild, recovery_address, recovery_data, split_address
+
+
+class TestRecoveryData(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.random.randint(0, 256, size=(20, 5, 90), dtype=np.uint8)
+
+    def test_recovery_data(self):
+        """Test that recovery data is inverted XOR of data of group."""
+        recovery = recovery_data(self.data)
+        self.assertEqual(recovery.shape, (20, 90))
+        for group, expected in zip(self.data, recovery):
+            block = bytearray(b"\xFF" * 90)
+            for data in group:
+                block = bytearray(a ^ b for a, b in zip(block, data))
+            self.assertEqual(bytes(block), expected.tobytes())
+
+    def test_empty_group(self):
+        """Test that recovery data of zero blocks is 0xFF."""
+        self.assertTrue((recovery_data(np.zeros((1, 3, 90), dtype=np.uint8)) == 0xFF).all())
+
+    def test_shape(self):
+        """Test that data must be 3D array of blocks."""
+        with self.assertRaises(ValueError):
+            recovery_data(np.zeros((5, 90), dtype=np.uint8))
+
+    def test_rebuild(self):
+        """Test that one missing block in every group is rebuilt."""
+        recovery = recovery_data(self.data)
+        missing = np.random.randint(0, 5, size=20)
+        damaged = self.data.copy()
+        damaged[np.arange(20), missing] = np.random.randint(0, 256, size=(20, 90))
+        np.testing.assert_array_equal(
+            rebuild(damaged, recovery, missing), self.data[np.arange(20), missing])
+
+
+class TestAddress(unittest.TestCase):
+
+    def test_address(self):
+        """Test that redundancy is stored in the highest 4 bits of address."""
+        self.assertEqual(recovery_address(900, 5), 0x50000384)
+        self.assertEqual(split_address(0x50000384), (900, 5))
+        self.assertEqual(split_address(900), (900, 0))
+
+    def test_array(self):
+        """Test that addresses of all groups are calculated at once."""
+        offsets = np.arange(4, dtype=np.uint32) * 450
+        addresses = recovery_address(offsets, 5)
+        np.testing.assert_array_equal(split_address(addresses)[0], offsets)
+        np.testing.assert_array_equal(split_address(addresses)[1], [5] * 4)
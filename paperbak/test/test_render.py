@@ -0,0 +1,224 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+from paperbak.render import (
+    BLACK, CELL, GRID, WHITE, block_dots, draw_dots, fill_dots, render_page, save_bmp, save_image,
+    save_pbm, save_pdf, save_png)
+
+
+def sample_dots(image, nx, ny, dx, dy, border):
+    """Return dots of all cells of the grid read from the top left pixel of every dot."""
+    y = border + (np.arange(ny)[:, None] * CELL + 2 + np.arange(32)) * dy
+    x = border + (np.arange(nx)[:, None] * CELL + 2 + np.arange(32)) * dx
+    dots = image[y.reshape(ny, 1, 32, 1), x.reshape(1, nx, 1, 32)]
+    return dots.reshape(nx * ny, 32, 32)
+
+
+class TestBlockDots(unittest.TestCase):
+
+    def test_empty_block(self):
+        """Test that empty block is drawn as alternating raster."""
+        dots = block_dots(np.zeros((1, 128), dtype=np.uint8))[0]
+        self.assertTrue(dots[0::2, 0::2].all())
+        self.assertFalse(dots[0::2, 1::2].any())
+        self.assertTrue(dots[1::2, 1::2].all())
+        self.assertFalse(dots[1::2, 0::2].any())
+
+    def test_bit_order(self):
+        """Test that bit i of little endian 32-bit word is the dot in column i."""
+        raw = np.zeros((1, 128), dtype=np.uint8)
+        raw[0, 4:8] = np.frombuffer(struct.pack("<I", 0x80000001), dtype=np.uint8)
+        dots = block_dots(raw)[0]
+        expected = np.arange(32) % 2 == 1
+        expected[[0, 31]] = ~expected[[0, 31]]
+        np.testing.assert_array_equal(dots[1], expected)
+
+    def test_shape(self):
+        """Test that blocks must be 128 bytes long."""
+        with self.assertRaises(ValueError):
+            block_dots(np.zeros((2, 127), dtype=np.uint8))
+
+
+class TestFillDots(unittest.TestCase):
+
+    def test_corner(self):
+        """Test that top left corner has only the bottom part of raster."""
+        dots = fill_dots(-1, -1, 10, 10)
+        self.assertFalse(dots[1:25:2].any())
+        self.assertTrue(dots[25::2, 25::2].all())
+        self.assertFalse(dots[25::2, :25].any())
+
+    def test_side(self):
+        """Test that cells in right border have raster only next to the grid."""
+        dots = fill_dots(10, 3, 10, 10)
+        self.assertTrue(dots[0::2, 0::2].all())
+        self.assertFalse(dots[1::2, 8:].any())
+
+
+class TestRenderPage(unittest.TestCase):
+
+    def setUp(self):
+        self.nx, self.ny = 4, 3
+        self.raw = np.random.randint(0, 256, size=(self.nx * self.ny, 128), dtype=np.uint8)
+
+    def render(self, dx=3, dy=3, px=2, py=2, border=25, printborder=False, bits=8):
+        width = (self.nx * CELL * dx + px + 2 * border + 3) & ~3
+        return render_page(self.raw, self.nx, self.ny, dx, dy, px, py, border, width,
+                           printborder=printborder, bits=bits)
+
+    def test_size(self):
+        """Test that bitmap has the size of the grid with border."""
+        image = self.render()
+        self.assertEqual(image.shape, (3 * CELL * 3 + 2 + 50, 4 * CELL * 3 + 2 + 50))
+        self.assertEqual(image.dtype, np.uint8)
+
+    def test_dots(self):
+        """Test that dots of blocks are drawn into their cells."""
+        for dx, dy, px, py in ((2, 2, 1, 1), (3, 3, 2, 2), (3, 2, 3, 2)):
+            image = self.render(dx, dy, px, py)
+            np.testing.assert_array_equal(
+                sample_dots(image, self.nx, self.ny, dx, dy, 25) == BLACK, block_dots(self.raw))
+
+    def test_dot_size(self):
+        """Test that every dot covers px * py pixels."""
+        image = self.render(dx=3, dy=3, px=2, py=1)
+        dots = block_dots(self.raw)
+        self.assertEqual((image == BLACK).sum(), dots.sum() * 2)
+
+    def test_grid(self):
+        """Test that grid lines are drawn around cells."""
+        image = self.render(dx=3, dy=3, px=2, py=2, border=25)
+        right = 25 + self.nx * CELL * 3
+        bottom = 25 + self.ny * CELL * 3
+        self.assertTrue((image[25:bottom + 2, [25, 26, 25 + CELL * 3, right + 1]] == GRID).all())
+        self.assertTrue((image[[25, 26, bottom + 1], 25:right + 2] == GRID).all())
+        self.assertTrue((image[:25] == WHITE).all())
+        self.assertTrue((image[:, right + 2:] == WHITE).all())
+
+    def test_printborder(self):
+        """Test that border is filled with raster and grid lines go through the whole page."""
+        image = self.render(dx=2, dy=2, px=1, py=1, border=32, printborder=True)
+        self.assertTrue((image[:, 32] == GRID).all())
+        self.assertTrue((image[32] == GRID).all())
+        self.assertTrue((image[:32] == BLACK).any())
+        np.testing.assert_array_equal(
+            sample_dots(image, self.nx, self.ny, 2, 2, 32) == BLACK, block_dots(self.raw))
+
+    def test_1bit(self):
+        """Test that 1-bit bitmap has all non-white pixels of 8-bit bitmap."""
+        for printborder in (False, True):
+            image = self.render(printborder=printborder)
+            bitmap = self.render(printborder=printborder, bits=1)
+            self.assertEqual(bitmap.dtype, bool)
+            np.testing.assert_array_equal(bitmap, image != WHITE)
+
+    def test_number_of_blocks(self):
+        """Test that number of blocks must match the grid."""
+        with self.assertRaises(ValueError):
+            render_page(self.raw[1:], self.nx, self.ny, 2, 2, 1, 1, 25, 400)
+
+
+class TestDrawDots(unittest.TestCase):
+
+    def test_position(self):
+        """Test that dot is drawn at its position in the cell."""
+        cells = np.zeros((2, 2, 32, 32), dtype=bool)
+        cells[1, 0, 3, 5] = True
+        pixels = draw_dots(cells, 3, 2, 2, 1)
+        self.assertEqual(pixels.shape, (2 * CELL * 2, 2 * CELL * 3))
+        y, x = np.nonzero(pixels)
+        np.testing.assert_array_equal(y, [(CELL + 2 + 3) * 2] * 2)
+        np.testing.assert_array_equal(x, [(2 + 5) * 3, (2 + 5) * 3 + 1])
+
+
+class TestSaveBmp(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_save(self):
+        """Test that bitmap is saved as 8-bit BMP with rows from bottom to top."""
+        image = np.random.randint(0, 256, size=(5, 8), dtype=np.uint8)
+        path = os.path.join(self.tmpdir, "page.bmp")
+        save_bmp(path, image, 300, 300)
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, size, offset = struct.unpack_from("<2sI4xI", data)
+        width, height, planes, bits = struct.unpack_from("<iiHH", data, 18)
+        self.assertEqual((magic, size, width, height, planes, bits), (b"BM", len(data), 8, 5, 1, 8))
+        pixels = np.frombuffer(data, dtype=np.uint8, offset=offset).reshape(5, 8)
+        np.testing.assert_array_equal(pixels[::-1], image)
+
+    def test_width(self):
+        """Test that width of bitmap must be aligned to 4 bytes."""
+        with self.assertRaises(ValueError):
+            save_bmp(os.path.join(self.tmpdir, "page.bmp"), np.zeros((2, 3), dtype=np.uint8))
+
+
+class TestSaveImage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.bitmap = np.random.randint(0, 2, size=(5, 13)).astype(bool)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, name):
+        with open(os.path.join(self.tmpdir, name), "rb") as file:
+            return file.read()
+
+    def test_pbm(self):
+        """Test that 1-bit bitmap is saved as PBM with black pixels set."""
+        save_pbm(os.path.join(self.tmpdir, "page.pbm"), self.bitmap)
+        data = self.read("page.pbm")
+        self.assertTrue(data.startswith(b"P4\n13 5\n"))
+        pixels = np.unpackbits(np.frombuffer(data[8:], dtype=np.uint8).reshape(5, 2), axis=1)
+        np.testing.assert_array_equal(pixels[:, :13], self.bitmap)
+
+    def test_png(self):
+        """Test that 1-bit and 8-bit bitmaps are saved as grayscale PNG."""
+        image = np.where(self.bitmap, BLACK, WHITE).astype(np.uint8)
+        for bitmap, depth in ((self.bitmap, 1), (image, 8)):
+            save_png(os.path.join(self.tmpdir, "page.png"), bitmap, 300, 300)
+            data = self.read("page.png")
+            self.assertEqual(data[:8], b"\x89PNG\r\n\x1a\n")
+            self.assertEqual(struct.unpack_from(">4sIIB", data, 12), (b"IHDR", 13, 5, depth))
+            start = data.index(b"IDAT")
+            length, = struct.unpack_from(">I", data, start - 4)
+            rows = np.frombuffer(zlib.decompress(data[start + 4:start + 4 + length]),
+                                 dtype=np.uint8).reshape(5, -1)
+            self.assertFalse(rows[:, 0].any())
+            if depth == 1:
+                np.testing.assert_array_equal(np.unpackbits(rows[:, 1:], axis=1)[:, :13],
+                                              ~self.bitmap)
+            else:
+                np.testing.assert_array_equal(rows[:, 1:], image)
+
+    def test_pdf(self):
+        """Test that PDF has cross-reference table pointing to its objects."""
+        save_pdf(os.path.join(self.tmpdir, "page.pdf"), self.bitmap, 600, 600)
+        data = self.read("page.pdf")
+        self.assertTrue(data.startswith(b"%PDF-1.4"))
+        xref = int(data.rsplit(b"startxref\n", 1)[1].split()[0])
+        self.assertTrue(data[xref:].startswith(b"xref\n0 6\n"))
+        offsets = data[xref:].split(b"\n")[3:8]
+        for number, line in enumerate(offsets, 1):
+            self.assertTrue(data[int(line[:10]):].startswith(b"%d 0 obj" % number))
+        self.assertIn(b"/MediaBox [0 0 1.56 0.60]", data)
+
+    def test_save_image(self):
+        """Test that format is selected by extension and 1-bit bitmap can be saved as BMP."""
+        save_image(os.path.join(self.tmpdir, "page.BMP"), np.zeros((2, 4), dtype=bool))
+        self.assertEqual(self.read("page.BMP")[:2], b"BM")
+        with self.assertRaises(ValueError):
+            save_image(os.path.join(self.tmpdir, "page.gif"), self.bitmap)
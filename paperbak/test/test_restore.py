@@ -0,0 +1,347 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from paperbak.constants import NDATA, SUPERBLOCK
+from paperbak.printer import FilePrinter
+from paperbak.restore import DecodedPage, FileAssembler, Restorer, decode_file
+from paperbak.structures import BlockTable, SuperData
+
+
+def make_pages(data, compressed=False, **options):
+    """Print data and return its (compressed) data with superblocks and blocks of pages.
+
+    :param options: Attributes of FilePrinter, e.g. encrypted and key
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "file.bin")
+        with open(path, "wb") as file:
+            file.write(data)
+        printer = FilePrinter(path)
+        printer.compressed = compressed
+        for name, value in options.items():
+            setattr(printer, name, value)
+        printer.get_file_info()
+        printer.read_and_compress()
+        printer.encrypt_data()
+        printer.make_superdata()
+        printer.calc_layout()
+        printer.calc_data_page_size()
+        pages = []
+        for page in range(printer.npages):
+            blocks = printer.make_page_blocks(page)
+            mask = blocks.array["address"] == SUPERBLOCK
+            superblock = SuperData.frombuffer(blocks.array[mask][:1].tobytes())
+            pages.append((superblock, BlockTable(array=blocks.array[~mask])))
+        packed = b"".join(printer.iter_pages())
+        printer.close()
+    finally:
+        shutil.rmtree(tmpdir)
+    return packed, pages
+
+
+class TestFileAssembler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data, cls.pages = make_pages(os.urandom(200000))
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def add_page(self, assembler, page, blocks=None):
+        superblock, table = self.pages[page]
+        assembler.start_page(superblock)
+        assembler.add_blocks(table if blocks is None else blocks)
+        return assembler.finish_page()
+
+    def drop(self, page, addresses):
+        """Return blocks of page without blocks at addresses."""
+        table = self.pages[page][1]
+        return BlockTable(array=table.array[~np.isin(table.array["address"], addresses)])
+
+    def test_assemble(self):
+        """Test that data of all pages is assembled."""
+        assembler = FileAssembler(self.pages[0][0])
+        self.assertEqual(assembler.npages, 3)
+        for page in (2, 0, 1):
+            remaining = self.add_page(assembler, page)
+        self.assertEqual(remaining, [])
+        self.assertTrue(assembler.complete)
+        self.assertEqual(assembler.data.tobytes(), self.data)
+        self.assertEqual(assembler.recoveredblocks, 0)
+
+    def test_remaining_pages(self):
+        """Test that pages with missing blocks are reported."""
+        assembler = FileAssembler(self.pages[1][0])
+        self.assertEqual(assembler.remaining_pages(), [1, 2, 3])
+        self.assertEqual(self.add_page(assembler, 1), [1, 3])
+        self.assertFalse(assembler.complete)
+        np.testing.assert_array_equal(assembler.missing[1], 0)
+
+    def test_recovery(self):
+        """Test that single missing block of group is rebuilt from recovery block."""
+        assembler = FileAssembler(self.pages[0][0])
+        base = assembler.pagesize
+        # First and last block of two groups, the last block of file is in partial group.
+        lost = [base, base + 9 * NDATA, len(self.data) // NDATA * NDATA]
+        for page in range(3):
+            self.add_page(assembler, page, self.drop(page, lost))
+        self.assertTrue(assembler.complete)
+        self.assertEqual(assembler.recoveredblocks, 3)
+        self.assertEqual(assembler.data.tobytes(), self.data)
+
+    def test_unrecoverable(self):
+        """Test that group with two missing blocks is not rebuilt."""
+        assembler = FileAssembler(self.pages[0][0])
+        self.assertEqual(self.add_page(assembler, 0, self.drop(0, [0, NDATA])), [1, 2, 3])
+        self.assertEqual(assembler.recoveredblocks, 0)
+        self.assertEqual(assembler.ndata, assembler.page_blocks - 2)
+
+    def test_invalid_blocks(self):
+        """Test that duplicated blocks and blocks with invalid address are ignored."""
+        assembler = FileAssembler(self.pages[0][0])
+        table = self.pages[0][1]
+        blocks = BlockTable(array=np.concatenate([table.array[:3], table.array[:3]]))
+        blocks.array["address"][3] = 1
+        blocks.array["address"][4] = 0x7FFFFFF0
+        self.assertEqual(assembler.add_blocks(blocks), 4)
+        self.assertEqual(assembler.ndata, 3)
+        self.assertEqual(assembler.add_blocks(blocks), 4)
+        self.assertEqual(assembler.ndata, 3)
+
+    def test_wrong_file(self):
+        """Test that page of different file is rejected."""
+        assembler = FileAssembler(self.pages[0][0])
+        superblock = SuperData.frombuffer(bytearray(self.pages[1][0].tobytes()))
+        superblock.datasize += 16
+        with self.assertRaises(ValueError):
+            assembler.start_page(superblock)
+
+    def test_mixed_pagesize(self):
+        """Test that copies printed with different page size are merged without pages."""
+        assembler = FileAssembler(self.pages[0][0])
+        self.add_page(assembler, 0)
+        superblock = SuperData.frombuffer(bytearray(self.pages[1][0].tobytes()))
+        superblock.pagesize //= 2
+        assembler.start_page(superblock)
+        assembler.add_blocks(self.pages[1][1])
+        self.assertEqual(assembler.finish_page(), [])
+        self.assertEqual(assembler.pagesize, 0)
+        self.add_page(assembler, 2)
+        self.assertTrue(assembler.complete)
+        self.assertEqual(assembler.data.tobytes(), self.data)
+
+    def test_mmap(self):
+        """Test that data can be gathered in memory mapped file."""
+        path = os.path.join(self.tmpdir, "data")
+        assembler = FileAssembler(self.pages[0][0], path)
+        for page in range(3):
+            self.add_page(assembler, page)
+        assembler.close()
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(len(self.data)), self.data)
+
+
+class TestOutput(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        words = np.random.randint(0, 1000, size=300000).astype(str)
+        cls.original = " ".join(words).encode()
+        cls.data, cls.pages = make_pages(cls.original, compressed=True)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.assembler = FileAssembler(self.pages[0][0])
+        self.output = io.BytesIO()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def add_page(self, page):
+        superblock, blocks = self.pages[page]
+        self.assembler.start_page(superblock)
+        self.assembler.add_blocks(blocks)
+        self.assembler.finish_page()
+
+    def test_streaming(self):
+        """Test that restored file is written as the valid prefix of data grows."""
+        self.assertGreater(len(self.pages), 1)
+        self.assembler.open_output(self.output)
+        self.add_page(1)
+        self.assertEqual(self.output.tell(), 0)
+        self.add_page(0)
+        self.assertGreater(self.output.tell(), 0)
+        self.assertTrue(self.original.startswith(self.output.getvalue()))
+        for page in range(2, len(self.pages)):
+            self.add_page(page)
+        self.assembler.close_output()
+        self.assertEqual(self.output.getvalue(), self.original)
+
+    def test_multistream(self):
+        """Test that every stream of multi-stream data is unpacked."""
+        original = self.original * 2
+        data, pages = make_pages(original, compressed=True, compatible=False,
+                                 compression_workers=2)
+        self.assertTrue(pages[0][0].pbm_multistream)
+        assembler = FileAssembler(pages[0][0])
+        assembler.open_output(self.output)
+        for superblock, blocks in pages:
+            assembler.start_page(superblock)
+            assembler.add_blocks(blocks)
+            assembler.finish_page()
+        assembler.close_output()
+        self.assertEqual(self.output.getvalue(), original)
+
+    def test_uncompressed(self):
+        """Test that padding of uncompressed data is not written."""
+        data, pages = make_pages(self.original[:1000])
+        assembler = FileAssembler(pages[0][0])
+        assembler.add_blocks(pages[0][1])
+        assembler.open_output(self.output)
+        assembler.close_output()
+        self.assertEqual(self.output.getvalue(), self.original[:1000])
+
+    def test_crc(self):
+        """Test that restored data is verified by CRC."""
+        for page in range(len(self.pages)):
+            self.add_page(page)
+        # The last byte of data is either in the compressed stream or in the padding.
+        self.assembler.blocks.reshape(-1)[self.assembler.datasize - 1] ^= 1
+        with self.assertRaises(ValueError):
+            self.assembler.open_output(self.output)
+            self.assembler.close_output()
+
+    def test_incomplete(self):
+        """Test that incomplete data is not saved."""
+        self.add_page(0)
+        with self.assertRaises(ValueError):
+            self.assembler.save(os.path.join(self.tmpdir, "file.bin"))
+        self.assembler.open_output(self.output)
+        with self.assertRaises(ValueError):
+            self.assembler.close_output()
+
+    def test_save(self):
+        """Test that restored file is saved with its modification time."""
+        for page in range(len(self.pages)):
+            self.add_page(page)
+        path = os.path.join(self.tmpdir, "file.bin")
+        self.assembler.save(path)
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), self.original)
+        self.assertEqual(os.stat(path).st_mtime,
+                         self.assembler.modified.get_datetime().timestamp())
+
+
+class TestEncrypted(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        words = np.random.randint(0, 1000, size=30000).astype(str)
+        cls.original = " ".join(words).encode()
+        cls.key = os.urandom(24)
+        cls.data, cls.pages = make_pages(cls.original, compressed=True, encrypted=True,
+                                         key=cls.key)
+
+    def setUp(self):
+        self.assembler = FileAssembler(self.pages[0][0])
+        self.output = io.BytesIO()
+
+    def test_decrypt(self):
+        """Test that encrypted data is decrypted and unpacked while it is written."""
+        self.assembler.open_output(self.output, self.key)
+        for superblock, blocks in self.pages:
+            self.assembler.start_page(superblock)
+            self.assembler.add_blocks(blocks)
+            self.assembler.finish_page()
+        self.assembler.close_output()
+        self.assertEqual(self.output.getvalue(), self.original)
+
+    def test_wrong_key(self):
+        """Test that wrong key is reported."""
+        self.assembler.add_blocks(self.pages[0][1])
+        with self.assertRaises(ValueError):
+            self.assembler.open_output(self.output, bytes(24))
+            self.assembler.close_output()
+
+    def test_missing_key(self):
+        """Test that encrypted data can't be written without key."""
+        with self.assertRaises(ValueError):
+            self.assembler.open_output(self.output)
+
+
+class TestRestorer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data, cls.pages = make_pages(os.urandom(200000))
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.restorer = Restorer(self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def decoded(self, page):
+        decoded = DecodedPage()
+        decoded.path = "page%d.bmp" % page
+        decoded.superblock = self.pages[page][0].tobytes()
+        decoded.blocks = self.pages[page][1].array
+        return decoded
+
+    def test_route(self):
+        """Test that file is saved when its last page is added."""
+        self.assertIsNone(self.restorer.add_page(self.decoded(2)))
+        self.assertIsNone(self.restorer.add_page(self.decoded(0)))
+        self.assertEqual(os.listdir(self.tmpdir), ["file.bin.part"])
+        path = self.restorer.add_page(self.decoded(1))
+        self.assertEqual(path, os.path.join(self.tmpdir, "file.bin"))
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), self.data[:200000])
+        self.assertEqual(os.listdir(self.tmpdir), ["file.bin"])
+        self.assertIsNone(self.restorer.add_page(self.decoded(1)))
+        self.assertEqual(self.restorer.npages, 4)
+        self.assertEqual(self.restorer.close(), [])
+
+    def test_errors(self):
+        """Test that unreadable pages are reported."""
+        page = DecodedPage()
+        page.path = "page.bmp"
+        page.error = "No grid."
+        self.restorer.add_page(page)
+        page = self.decoded(0)
+        page.superblock = None
+        self.restorer.add_page(page)
+        self.assertEqual([path for path, error in self.restorer.errors], ["page.bmp", "page0.bmp"])
+
+    def test_incomplete(self):
+        """Test that incomplete files are reported and removed."""
+        self.restorer.add_page(self.decoded(1))
+        self.assertEqual(self.restorer.close(), [("file.bin", [1, 3])])
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_single_file(self):
+        """Test that single image file is decoded in this process by all workers."""
+        path = os.path.join(self.tmpdir, "file.bin")
+        with open(path, "wb") as file:
+            file.write(self.data[:3000])
+        FilePrinter(path).print_file(os.path.join(self.tmpdir, "page.bmp"))
+        os.remove(path)
+        restorer = Restorer(self.tmpdir, workers=2)
+        with mock.patch("paperbak.restore.decode_file", wraps=decode_file) as decode:
+            self.assertEqual(list(restorer.restore([os.path.join(self.tmpdir, "page.bmp")])),
+                             [path])
+        decode.assert_called_once_with(mock.ANY, None, None, 2)
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), self.data[:3000])
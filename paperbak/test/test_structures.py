@@ -3,7 +3,9 @@ from datetime import datetime
 
 import numpy as np
 
-from paperbak.structures import Data, SuperData
+from paperbak.constants import SUPERBLOCK
+from paperbak.dtypes import FileTime
+from paperbak.structures import BlockTable, Data, DataView, SuperData, SuperDataView
 
 from . import TEST_DATA
 
@@ -97,6 +99,80 @@ class TestData(unittest.TestCase):
         self.data.calc_ecc()
         self.assertEqual(self.data, Data.frombytes(self.data.tobytes()))
 
+    def test_tobytes_short_data(self):
+        """Test that tobytes pads short data with zeros."""
+        self.data.data = bytes([1, 2])
+        self.assertEqual(self.data.tobytes(False, False)[4:], bytes([1, 2]) + bytes(88))
+
+    def test_tobytes_without_crc(self):
+        """Test that tobytes without crc keeps ecc."""
+        self.data.calc_crc()
+        self.data.calc_ecc()
+        out = self.data.tobytes(with_crc=False)
+        self.assertEqual(len(out), 126)
+        self.assertEqual(out[94:], self.data.ecc)
+
+    def test_pack_into(self):
+        """Test that pack_into writes block into buffer at offset."""
+        self.data.calc_crc()
+        self.data.calc_ecc()
+        buffer = bytearray(3 * 128)
+        self.data.pack_into(buffer, 128)
+        self.assertEqual(bytes(buffer[128:256]), self.data.tobytes())
+        self.assertEqual(bytes(buffer[:128]), bytes(128))
+
+    def test_pack_into_view(self):
+        """Test that pack_into returns view of the block written into table."""
+        table = BlockTable(3)
+        view = self.data.pack_into(table.array, 128)
+        self.assertIsInstance(view, DataView)
+        view.address = 16
+        self.assertEqual(table[1].address, 16)
+        self.assertEqual(view.pack_into(table.array).data, self.data.data)
+        self.assertEqual(table[0].address, 16)
+
+    def test_getbuffer(self):
+        """Test that getbuffer of view shares memory with buffer."""
+        buffer = bytearray(128)
+        memory = self.data.pack_into(buffer).getbuffer(False, False)
+        self.assertEqual(len(memory), 94)
+        buffer[4] = 255
+        self.assertEqual(memory[4], 255)
+        self.assertEqual(bytes(memory), self.data.tobytes(False, False)[:4] + b"\xff" +
+                         self.data.tobytes(False, False)[5:])
+
+    def test_frombuffer(self):
+        """Test that frombuffer returns view sharing memory with buffer."""
+        buffer = bytearray(256)
+        self.data.pack_into(buffer, 128)
+        view = Data.frombuffer(buffer, 128)
+        self.assertIsInstance(view, DataView)
+        self.assertEqual(view.data, self.data.data)
+        view.address = 16
+        self.assertEqual(buffer[128], 16)
+
+    def test_frombuffer_read_only(self):
+        """Test that view of bytes can't be modified."""
+        view = Data.frombuffer(self.data.tobytes())
+        with self.assertRaises(ValueError):
+            view.address = 1
+
+    def test_frombytes_types(self):
+        """Test that fields parsed from bytes have types of params."""
+        self.data.calc_crc()
+        self.data.calc_ecc()
+        data = Data.frombytes(self.data.tobytes())
+        self.assertEqual(data, self.data)
+        self.assertEqual(type(data.address), np.uint32)
+        self.assertEqual(type(data.crc), np.uint16)
+        self.assertEqual(type(data.data), bytes)
+
+    def test_from_fields(self):
+        """Test that from_fields creates block equal to block set field by field."""
+        data = Data.from_fields(address=15, data=TEST_DATA)
+        self.assertEqual(data.tobytes(), self.data2.tobytes())
+        self.assertEqual(type(data.address), np.uint32)
+
 
 class TestSuperData(unittest.TestCase):
 
@@ -268,3 +344,166 @@ class TestSuperData(unittest.TestCase):
         self.superdata.calc_crc()
         self.superdata.calc_ecc()
         self.assertEqual(self.superdata, SuperData.frombytes(self.superdata.tobytes()))
+
+    def test_from_bytes_types(self):
+        """Test that fields parsed from bytes have types of params."""
+        superdata = SuperData.frombytes(self.superdata.tobytes())
+        self.assertIs(superdata.pbm_compressed, True)
+        self.assertIs(superdata.pbm_encrypted, False)
+        self.assertEqual(type(superdata.modified), FileTime)
+        self.assertEqual(type(superdata.datasize), np.uint32)
+        self.assertEqual(superdata.address, SUPERBLOCK)
+
+    def test_pack_into(self):
+        """Test that pack_into writes block into buffer at offset."""
+        buffer = bytearray(2 * 128)
+        self.superdata.pack_into(buffer, 128)
+        self.assertEqual(bytes(buffer[128:]), self.superdata.tobytes())
+
+    def test_frombuffer(self):
+        """Test that frombuffer returns view equal to original block."""
+        self.superdata.calc_crc()
+        self.superdata.calc_ecc()
+        view = SuperData.frombuffer(self.superdata.tobytes())
+        self.assertIsInstance(view, SuperDataView)
+        self.assertEqual(view, self.superdata)
+        self.assertEqual(view.name, "README.txt")
+        self.assertTrue(view.pbm_compressed)
+        self.assertFalse(view.pbm_encrypted)
+
+    def test_multistream(self):
+        """Test that multi-stream mode isn't compatible with the original PaperBack."""
+        self.assertTrue(self.superdata.compatible)
+        self.superdata.pbm_multistream = True
+        self.assertEqual(self.superdata.mode, SuperData.PBM_COMPRESSED | SuperData.PBM_MULTISTREAM)
+        self.assertFalse(self.superdata.compatible)
+        for superdata in (SuperData.frombytes(self.superdata.tobytes()),
+                          SuperData.frombuffer(self.superdata.tobytes())):
+            self.assertTrue(superdata.pbm_multistream)
+            self.assertFalse(superdata.compatible)
+
+    def test_salt(self):
+        """Test that salt of encrypted file is stored at the end of name field."""
+        salt = bytes(range(1, 33))
+        self.superdata.pbm_encrypted = True
+        self.superdata.salt = salt
+        raw = self.superdata.tobytes()
+        self.assertEqual(raw[30:62], b"README.txt" + bytes(22))
+        self.assertEqual(raw[62:94], salt)
+        for superdata in (SuperData.frombytes(raw), SuperData.frombuffer(raw)):
+            self.assertEqual(superdata.name, "README.txt")
+            self.assertEqual(superdata.salt, salt)
+
+    def test_salt_unencrypted(self):
+        """Test that unencrypted file has no salt and the whole name field is used."""
+        self.superdata.name = "x" * 64
+        superdata = SuperData.frombytes(self.superdata.tobytes())
+        self.assertEqual(superdata.name, "x" * 64)
+        self.assertIsNone(superdata.salt)
+
+    def test_name_too_long(self):
+        """Test that name longer than its field in bytes is rejected."""
+        buffer = bytearray(self.superdata.tobytes())
+        view = SuperData.frombuffer(buffer)
+        with self.assertRaises(ValueError):
+            view.name = "\u010d" * 33
+        view.pbm_encrypted = True
+        with self.assertRaises(ValueError):
+            view.name = "\u010d" * 17
+        view.name = "\u010d" * 16
+        self.assertEqual(view.name, "\u010d" * 16)
+
+    def test_frombuffer_mode(self):
+        """Test that PBM flags of view are stored in mode byte."""
+        buffer = bytearray(self.superdata.tobytes())
+        view = SuperData.frombuffer(buffer)
+        view.pbm_encrypted = True
+        view.pbm_compressed = False
+        self.assertEqual(view.mode, SuperData.PBM_ENCRYPTED)
+        self.assertEqual(buffer[16], SuperData.PBM_ENCRYPTED)
+
+    def test_frombuffer_calc_crc(self):
+        """Test that view calculates the same CRC as SuperData."""
+        view = SuperData.frombuffer(bytearray(self.superdata.tobytes()))
+        view.calc_crc()
+        self.assertEqual(view.crc, 9130)
+
+
+class TestBlockTable(unittest.TestCase):
+
+    def setUp(self):
+        self.data = Data()
+        self.data.address = 15
+        self.data.data = bytes(TEST_DATA)
+        self.table = BlockTable(4)
+        self.table[2].address = 15
+        self.table[2].data = bytes(TEST_DATA)
+
+    def test_itemsize(self):
+        """Test that every block takes 128 bytes."""
+        self.assertEqual(self.table.array.nbytes, 4 * 128)
+
+    def test_getitem(self):
+        """Test that items of table are views writing into the table."""
+        self.assertIsInstance(self.table[2], DataView)
+        self.assertEqual(self.table.array["address"][2], 15)
+
+    def test_tobytes(self):
+        """Test that tobytes of table matches tobytes of blocks."""
+        self.data.calc_crc()
+        self.data.calc_ecc()
+        self.table.calc_crc()
+        self.table.calc_ecc()
+        self.assertEqual(self.table.tobytes()[256:384], self.data.tobytes())
+        self.assertEqual(self.table[2].tobytes(), self.data.tobytes())
+
+    def test_calc_crc(self):
+        """Test that CRC16 matches to new_cpp/test_t_data_crc_ecc.cpp."""
+        self.table.calc_crc()
+        self.assertEqual(self.table[2].crc, 31055)
+        self.assertEqual(type(self.table[2].crc), np.uint16)
+
+    def test_calc_ecc(self):
+        """Test that ECC matches Data.calc_ecc."""
+        self.data.calc_crc()
+        self.data.calc_ecc()
+        self.table.calc_crc()
+        self.table.calc_ecc()
+        self.assertEqual(self.table[2].ecc, self.data.ecc)
+        self.assertEqual(self.table[2], self.data)
+
+    def test_view_calc(self):
+        """Test that view calculates CRC and ECC like Data."""
+        self.data.calc_crc()
+        self.data.calc_ecc()
+        view = self.table[2]
+        view.calc_crc()
+        view.calc_ecc()
+        self.assertEqual(view, self.data)
+
+    def test_short_data(self):
+        """Test that short data is padded with zeros."""
+        self.table[0].data = bytes([1, 2, 3])
+        self.assertEqual(self.table[0].data, bytes([1, 2, 3]) + bytes(87))
+
+    def test_fromblocks(self):
+        """Test that table can be created from Data blocks."""
+        self.data.calc_crc()
+        self.data.calc_ecc()
+        table = BlockTable.fromblocks([self.data, self.data])
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table[1], self.data)
+
+    def test_frombytes(self):
+        """Test that table can be reconstructed from bytes."""
+        self.table.calc_crc()
+        self.table.calc_ecc()
+        table = BlockTable.frombytes(self.table.tobytes())
+        self.assertEqual(list(table), list(self.table))
+
+    def test_slice(self):
+        """Test that slice of table shares the array."""
+        part = self.table[2:]
+        part.calc_crc()
+        self.assertEqual(len(part), 2)
+        self.assertEqual(self.table[2].crc, 31055)
@@ -182,3 +182,43 @@ class TestAutoAttrCheckDecorator(unittest.TestCase):
             something = 5
         with self.assertRaises(AttributeError):
             auto_attr_check(TestMissingParams)
+
+    def test_slots(self):
+        """Test that values are stored in slots without instance dictionary."""
+        self.assertFalse(hasattr(self.cls_inst, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.cls_inst.unknown = 1
+        self.cls_inst._type_3 = 5
+        self.assertEqual(self.cls_inst.type_3, 5)
+
+    def test_defaults_per_instance(self):
+        """Test that instances don't share values."""
+        other = type(self.cls_inst)()
+        self.cls_inst.type_1 = 7
+        self.assertEqual(other.type_1, 0)
+
+    def test_from_fields(self):
+        """Test that bulk constructor converts values and keeps defaults of other fields."""
+        inst = type(self.cls_inst).from_fields(type_1=15, type_2=1)
+        self.assertEqual(type(inst.type_1), np.uint32)
+        self.assertIs(inst.type_2, True)
+        self.assertEqual(inst.type_1_def, 2)
+        self.assertEqual(inst.type_4, 42)
+
+    def test_from_fields_checked(self):
+        """Test that bulk constructor rejects invalid fields."""
+        cls = type(self.cls_inst)
+        with self.assertRaises(ValueError):
+            cls.from_fields(type_2=None)
+        with self.assertRaises(TypeError):
+            cls.from_fields(type_3=1)
+        with self.assertRaises(TypeError):
+            cls.from_fields(unknown=1)
+
+    def test_from_trusted_fields(self):
+        """Test that trusted constructor stores values as they are, even read only ones."""
+        inst = type(self.cls_inst).from_trusted_fields(type_1=15, type_3=1)
+        self.assertEqual(type(inst.type_1), int)
+        self.assertEqual(inst.type_3, 1)
+        with self.assertRaises(TypeError):
+            type(self.cls_inst).from_trusted_fields(unknown=1)
@@ -20,7 +20,15 @@ def auto_attr_check(cls):
 
     Defaults from params can be overriden by attribute on base class with same name. See below.
 
-    Read only parametrs can be still set by obj.__<name> variable.
+    Values are stored in __slots__ named _<name>, so instances have no __dict__ and the
+    properties read the slots without building attribute names on every access.
+
+    Read only parametrs can be still set by obj._<name> variable or by from_trusted_fields.
+
+    Decorated class gets two bulk constructors:
+        from_fields(**fields) - values are checked and converted like by attribute assignment
+        from_trusted_fields(**fields) - values are stored as they are, it's meant for internal
+            code which already has values of correct type (e.g. parsed from bytes)
 
     example:
     >>> @auto_attr_check
@@ -43,10 +51,10 @@ def auto_attr_check(cls):
     >>>     type_3_def = 0x55555555  # set default for type_3
     >>>     type_4_def = False  # set default for type_3
     >>>     type_5_def = False  # set default for type_5_def
+    >>> Test.from_fields(type_1=5, type_2=1)
     """
-    def getter_setter_gen(name, type_, can_be_None=True, read_only=False):
-        def getter(self):
-            return getattr(self, "__" + name)
+    def getter_setter_gen(name, slot, type_, can_be_None=True, read_only=False):
+        store = slot.__set__
 
         def setter(self, value):
             if read_only:
@@ -55,35 +63,74 @@ def auto_attr_check(cls):
                 raise ValueError("Attribute %s can't be None." % name)
             if not isinstance(value, type_) and value is not None:
                 value = type_(value)
-            setattr(self, "__" + name, value)
-        return property(getter, setter)
+            store(self, value)
+        return property(slot.__get__, setter)
 
-    new_dict = dict(cls.__dict__)
     if not hasattr(cls, "params"):
         raise AttributeError("Params dictionary is missing")
+    fields = {}  # name: (type, can_be_None, read_only, default)
     for key, value in cls.params.items():
         if isinstance(value, tuple):
             if isinstance(value[0], type) and len(value) == 2:  # case 1
-                val = getter_setter_gen(key, value[0])
-                new_dict["__" + key] = value[1] if key not in cls.__dict__ else cls.__dict__[key]
+                fields[key] = (value[0], True, False, value[1])
             elif isinstance(value[0], type) and len(value) == 3:  # case 2
-                val = getter_setter_gen(key, value[0], value[2])
-                new_dict["__" + key] = value[1] if key not in cls.__dict__ else cls.__dict__[key]
+                fields[key] = (value[0], value[2], False, value[1])
             elif value[0] == False and len(value) == 2:  # case 4
-                val = getter_setter_gen(key, None, read_only=True)
-                new_dict["__" + key] = value[1] if key not in cls.__dict__ else cls.__dict__[key]
+                fields[key] = (None, True, True, value[1])
             else:
                 raise AttributeError("Params improperly configured for key '%s'" % key)
         elif isinstance(value, type):  # case 5
-            val = getter_setter_gen(key, value)
-            new_dict["__" + key] = None if key not in cls.__dict__ else cls.__dict__[key]
+            fields[key] = (value, True, False, None)
         elif value is False:  # case 3
-            val = getter_setter_gen(key, None, read_only=True)
-            new_dict["__" + key] = None if key not in cls.__dict__ else cls.__dict__[key]
+            fields[key] = (None, True, True, None)
         else:
             raise AttributeError("Params improperly configured for key '%s'" % key)
-        new_dict[key] = val
-    new_dict["__params"] = new_dict["params"]
-    del new_dict["params"]
+
+    new_dict = dict(cls.__dict__)
+    new_dict.pop("__dict__", None)
+    new_dict.pop("__weakref__", None)
+    # Defaults given by class attributes are replaced by properties.
+    defaults = [(key, new_dict.pop(key, fields[key][3])) for key in fields]
+    new_dict["__slots__"] = tuple("_" + key for key in fields)
+    new_dict["__params"] = new_dict.pop("params")
     # Creates a new class, using the modified dictionary as the class dict:
-    return type(cls)(cls.__name__, cls.__bases__, new_dict)
+    new_cls = type(cls)(cls.__name__, cls.__bases__, new_dict)
+
+    slots = {key: getattr(new_cls, "_" + key) for key in fields}
+    init_slots = [(slots[key].__set__, default) for key, default in defaults]
+    setters = {}
+    for key, (type_, can_be_None, read_only, _) in fields.items():
+        prop = getter_setter_gen(key, slots[key], type_, can_be_None, read_only)
+        setattr(new_cls, key, prop)
+        setters[key] = prop.fset
+    stores = {key: slot.__set__ for key, slot in slots.items()}
+    original_init = new_cls.__init__
+
+    def __init__(self, *args, **kwargs):
+        for store, default in init_slots:
+            store(self, default)
+        original_init(self, *args, **kwargs)
+
+    def _bulk_set(cls_, functions, values):
+        obj = cls_()
+        for key, value in values.items():
+            if key not in functions:
+                raise TypeError("%s has no attribute %s." % (cls_.__name__, key))
+            functions[key](obj, value)
+        return obj
+
+    def from_fields(cls_, **values):
+        """Create instance with fields checked and converted like by attribute assignment."""
+        return _bulk_set(cls_, setters, values)
+
+    def from_trusted_fields(cls_, **values):
+        """Create instance with fields stored without checks, including read only ones.
+
+        Values must already have the correct type, it's meant for internal code paths.
+        """
+        return _bulk_set(cls_, stores, values)
+
+    new_cls.__init__ = __init__
+    new_cls.from_fields = classmethod(from_fields)
+    new_cls.from_trusted_fields = classmethod(from_trusted_fields)
+    return new_cls